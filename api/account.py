@@ -0,0 +1,110 @@
+import logging
+import threading
+import time
+
+from typing import Callable, Dict, List, Optional
+
+from pybit import usdt_perpetual
+
+from api.rest_client import RestClient
+
+logger = logging.getLogger(__name__)
+
+
+class AccountSnapshot:
+    """Cached positions and active orders for the symbols being traded
+
+    One refresh costs a single request for all positions plus one active-order request
+    per symbol, and is reused by every caller until it is `ttl` seconds old. Anything that
+    changes the account (placing, cancelling or closing orders) should call invalidate().
+    A failed refresh keeps the previous snapshot (and its age), so an error never reads as
+    "flat, no orders" - before the first successful one it raises instead.
+    """
+
+    def __init__(self, rest_client: RestClient, symbols: List[str], ttl: float = 2.0):
+        self._rc = rest_client
+        self._symbols = list(dict.fromkeys(symbols))
+        self._ttl = ttl
+        self._positions: Dict[str, list] = {}
+        self._orders: Dict[str, list] = {}
+        self._updated = 0.0
+        self._loaded = False # a refresh has succeeded at least once
+        self._lock = threading.Lock()
+        self._ws: Optional[usdt_perpetual.WebSocket] = None
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self._updated
+
+    def add_symbols(self, symbols: List[str]):
+        with self._lock:
+            for symbol in symbols:
+                if symbol not in self._symbols:
+                    self._symbols.append(symbol)
+                    self._updated = 0.0
+
+    def invalidate(self):
+        self._updated = 0.0
+
+    def refresh(self, force: bool = False):
+        with self._lock:
+            if not force and self.age < self._ttl:
+                return
+
+            all_positions = self._rc.get_all_positions()
+            orders = {} if all_positions is None else {symbol: self._rc.get_active_order(symbol) for symbol in self._symbols}
+            if all_positions is None or None in orders.values():
+                if not self._loaded:
+                    raise RuntimeError("Couldn't fetch positions and active orders")
+                logger.warning(f"Account refresh failed, keeping the snapshot from {self.age:.1f}s ago")
+                return
+
+            positions: Dict[str, list] = {symbol: [] for symbol in self._symbols}
+            for position in all_positions:
+                if position.get("symbol") in positions:
+                    positions[position["symbol"]].append(position)
+
+            self._positions = positions
+            self._orders = orders
+            self._updated = time.monotonic()
+            self._loaded = True
+            logger.debug(f"Refreshed account snapshot for {', '.join(self._symbols)}")
+
+    def positions(self, symbol: str) -> list:
+        self.refresh()
+        return self._positions.get(symbol, [])
+
+    def active_orders(self, symbol: str) -> list:
+        self.refresh()
+        return self._orders.get(symbol, [])
+
+    def stream_updates(self, api_key: str, api_secret: str, on_update: Callable[[str], None]) -> bool:
+        """Subscribes to the private position/order/execution streams
+
+        Every message invalidates the snapshot and calls on_update(topic), so readers see
+        fills as soon as they happen rather than when the TTL runs out. Returns False if the
+        streams couldn't be opened, in which case callers keep relying on the TTL alone.
+        """
+        if not api_key or not api_secret:
+            return False
+
+        def handler(msg):
+            self.invalidate()
+            on_update(msg.get("topic", ""))
+
+        try:
+            self._ws = usdt_perpetual.WebSocket(
+                test=True,
+                api_key=api_key,
+                api_secret=api_secret,
+                ping_interval=20,
+                ping_timeout=10,
+                domain="bybit",
+            )
+            self._ws.position_stream(handler)
+            self._ws.order_stream(handler)
+            self._ws.execution_stream(handler)
+        except Exception as e:
+            logger.warning(f"Couldn't open private account streams, polling only: {e}")
+            return False
+        return True
@@ -0,0 +1,173 @@
+import logging
+import time
+import threading
+import numpy as np
+
+from typing import Dict, Optional, Union
+
+from api.rest_client import RestClient, interval_to_seconds
+from api.resample import KLINE_FIELDS, START_AT, CLOSE, fetch_plan, resample_candles
+
+logger = logging.getLogger(__name__)
+
+
+class KlineBuffer:
+    """Fixed-size ring buffer of evenly spaced candles, oldest first when read back"""
+
+    def __init__(self, depth: int, interval_seconds: int):
+        self.depth = depth
+        self.interval_seconds = interval_seconds
+        self._data = np.zeros((depth, len(KLINE_FIELDS)))
+        self._head = 0 # slot the next candle is written to
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def latest_start(self) -> Optional[int]:
+        if self._count == 0:
+            return None
+        return int(self._data[(self._head - 1) % self.depth, START_AT])
+
+    def clear(self):
+        self._head = 0
+        self._count = 0
+
+    def ordered(self) -> np.ndarray:
+        if self._count < self.depth:
+            return self._data[:self._count].copy()
+        return np.concatenate((self._data[self._head:], self._data[:self._head]))
+
+    def _append(self, row: np.ndarray):
+        self._data[self._head] = row
+        self._head = (self._head + 1) % self.depth
+        self._count = min(self._count + 1, self.depth)
+
+    def merge(self, candles: list) -> int:
+        """Merges REST kline dicts into the buffer, returning how many new candles were appended
+
+        Candles can arrive out of order or repeat ones already cached (the previously live
+        candle is always re-fetched so its final close is kept). Missing candles are filled
+        with the previous close, so both legs of a pair stay aligned candle for candle.
+        """
+        appended = 0
+        rows = sorted(
+            (np.array([float(candle[field]) for field in KLINE_FIELDS]) for candle in candles),
+            key=lambda row: row[START_AT],
+        )
+        for row in rows:
+            latest = self.latest_start
+            if latest is None or row[START_AT] > latest:
+                if latest is not None:
+                    missing = int((row[START_AT] - latest) // self.interval_seconds) - 1
+                    if missing > 0:
+                        logger.warning(f"Filling {missing} missing candle(s) after {latest}")
+                        previous_close = self._data[(self._head - 1) % self.depth, CLOSE]
+                        # only the newest ones, the rest would be pushed out by `row` anyway
+                        for k in range(max(1, missing - self.depth + 2), missing + 1):
+                            self._append(np.array([latest + k * self.interval_seconds] + [previous_close] * 4))
+                self._append(row)
+                appended += 1
+                continue
+
+            # Older candle - overwrite it if it is still in the window, otherwise drop it
+            offset = int((latest - row[START_AT]) // self.interval_seconds)
+            if offset < self._count:
+                slot = (self._head - 1 - offset) % self.depth
+                if self._data[slot, START_AT] == row[START_AT]:
+                    self._data[slot] = row
+        return appended
+
+
+class KlineCache:
+    """Per-symbol mark price kline history, refreshed by fetching only the newest candles
+
+    The first lookup downloads the full `depth` window. After that a refresh is only needed
+    once a new candle has opened (or `refresh_after` seconds have passed), and it asks
+    RestClient.get_price_history for the candles from the last cached start onwards.
+
+    With a base_interval, base_interval candles are cached instead and resampled to
+    `interval` on the way out (api/resample.py), e.g. for intervals ByBit doesn't serve.
+    """
+
+    def __init__(self, rest_client: RestClient, interval: Union[int, str], depth: int, refresh_after: float = 60.0,
+                 base_interval: Union[int, str, None] = None):
+        self._rc = rest_client
+        # what's fetched and cached, which differs from interval/depth when resampling
+        self._interval, self._depth, self._resample_seconds = fetch_plan(interval, base_interval, depth)
+        self._interval_seconds = interval_to_seconds(self._interval)
+        self._output_depth = depth
+        self._refresh_after = refresh_after
+        self._buffers: Dict[str, KlineBuffer] = {}
+        self._refreshed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _buffer(self, symbol: str) -> KlineBuffer:
+        if symbol not in self._buffers:
+            self._buffers[symbol] = KlineBuffer(self._depth, self._interval_seconds)
+        return self._buffers[symbol]
+
+    def _needs_refresh(self, symbol: str, now: float) -> bool:
+        buffer = self._buffer(symbol)
+        if len(buffer) < self._depth:
+            return True
+        if now >= buffer.latest_start + self._interval_seconds:
+            return True # a new candle has opened since the last fetch
+        return now - self._refreshed.get(symbol, 0) >= self._refresh_after
+
+    def refresh(self, symbol: str, force: bool = False) -> bool:
+        with self._lock:
+            now = time.time()
+            if not force and not self._needs_refresh(symbol, now):
+                return True
+
+            buffer = self._buffer(symbol)
+            latest = buffer.latest_start
+            behind = (now - latest) // self._interval_seconds + 1 if latest is not None else self._depth
+
+            if latest is None or behind >= self._depth or len(buffer) < self._depth:
+                buffer.clear()
+                from_time = int(now - self._depth * self._interval_seconds)
+                limit = self._depth
+            else:
+                # from the last cached candle - it was still open when we got it - to the live one
+                from_time = latest
+                limit = int(behind)
+
+            prices = self._rc.get_price_history(symbol, interval=self._interval, limit=limit, from_time=from_time)
+            if not prices or not prices.get("result"):
+                return False
+
+            buffer.merge(prices["result"])
+            self._refreshed[symbol] = now
+            return True
+
+    def get_candles(self, symbol: str) -> np.ndarray:
+        # (candles, len(KLINE_FIELDS)) array, oldest first. Empty unless the full window is available
+        self.refresh(symbol)
+        buffer = self._buffer(symbol)
+        if len(buffer) < self._depth:
+            return np.empty((0, len(KLINE_FIELDS)))
+        if self._resample_seconds is None:
+            return buffer.ordered()
+        candles = resample_candles(buffer.ordered(), self._resample_seconds)[-self._output_depth:]
+        if len(candles) < self._output_depth:
+            return np.empty((0, len(KLINE_FIELDS)))
+        return candles
+
+    def get_klines(self, symbol: str) -> list:
+        # same shape as the REST "result" list
+        return [
+            {field: (int(row[k]) if k == START_AT else float(row[k])) for k, field in enumerate(KLINE_FIELDS)}
+            for row in self.get_candles(symbol)
+        ]
+
+    def get_closes(self, symbol: str) -> np.ndarray:
+        return self.get_candles(symbol)[:, CLOSE]
+
+    def latest_start(self, symbol: str) -> Optional[int]:
+        latest = self._buffer(symbol).latest_start
+        if latest is None or self._resample_seconds is None:
+            return latest
+        return latest // self._resample_seconds * self._resample_seconds
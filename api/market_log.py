@@ -0,0 +1,297 @@
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+
+from typing import Iterator, List, Optional
+
+import websocket
+
+from api.orderbook import ORDERBOOK_TOPIC
+
+logger = logging.getLogger(__name__)
+
+TRADE_TOPIC = "trade"
+INDEX_FILE = "index.json"
+
+# record kinds
+SNAPSHOT, UPDATE, DELETE, TRADE = range(4)
+BID, ASK = 1, -1 # side - for trades, the taker side (Buy = BID)
+
+# Fixed width, packed little-endian records. timestamp is the local receive time, so it
+# only ever grows within a log and time ranges can be found with a binary search.
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<i8"), # microseconds since the epoch, local receive time
+    ("exchange_ts", "<i8"), # microseconds, as sent by ByBit (0 if missing)
+    ("symbol", "<u2"), # position in the index's symbols list
+    ("kind", "u1"),
+    ("side", "i1"),
+    ("price", "<f8"),
+    ("size", "<f8"), # 0 for DELETE
+])
+
+
+def _segment_file(path: str, number: int) -> str:
+    return os.path.join(path, f"segment_{number:06d}.bin")
+
+
+class MarketLogWriter:
+    """Append-only market data log: fixed width RECORD_DTYPE records in memory-mapped segment files
+
+    Each segment is preallocated to segment_records records and filled in place; when it's
+    full a new one is started. index.json lists the symbols (a record's symbol is its
+    position in that list) and each segment's record count and time range. The index is
+    rewritten atomically on flush(), and only what it counts is ever read back, so a crash
+    loses at most the records since the last flush - never a half-written record.
+    Reopening an existing log carries on appending to it.
+    """
+
+    def __init__(self, path: str, symbols: List[str], segment_records: int = 1 << 20, flush_every: float = 1.0):
+        self._path = path
+        self._segment_records = segment_records
+        self._flush_every = flush_every
+        self._flushed = time.monotonic()
+        self._last_timestamp = 0
+
+        os.makedirs(path, exist_ok=True)
+        index_file = os.path.join(path, INDEX_FILE)
+        if os.path.exists(index_file):
+            with open(index_file) as fh:
+                self._index = json.load(fh)
+        else:
+            self._index = {"dtype": RECORD_DTYPE.descr, "symbols": [], "segments": []}
+        for symbol in symbols:
+            self.symbol_id(symbol)
+
+        self._segment: Optional[np.memmap] = None
+        if self._index["segments"]:
+            last = self._index["segments"][-1]
+            self._last_timestamp = last["last_ts"]
+            if last["count"] < segment_records:
+                self._open_segment(len(self._index["segments"]) - 1)
+        if self._segment is None:
+            self._new_segment()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def symbol_id(self, symbol: str) -> int:
+        symbols = self._index["symbols"]
+        if symbol not in symbols:
+            symbols.append(symbol)
+        return symbols.index(symbol)
+
+    def _open_segment(self, number: int):
+        file = _segment_file(self._path, number)
+        # segments are trimmed to their records on close, so grow back to full size first
+        with open(file, "ab") as fh:
+            fh.truncate(self._segment_records * RECORD_DTYPE.itemsize)
+        self._segment = np.memmap(file, dtype=RECORD_DTYPE, mode="r+", shape=(self._segment_records,))
+
+    def _new_segment(self):
+        if self._segment is not None:
+            self._close_segment()
+        self._index["segments"].append({"file": os.path.basename(_segment_file(self._path, len(self._index["segments"]))),
+                                        "count": 0, "first_ts": 0, "last_ts": 0})
+        self._open_segment(len(self._index["segments"]) - 1)
+
+    def _close_segment(self):
+        count = self._index["segments"][-1]["count"]
+        self._segment.flush()
+        file = self._segment.filename
+        self._segment = None
+        with open(file, "r+b") as fh:
+            fh.truncate(count * RECORD_DTYPE.itemsize)
+
+    def append(self, records: np.ndarray):
+        # records: RECORD_DTYPE array, timestamps in receive order
+        if len(records) == 0:
+            return
+        records["timestamp"] = np.maximum.accumulate(np.maximum(records["timestamp"], self._last_timestamp))
+        self._last_timestamp = int(records["timestamp"][-1])
+
+        written = 0
+        while written < len(records):
+            segment = self._index["segments"][-1]
+            space = self._segment_records - segment["count"]
+            if space == 0:
+                self._new_segment()
+                continue
+            chunk = records[written:written + space]
+            self._segment[segment["count"]:segment["count"] + len(chunk)] = chunk
+            if segment["count"] == 0:
+                segment["first_ts"] = int(chunk["timestamp"][0])
+            segment["count"] += len(chunk)
+            segment["last_ts"] = int(chunk["timestamp"][-1])
+            written += len(chunk)
+
+        if time.monotonic() - self._flushed >= self._flush_every:
+            self.flush()
+
+    def flush(self):
+        self._segment.flush()
+        tmp_file = os.path.join(self._path, INDEX_FILE + ".tmp")
+        with open(tmp_file, "w") as fh:
+            json.dump(self._index, fh)
+        os.replace(tmp_file, os.path.join(self._path, INDEX_FILE))
+        self._flushed = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self._close_segment()
+
+    # ByBit messages -> records
+
+    def write_orderbook(self, msg: dict, received: float):
+        symbol = self.symbol_id(msg["topic"].rsplit(".", 1)[1])
+        data = msg["data"]
+        if msg["type"] == "snapshot":
+            levels = [(SNAPSHOT, level) for level in (data["order_book"] if isinstance(data, dict) else data)]
+        else:
+            levels = [(DELETE, level) for level in data.get("delete", [])]
+            levels += [(UPDATE, level) for level in data.get("update", []) + data.get("insert", [])]
+
+        records = np.zeros(len(levels), dtype=RECORD_DTYPE)
+        records["timestamp"] = int(received * 1e6)
+        records["exchange_ts"] = int(msg.get("timestamp_e6", 0))
+        records["symbol"] = symbol
+        records["kind"] = [kind for kind, _ in levels]
+        records["side"] = [BID if level["side"] == "Buy" else ASK for _, level in levels]
+        records["price"] = [float(level["price"]) for _, level in levels]
+        records["size"] = [0.0 if kind == DELETE else float(level.get("size", 0)) for kind, level in levels]
+        self.append(records)
+
+    def write_trades(self, msg: dict, received: float):
+        symbol = self.symbol_id(msg["topic"].rsplit(".", 1)[1])
+        trades = msg["data"]
+        records = np.zeros(len(trades), dtype=RECORD_DTYPE)
+        records["timestamp"] = int(received * 1e6)
+        records["exchange_ts"] = [int(trade.get("trade_time_ms", 0)) * 1000 for trade in trades]
+        records["symbol"] = symbol
+        records["kind"] = TRADE
+        records["side"] = [BID if trade["side"] == "Buy" else ASK for trade in trades]
+        records["price"] = [float(trade["price"]) for trade in trades]
+        records["size"] = [float(trade["size"]) for trade in trades]
+        self.append(records)
+
+
+class MarketLogReader:
+    """Reads a MarketLogWriter log back as NumPy views over the memory-mapped segments
+
+    Nothing is parsed or copied: iter_range() yields slices of the segment maps, found by
+    binary search on timestamp. refresh() picks up records a running writer has flushed since.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._segments: List[np.memmap] = []
+        self.refresh()
+
+    def refresh(self):
+        with open(os.path.join(self._path, INDEX_FILE)) as fh:
+            self._index = json.load(fh)
+        self._segments = []
+        for segment in self._index["segments"]:
+            if segment["count"]:
+                records = np.memmap(os.path.join(self._path, segment["file"]), dtype=RECORD_DTYPE, mode="r",
+                                    shape=(segment["count"],))
+                self._segments.append(records)
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self._index["symbols"])
+
+    def symbol_id(self, symbol: str) -> int:
+        return self._index["symbols"].index(symbol)
+
+    def __len__(self):
+        return sum(len(records) for records in self._segments)
+
+    def iter_range(self, start: Optional[float] = None, end: Optional[float] = None) -> Iterator[np.ndarray]:
+        # Records with start <= timestamp < end (seconds since the epoch, None = unbounded),
+        # one zero-copy view per segment
+        start_us = -np.inf if start is None else int(start * 1e6)
+        end_us = np.inf if end is None else int(end * 1e6)
+        for segment, records in zip(self._index["segments"], self._segments):
+            if segment["last_ts"] < start_us or segment["first_ts"] >= end_us:
+                continue
+            timestamps = records["timestamp"]
+            lo = 0 if start is None else np.searchsorted(timestamps, start_us, side="left")
+            hi = len(records) if end is None else np.searchsorted(timestamps, end_us, side="left")
+            if hi > lo:
+                yield records[lo:hi]
+
+    def read(self, start: Optional[float] = None, end: Optional[float] = None, symbol: Optional[str] = None) -> np.ndarray:
+        """All records in [start, end), optionally for one symbol
+
+        A view when the range sits inside one segment and no symbol filter is given,
+        otherwise a copy (segments have to be joined / records picked out).
+        """
+        chunks = list(self.iter_range(start, end))
+        records = chunks[0] if len(chunks) == 1 else np.concatenate(chunks) if chunks else np.empty(0, RECORD_DTYPE)
+        if symbol is not None:
+            records = records[records["symbol"] == self.symbol_id(symbol)]
+        return records
+
+
+class MarketRecorder:
+    """Subscribes to the public order book and trade streams of `symbols` on one WebSocket
+    and writes every message into a MarketLogWriter, reconnecting when the socket drops"""
+
+    def __init__(self, url: str, symbols: List[str], writer: MarketLogWriter, max_backoff: float = 30.0):
+        self._url = url
+        self._symbols = symbols
+        self._writer = writer
+        self._max_backoff = max_backoff
+        self._stopped = threading.Event()
+        self._ws: Optional[websocket.WebSocketApp] = None
+        self.messages = 0
+
+    def _on_open(self, ws):
+        topics = [f"{topic}.{symbol}" for symbol in self._symbols for topic in (ORDERBOOK_TOPIC, TRADE_TOPIC)]
+        ws.send(json.dumps({"op": "subscribe", "args": topics}))
+
+    def _on_message(self, ws, message: str):
+        received = time.time()
+        msg = json.loads(message)
+        topic = msg.get("topic", "")
+        if topic.startswith(ORDERBOOK_TOPIC + "."):
+            self._writer.write_orderbook(msg, received)
+        elif topic.startswith(TRADE_TOPIC + "."):
+            self._writer.write_trades(msg, received)
+        else:
+            return
+        self.messages += 1
+
+    def run(self):
+        # Blocks until stop(). The writer is flushed and closed on the way out.
+        backoff = 0.5
+        try:
+            while not self._stopped.is_set():
+                self._ws = websocket.WebSocketApp(
+                    self._url,
+                    on_open=self._on_open,
+                    on_message=self._on_message,
+                    on_error=lambda ws, err: logger.warning(f"Recorder WebSocket error: {err}"),
+                )
+                started = time.monotonic()
+                self._ws.run_forever(ping_interval=20, ping_timeout=10)
+                if self._stopped.is_set():
+                    break
+                if time.monotonic() - started > self._max_backoff:
+                    backoff = 0.5
+                # the first message after reconnecting is a fresh snapshot, so the log stays replayable
+                logger.warning(f"Recorder WebSocket closed. Reconnecting in {backoff}s")
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, self._max_backoff)
+        finally:
+            self._writer.close()
+            logger.info(f"Recorded {self.messages} messages into {self._writer.path}")
+
+    def stop(self):
+        self._stopped.set()
+        if self._ws:
+            self._ws.close()
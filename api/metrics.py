@@ -0,0 +1,195 @@
+import bisect
+import json
+import logging
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# seconds - from sub-millisecond (in-process work) to multi-second (REST calls under load)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (Prometheus style), cheap enough to leave on: one
+    bisect plus a few additions under a lock per observation"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1) # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[slot] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts, total, count = list(self._counts), self._sum, self._count
+        cumulative, running = [], 0
+        for bucket_count in counts:
+            running += bucket_count
+            cumulative.append(running)
+        return {"buckets": dict(zip([*map(str, self.buckets), "+Inf"], cumulative)), "sum": total, "count": count}
+
+    def quantile(self, q: float) -> float:
+        # upper bound of the bucket holding the q-th observation
+        snapshot = self.snapshot()
+        target = q * snapshot["count"]
+        for bound, cumulative in zip((*self.buckets, float("inf")), snapshot["buckets"].values()):
+            if cumulative >= target and snapshot["count"]:
+                return bound
+        return float("nan")
+
+
+class Counter:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, Tuple], Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple], Counter] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, help: str = "", **labels) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+                self._help.setdefault(name, help)
+        return histogram
+
+    def counter(self, name: str, help: str = "", **labels) -> Counter:
+        key = (name, tuple(sorted(labels.items())))
+        counter = self._counters.get(key)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(key, Counter())
+                self._help.setdefault(name, help)
+        return counter
+
+    def observe(self, name: str, value: float, **labels):
+        self.histogram(name, **labels).observe(value)
+
+    def time(self, name: str, **labels) -> "Timer":
+        return Timer(self.histogram(name, **labels))
+
+    def _items(self) -> Tuple[list, list]:
+        # copies, so a metric registered meanwhile doesn't change the dicts mid-iteration
+        with self._lock:
+            return list(self._histograms.items()), list(self._counters.items())
+
+    def to_prometheus(self) -> str:
+        def label_text(labels, extra=()):
+            pairs = [f'{key}="{value}"' for key, value in (*labels, *extra)]
+            return "{" + ",".join(pairs) + "}" if pairs else ""
+
+        histograms, counters = self._items()
+        lines = []
+        seen = set()
+        for (name, labels), histogram in sorted(histograms, key=lambda item: item[0]):
+            if name not in seen:
+                seen.add(name)
+                lines += [f"# HELP {name} {self._help.get(name, '')}", f"# TYPE {name} histogram"]
+            snapshot = histogram.snapshot()
+            for bound, cumulative in snapshot["buckets"].items():
+                lines.append(f"{name}_bucket{label_text(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{label_text(labels)} {snapshot['sum']}")
+            lines.append(f"{name}_count{label_text(labels)} {snapshot['count']}")
+        for (name, labels), counter in sorted(counters, key=lambda item: item[0]):
+            if name not in seen:
+                seen.add(name)
+                lines += [f"# HELP {name} {self._help.get(name, '')}", f"# TYPE {name} counter"]
+            lines.append(f"{name}{label_text(labels)} {counter.value}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> dict:
+        def key_text(name, labels):
+            return name + "".join(f"[{key}={value}]" for key, value in labels)
+
+        histograms, counters = self._items()
+        result = {"time": time.time()}
+        for (name, labels), histogram in histograms:
+            snapshot = histogram.snapshot()
+            snapshot["p50"] = histogram.quantile(0.5)
+            snapshot["p99"] = histogram.quantile(0.99)
+            result[key_text(name, labels)] = snapshot
+        for (name, labels), counter in counters:
+            result[key_text(name, labels)] = counter.value
+        return result
+
+
+class Timer:
+    # with metrics.time("name"): ... - observes the elapsed wall time
+    def __init__(self, histogram: Histogram):
+        self._histogram = histogram
+        self._started = 0.0
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._started)
+        return False
+
+
+# Process-wide registry everything reports into
+metrics = MetricsRegistry()
+
+
+def serve_metrics(port: int, registry: MetricsRegistry = metrics) -> ThreadingHTTPServer:
+    # Prometheus text format on http://<host>:<port>/metrics, served from a daemon thread
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = registry.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("", port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Serving metrics on port {server.server_port}")
+    return server
+
+
+def dump_metrics_periodically(path: str, every: float = 60, registry: MetricsRegistry = metrics) -> threading.Thread:
+    # Rewrites `path` with a JSON snapshot every `every` seconds, from a daemon thread
+    def run():
+        while True:
+            time.sleep(every)
+            try:
+                with open(path, "w") as fh:
+                    json.dump(registry.to_dict(), fh, indent=2)
+            except Exception as e: # keep the thread alive, the next dump may well work
+                logger.exception(f"Couldn't write metrics to {path}: {e}")
+
+    thread = threading.Thread(target=run, name="metrics-dump", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,366 @@
+import bisect
+import itertools
+import json
+import logging
+import threading
+import time
+import numpy as np
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+import websocket
+
+from api.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ORDERBOOK_TOPIC = "orderBookL2_25"
+
+
+class _BookSide:
+    """One side of an OrderBook: levels kept sorted best first
+
+    Prices are stored as sort keys (price for asks, -price for bids), so both sides are
+    ascending and the best level is always index 0. An update is a bisect plus, for
+    inserts and deletes, a shift of the levels behind it. Plain lists rather than NumPy
+    arrays: at 25 levels a side, NumPy's per-call overhead costs more than the shift.
+    Cumulative sizes/values for depth queries are rebuilt lazily after a change.
+    """
+
+    __slots__ = ("_sign", "_keys", "_sizes", "_cum_sizes", "_cum_values")
+
+    def __init__(self, sign: float):
+        self._sign = sign
+        self._keys: List[float] = []
+        self._sizes: List[float] = []
+        self._cum_sizes: Optional[List[float]] = None
+        self._cum_values: Optional[List[float]] = None
+
+    def __len__(self):
+        return len(self._keys)
+
+    def clear(self):
+        self._keys = []
+        self._sizes = []
+        self._cum_sizes = None
+        self._cum_values = None
+
+    def set(self, price: float, size: float):
+        key = price * self._sign
+        pos = bisect.bisect_left(self._keys, key)
+        if pos < len(self._keys) and self._keys[pos] == key:
+            self._sizes[pos] = size
+        else:
+            self._keys.insert(pos, key)
+            self._sizes.insert(pos, size)
+        self._cum_sizes = None
+
+    def remove(self, price: float):
+        key = price * self._sign
+        pos = bisect.bisect_left(self._keys, key)
+        if pos < len(self._keys) and self._keys[pos] == key:
+            del self._keys[pos]
+            del self._sizes[pos]
+            self._cum_sizes = None
+
+    def best(self) -> float:
+        return self._keys[0] * self._sign if self._keys else 0.0
+
+    def prices(self) -> np.ndarray:
+        return np.array(self._keys) * self._sign
+
+    def sizes(self) -> np.ndarray:
+        return np.array(self._sizes)
+
+    def _cumulative(self) -> Tuple[List[float], List[float]]:
+        if self._cum_sizes is None:
+            self._cum_sizes = list(itertools.accumulate(self._sizes))
+            self._cum_values = list(itertools.accumulate(key * size for key, size in zip(self._keys, self._sizes)))
+        return self._cum_sizes, self._cum_values
+
+    def liquidity(self, levels: int) -> float:
+        cum_sizes, _ = self._cumulative()
+        levels = min(levels, len(cum_sizes))
+        return cum_sizes[levels - 1] if levels > 0 else 0.0
+
+    def vwap(self, size: float) -> float:
+        # average price of taking `size` off this side, NaN if there isn't that much
+        cum_sizes, cum_values = self._cumulative()
+        if size <= 0 or not cum_sizes or size > cum_sizes[-1]:
+            return float("nan")
+        k = bisect.bisect_left(cum_sizes, size) # first level that completes the fill
+        taken_before = cum_sizes[k - 1] if k else 0.0
+        value_before = cum_values[k - 1] if k else 0.0 # in key units, i.e. negated for bids
+        return (value_before + (size - taken_before) * self._keys[k]) * self._sign / size
+
+    def copy(self) -> "_BookSide":
+        side = _BookSide(self._sign)
+        side._keys = self._keys[:]
+        side._sizes = self._sizes[:]
+        return side
+
+
+class OrderBook:
+    """Sorted L2 order book for one symbol
+
+    Best bid/ask are O(1), depth queries (liquidity over N levels, VWAP to a size) a
+    binary search over cumulative sizes. Sides follow ByBit's level "side": "Buy" levels
+    are bids, "Sell" levels asks. apply() takes orderBookL2_25 snapshot/delta messages.
+    """
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.bids = _BookSide(-1.0)
+        self.asks = _BookSide(1.0)
+        self._ids: Dict[str, Tuple[str, float]] = {} # level id -> (side, price), deltas are keyed by id
+
+    @classmethod
+    def from_levels(cls, symbol: str, levels: List[dict]) -> "OrderBook":
+        book = cls(symbol)
+        book.apply({"type": "snapshot", "data": levels})
+        return book
+
+    def __len__(self):
+        return len(self.bids) + len(self.asks)
+
+    def _side(self, side: str) -> _BookSide:
+        return self.bids if side == "Buy" else self.asks
+
+    def apply(self, msg: dict):
+        data = msg["data"]
+        if msg["type"] == "snapshot":
+            # linear snapshots wrap the levels in "order_book", older ones send the list directly
+            self.bids.clear()
+            self.asks.clear()
+            self._ids = {}
+            updates = data["order_book"] if isinstance(data, dict) else data
+        elif msg["type"] == "delta":
+            for level in data.get("delete", []):
+                side, price = self._ids.pop(level["id"], (None, 0.0))
+                if side:
+                    self._side(side).remove(price)
+            updates = data.get("update", []) + data.get("insert", [])
+        else:
+            return
+
+        for level in updates:
+            old_side, old_price = self._ids.get(level["id"], (None, 0.0))
+            side = level.get("side", old_side)
+            price = float(level["price"]) if "price" in level else old_price
+            if old_side and (old_side, old_price) != (side, price):
+                self._side(old_side).remove(old_price) # a level id can change sides as the spread moves
+            self._ids[level["id"]] = (side, price)
+            self._side(side).set(price, float(level.get("size", 0)))
+
+    def best_bid(self) -> float:
+        return self.bids.best()
+
+    def best_ask(self) -> float:
+        return self.asks.best()
+
+    def best_bid_ask(self) -> Tuple[float, float]:
+        return (self.bids.best(), self.asks.best())
+
+    def mid(self) -> float:
+        return (self.bids.best() + self.asks.best()) / 2
+
+    def weighted_mid(self, levels: int = 5) -> float:
+        # depth-weighted mid: each side's VWAP over its top `levels`, weighted by the
+        # other side's liquidity there, so the mid leans towards the thinner side
+        bid_size, ask_size = self.bids.liquidity(levels), self.asks.liquidity(levels)
+        if bid_size == 0 or ask_size == 0:
+            return self.mid()
+        bid_vwap, ask_vwap = self.bids.vwap(bid_size), self.asks.vwap(ask_size)
+        return (bid_vwap * ask_size + ask_vwap * bid_size) / (bid_size + ask_size)
+
+    def vwap(self, side: str, size: float) -> float:
+        # average fill price of a `side` ("Buy"/"Sell") market order of `size` - a buy takes the asks
+        return self.asks.vwap(size) if side == "Buy" else self.bids.vwap(size)
+
+    def liquidity(self, side: str, levels: int) -> float:
+        # total size on the top `levels` levels of the "Buy" (bid) or "Sell" (ask) side
+        return self._side(side).liquidity(levels)
+
+    def copy(self) -> "OrderBook":
+        # read-only snapshot for another thread (no level ids, so it can't take deltas)
+        book = OrderBook(self.symbol)
+        book.bids = self.bids.copy()
+        book.asks = self.asks.copy()
+        return book
+
+
+class _BookConnection:
+    """One WebSocket connection keeping a local copy of a single symbol's order book
+
+    ByBit sends a full snapshot on subscribe and then delete/update/insert deltas,
+    keyed by level "id". The connection thread applies them into self._book (an OrderBook) and
+    reconnects (with backoff) whenever the socket drops.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        symbol: str,
+        ping_interval: int,
+        ping_timeout: int,
+        max_backoff: float,
+        listeners: List[Callable[[str, float], None]],
+    ):
+        self.url = url
+        self.symbol = symbol
+        self.topic = f"{ORDERBOOK_TOPIC}.{symbol}"
+        self.reconnects = 0
+        self.last_update = 0.0 # time.monotonic() of the last applied message
+
+        self._ping_interval = ping_interval
+        self._ping_timeout = ping_timeout
+        self._max_backoff = max_backoff
+        self._listeners = listeners
+
+        self._book = OrderBook(symbol)
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stopped = threading.Event()
+        self._ws: Optional[websocket.WebSocketApp] = None
+
+        self._thread = threading.Thread(target=self._run, name=f"orderbook-{symbol}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        backoff = 0.5
+        while not self._stopped.is_set():
+            self._ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=lambda ws, err: logger.warning(f"Order book WebSocket error ({self.symbol}): {err}"),
+            )
+            started = time.monotonic()
+            self._ws.run_forever(ping_interval=self._ping_interval, ping_timeout=self._ping_timeout)
+
+            # Connection dropped - the local book can't be trusted until the next snapshot
+            self._ready.clear()
+            if self._stopped.is_set():
+                break
+            if time.monotonic() - started > self._max_backoff:
+                backoff = 0.5 # it was up for a while, so this is a fresh failure
+            self.reconnects += 1
+            logger.warning(f"Order book WebSocket for {self.symbol} closed. Reconnecting in {backoff}s")
+            self._stopped.wait(backoff)
+            backoff = min(backoff * 2, self._max_backoff)
+
+    def _on_open(self, ws):
+        ws.send(json.dumps({"op": "subscribe", "args": [self.topic]}))
+
+    def _on_message(self, ws, message: str):
+        msg = json.loads(message)
+        if msg.get("topic") != self.topic:
+            return # subscription acks, pongs
+
+        sent = msg.get("timestamp_e6", 0) / 1e6
+        if sent:
+            metrics.observe("ws_message_lag_seconds", time.time() - sent, symbol=self.symbol)
+
+        with self._lock:
+            self._book.apply(msg)
+            self.last_update = time.monotonic()
+        self._ready.set()
+
+        for listener in self._listeners:
+            listener(self.symbol, sent)
+
+    def wait(self, timeout: float) -> bool:
+        return self._ready.wait(timeout)
+
+    def book(self) -> OrderBook:
+        with self._lock:
+            return self._book.copy()
+
+    def best_bid_ask(self) -> Tuple[float, float]:
+        with self._lock:
+            return self._book.best_bid_ask()
+
+    def reconnect(self):
+        # Dropping the socket makes run_forever return, and _run opens a new connection.
+        # Only once per snapshot, so callers waiting on the new connection don't keep closing it.
+        if self._ready.is_set() and self._ws:
+            self._ready.clear()
+            self._ws.keep_running = False
+            if self._ws.sock:
+                # abort() shuts the socket down, which wakes run_forever's select right away -
+                # close() would close the fd underneath it and leave it waiting out ping_timeout
+                self._ws.sock.abort()
+
+    def close(self):
+        self._stopped.set()
+        if self._ws:
+            self._ws.close()
+
+
+class OrderBookFeed:
+    """Long-lived order book streams shared by everything that needs prices
+
+    Connections are opened lazily on the first lookup for a symbol and then kept open,
+    so later lookups are served from memory instead of paying for a new WebSocket.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        stale_after: float = 10.0,
+        ping_interval: int = 20,
+        ping_timeout: int = 10,
+        max_backoff: float = 30.0,
+    ):
+        self._url = url
+        self._stale_after = stale_after
+        self._ping_interval = ping_interval
+        self._ping_timeout = ping_timeout
+        self._max_backoff = max_backoff
+        self._books: Dict[str, _BookConnection] = {}
+        self._listeners: List[Callable[[str, float], None]] = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener: Callable[[str, float], None]):
+        # listener(symbol, exchange_timestamp) is called from the connection thread after every update
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, float], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def subscribe(self, symbol: str) -> _BookConnection:
+        with self._lock:
+            if symbol not in self._books:
+                self._books[symbol] = _BookConnection(
+                    self._url, symbol, self._ping_interval, self._ping_timeout, self._max_backoff, self._listeners)
+            return self._books[symbol]
+
+    def is_stale(self, symbol: str) -> bool:
+        book = self._books.get(symbol)
+        return book is None or time.monotonic() - book.last_update > self._stale_after
+
+    def get_orderbook(self, symbol: str, timeout: float = 10.0) -> Optional[OrderBook]:
+        book = self.subscribe(symbol)
+
+        # No update for a while usually means a half-dead connection, so force a fresh snapshot
+        if book.last_update and self.is_stale(symbol):
+            logger.warning(f"Order book for {symbol} is stale. Reconnecting")
+            book.reconnect()
+
+        if not book.wait(timeout):
+            print(f"Timed out waiting for order book for {symbol}")
+            return None
+        return book.book()
+
+    def best_bid_ask(self, symbol: str, timeout: float = 10.0) -> Tuple[float, float]:
+        book = self.subscribe(symbol)
+        if not book.wait(timeout):
+            return (0, 0)
+        return book.best_bid_ask()
+
+    def close(self):
+        with self._lock:
+            for book in self._books.values():
+                book.close()
+            self._books = {}
@@ -0,0 +1,93 @@
+import numpy as np
+
+from typing import Optional, Tuple, Union
+
+from api.rest_client import interval_to_seconds
+
+KLINE_FIELDS = ("start_at", "open", "high", "low", "close")
+START_AT, OPEN, HIGH, LOW, CLOSE = range(len(KLINE_FIELDS))
+
+# Candles are downloaded (and stored) once at a fine base interval, e.g. 1 minute, and
+# aggregated to whatever interval the strategy runs on here. Buckets are aligned to the
+# epoch like ByBit's own candles, so a resampled 4h candle matches the exchange's 4h one.
+
+
+def _bucket_bounds(start_at: np.ndarray, interval_seconds: int) -> Tuple[np.ndarray, np.ndarray]:
+    # index of the first and last candle of each bucket, start_at sorted ascending
+    buckets = start_at.astype(np.int64) // interval_seconds
+    new_bucket = np.empty(len(buckets), dtype=bool)
+    new_bucket[0] = True
+    np.not_equal(buckets[1:], buckets[:-1], out=new_bucket[1:])
+    firsts = np.flatnonzero(new_bucket)
+    lasts = np.append(firsts[1:], len(buckets)) - 1
+    return firsts, lasts
+
+
+def resample_candles(candles: np.ndarray, interval_seconds: int) -> np.ndarray:
+    """(candles, len(KLINE_FIELDS)) base candles, oldest first -> the same at interval_seconds
+
+    Open is each bucket's first open, close its last close, high/low the max/min over it.
+    A first bucket the base candles only cover part of is dropped; the last one is kept
+    even if it's still open, like the exchange's newest candle is.
+    """
+    if len(candles) == 0:
+        return np.empty((0, len(KLINE_FIELDS)))
+    start_at = candles[:, START_AT]
+    firsts, lasts = _bucket_bounds(start_at, interval_seconds)
+
+    resampled = np.empty((len(firsts), len(KLINE_FIELDS)))
+    resampled[:, START_AT] = start_at[firsts] // interval_seconds * interval_seconds
+    resampled[:, OPEN] = candles[firsts, OPEN]
+    resampled[:, HIGH] = np.maximum.reduceat(candles[:, HIGH], firsts)
+    resampled[:, LOW] = np.minimum.reduceat(candles[:, LOW], firsts)
+    resampled[:, CLOSE] = candles[lasts, CLOSE]
+    if start_at[0] % interval_seconds:
+        resampled = resampled[1:]
+    return resampled
+
+
+def same_window(start_at: np.ndarray) -> np.ndarray:
+    """Rows of a (symbols, candles) start_at matrix that cover the same candles
+
+    The reference is a row ending on the most common newest start_at (the newest one on a
+    tie), so a symbol whose top-up failed - still full length, but shifted back in time -
+    is left out rather than paired with everybody else's newer window.
+    """
+    if len(start_at) == 0 or start_at.shape[1] == 0:
+        return np.zeros(len(start_at), dtype=bool)
+    latest, counts = np.unique(start_at[:, -1], return_counts=True)
+    reference = np.flatnonzero(start_at[:, -1] == latest[counts == counts.max()].max())[0]
+    return (start_at == start_at[reference]).all(axis=1)
+
+
+def resample_closes(start_at: np.ndarray, closes: np.ndarray, interval_seconds: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Closes at interval_seconds for a (symbols, candles) matrix on a shared start_at grid
+
+    Only the close of each bucket's last candle is needed, so this is one column selection
+    for every symbol at once. Rows not on the same_window() grid are left out - returns
+    (rows kept, resampled closes).
+    """
+    keep = same_window(start_at)
+    if not keep.any():
+        return keep, np.empty((0, 0))
+    grid = start_at[keep][0]
+    firsts, lasts = _bucket_bounds(grid, interval_seconds)
+    if grid[0] % interval_seconds:
+        lasts = lasts[1:]
+    return keep, closes[keep][:, lasts]
+
+
+def fetch_plan(interval: Union[int, str], base_interval: Union[int, str, None], depth: int) -> Tuple[Union[int, str], int, Optional[int]]:
+    """What to download for `depth` candles of `interval`: (interval to fetch, how many, seconds to resample to)
+
+    Without a base_interval (or one equal to interval) that's just interval itself, with
+    nothing to resample. Otherwise base_interval candles, one bucket's worth extra because
+    the oldest bucket is usually only partly covered.
+    """
+    interval_seconds = interval_to_seconds(interval)
+    if not base_interval or interval_to_seconds(base_interval) == interval_seconds:
+        return interval, depth, None
+    base_seconds = interval_to_seconds(base_interval)
+    if interval_seconds % base_seconds:
+        raise ValueError(f"Can't resample {base_interval} candles to {interval}")
+    return base_interval, (depth + 1) * (interval_seconds // base_seconds), interval_seconds
@@ -1,38 +1,79 @@
 import datetime
-from time import sleep
 
-from typing import Union, List, Literal
+from typing import Optional, Union, List, Literal
 
-import pybit.exceptions
-from pybit import usdt_perpetual
+from api.rate_limit import TokenBucket
+from api.transport import Transport
+
+
+MAX_KLINES = 200 # most candles ByBit returns per kline request
+BYBIT_INTERVALS = (1, 3, 5, 15, 30, 60, 120, 240, 360, 720, "D", "W", "M")
+_UNIT_SECONDS = {"m": 60, "h": 60 * 60, "D": 24 * 60 * 60, "d": 24 * 60 * 60, "W": 7 * 24 * 60 * 60, "w": 7 * 24 * 60 * 60}
 
 
 def _get_start_time_in_seconds(interval: Union[int, str], limit: float):
-    start = 0
-    now = datetime.datetime.now()
-    if interval == 60:
-        start = now - datetime.timedelta(hours=limit)
-        start = int(start.timestamp())
-    elif interval == "D":
-        start = now - datetime.timedelta(days=limit)
-        start = int(start.timestamp())
-    return start
+    # start of a `limit` candle window ending now
+    return int(datetime.datetime.now().timestamp() - limit * interval_to_seconds(interval))
+
+
+def interval_to_seconds(interval: Union[int, str]) -> int:
+    # ByBit kline intervals are minutes, or "D"/"W"/"M". "5m", "4h", "1D", "1W" style
+    # strings are accepted too, for intervals that are resampled locally (api/resample.py)
+    if interval == "D":
+        return 24 * 60 * 60
+    if interval == "W":
+        return 7 * 24 * 60 * 60
+    if interval == "M":
+        return 30 * 24 * 60 * 60
+    if isinstance(interval, str) and interval[-1:] in _UNIT_SECONDS:
+        return int(interval[:-1] or 1) * _UNIT_SECONDS[interval[-1]]
+    return int(interval) * 60
+
+
+def to_bybit_interval(interval: Union[int, str]) -> Union[int, str]:
+    # The kline endpoint's code for an interval, ValueError if ByBit doesn't serve it
+    seconds = interval_to_seconds(interval)
+    for code in BYBIT_INTERVALS:
+        if interval_to_seconds(code) == seconds:
+            return code
+    raise ValueError(f"ByBit has no {interval} klines - set BASE_INTERVAL to resample them locally")
 
 
 class RestClient:
-    def __init__(self, url: str, api_key: Union[str, None] = None, api_secret: Union[str, None] = None):
+    """ByBit USDT perpetual endpoints used by the bot
+
+    Every call goes through Transport (pooled session, timeouts, rate limiting and
+    retries). Failures come back as a response with a non-zero ret_code, so each
+    method only has to check ret_code and return its "nothing" value.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        api_key: Union[str, None] = None,
+        api_secret: Union[str, None] = None,
+        rate_limiter: Optional[TokenBucket] = None,
+        request_timeout: float = 10,
+        connect_timeout: float = 3.05,
+    ):
         self._url = url
-        self._client = usdt_perpetual.HTTP(endpoint=self._url, api_key=api_key, api_secret=api_secret)
+        self._transport = Transport(
+            url,
+            api_key=api_key,
+            api_secret=api_secret,
+            rate_limiter=rate_limiter,
+            connect_timeout=connect_timeout,
+            read_timeout=request_timeout,
+        )
+
+    def _request(self, method: str, idempotent: bool = True, **kwargs) -> dict:
+        return self._transport.request(method, idempotent=idempotent, **kwargs)
 
     def get_symbols(self, trading=None, maker_rebate=False) -> list:
         symbols = []
-        resp = self._client.query_symbol()
+        resp = self._request("query_symbol")
 
-        if "ret_msg" not in resp or "ret_code" not in resp:
-            print("No 'ret_msg' or 'ret_code' found in response")
-            return symbols
-
-        if resp["ret_msg"] != "OK" or resp["ret_code"] != 0:
+        if resp["ret_code"] != 0:
             print(f"Error in response: {resp}")
             return symbols
 
@@ -46,24 +87,54 @@ class RestClient:
 
         return symbols
 
-    def get_price_history(self, symbol: str, interval: int, limit: int, from_time: int = -1) -> Union[dict, None]:
+    def get_tickers(self) -> dict:
+        # Latest 24h stats (turnover_24h, volume_24h, ...) for every symbol, in one request
+        resp = self._request("latest_information_for_symbol")
+
+        if resp["ret_code"] != 0:
+            print(f"Failed to get tickers: {resp}")
+            return {}
+        return {ticker["symbol"]: ticker for ticker in resp["result"]}
+
+    def get_price_history(self, symbol: str, interval: Union[int, str], limit: int, from_time: int = -1) -> Union[dict, None]:
+        # More than MAX_KLINES candles are fetched page by page and joined into one response
+        interval = to_bybit_interval(interval)
         if from_time == -1:
             from_time = _get_start_time_in_seconds(interval, limit)
-        prices = {}
-        try:
-            sleep(0.1)
-            prices = self._client.query_mark_price_kline(
+
+        klines = []
+        while True:
+            page = min(limit - len(klines), MAX_KLINES)
+            resp = self._request(
+                "query_mark_price_kline",
                 symbol=symbol,
                 interval=interval,
-                limit=limit,
+                limit=page,
                 from_time=from_time,
             )
-        except pybit.exceptions.InvalidRequestError:
-            return None
-        return prices
+            if resp["ret_code"] != 0:
+                return None
+            result = resp.get("result") or [] # an empty page can come back as None
+            klines += result
+            if len(result) < page or len(klines) >= limit:
+                break # caught up with the current candle, or got them all
+            from_time = max(kline["start_at"] for kline in result) + interval_to_seconds(interval)
+
+        # every page's candles, not just the last page's
+        return {**resp, "result": klines}
 
     def get_my_position(self, symbol: str):
-        return self._client.my_position(symbol=symbol)
+        return self._request("my_position", symbol=symbol)
+
+    def get_all_positions(self) -> Optional[list]:
+        # Without a symbol ByBit returns every USDT perpetual position in one request,
+        # each wrapped as {"data": {...}, "is_valid": true}. None if the request failed
+        resp = self._request("my_position")
+        if resp["ret_code"] != 0:
+            return None
+        if not resp.get("result"):
+            return []
+        return [pos["data"] if "data" in pos else pos for pos in resp["result"]]
     
     def close_position(self, symbol, side, size, position_idx) -> bool:
         """Closing a position involves placing the opposite side
@@ -71,7 +142,9 @@ class RestClient:
             So, if you have an open buy position, you want to place a sell order.
             More info on reduce_only here: https://www.bybit.com/en-US/help-center/bybitHC_Article?id=360039260574&language=en_US
         """
-        resp = self._client.place_active_order(
+        resp = self._request(
+            "place_active_order",
+            idempotent=False,
             symbol=symbol,
             side=side,
             order_type="Market",
@@ -82,37 +155,40 @@ class RestClient:
             position_idx=position_idx
         )
 
-        if resp["ret_code"] == 0:
-            return True
-        else:
-            return False
+        return resp["ret_code"] == 0
         
+    def cancel_active_order(self, symbol: str, order_id: str) -> bool:
+        resp = self._request("cancel_active_order", idempotent=False, symbol=symbol, order_id=order_id)
+        if resp["ret_code"] != 0:
+            print(f"Couldn't cancel order ({order_id}) for symbol ({symbol}): {resp['ret_msg']}")
+            return False
+        return True
+
     def cancel_all_active_orders(self, symbol: str) -> List[str]:
-        resp = self._client.cancel_all_active_orders(symbol=symbol)
+        resp = self._request("cancel_all_active_orders", symbol=symbol)
         if resp["ret_code"] != 0:
             return []
         else:
             return resp["result"]
         
     def set_leverage(self, symbol: str, buy_leverage: int = 1, sell_leverage: int = 1) -> bool:
-        try:
-            resp = self._client.cross_isolated_margin_switch(
-                symbol=symbol,
-                is_isolated=True,
-                buy_leverage=buy_leverage,
-                sell_leverage=sell_leverage,
-            )
-        except pybit.exceptions.InvalidRequestError as e:
-            print("Failed to set leverage:", e)
-            return False
+        resp = self._request(
+            "cross_isolated_margin_switch",
+            symbol=symbol,
+            is_isolated=True,
+            buy_leverage=buy_leverage,
+            sell_leverage=sell_leverage,
+        )
 
-        if resp["ret_code"] == 0:
-            return True
-        else:
+        if resp["ret_code"] != 0:
+            print("Failed to set leverage:", resp["ret_msg"])
             return False
+        return True
         
     def place_limit_order(self, symbol: str, side: Literal["Buy", "Sell"], qty: float, price: float, stop_loss: float) -> dict:
-        resp = self._client.place_active_order(
+        resp = self._request(
+            "place_active_order",
+            idempotent=False,
             symbol=symbol,
             side=side,
             order_type="Limit",
@@ -133,7 +209,9 @@ class RestClient:
         return resp
         
     def place_market_order(self, symbol: str, side: Literal["Buy", "Sell"], qty: float, stop_loss: float) -> dict:
-        resp = self._client.place_active_order(
+        resp = self._request(
+            "place_active_order",
+            idempotent=False,
             symbol=symbol,
             side=side,
             order_type="Market",
@@ -153,7 +231,8 @@ class RestClient:
         return resp
     
     def get_public_trade_records(self, symbol: str, limit: int = 10) -> list:
-        resp = self._client.public_trading_records(
+        resp = self._request(
+            "public_trading_records",
             symbol=symbol,
             limit=limit, # number of trades to fetch
         )
@@ -165,28 +244,28 @@ class RestClient:
             print("Failed to get public trades :(")
             return []
         
-    def get_active_order(self, symbol: str) -> list:
-        resp = self._client.get_active_order(
+    def get_active_order(self, symbol: str) -> Optional[list]:
+        # None if the request failed, so it isn't mistaken for "no active orders"
+        resp = self._request(
+            "get_active_order",
             symbol=symbol,
             order_status="Created,New,PartiallyFilled,Active",
         )
 
-        data = []
-        if resp["ret_code"] == 0:
-            if resp["result"]["data"]:
-                data = resp["result"]["data"]
-        return data
+        if resp["ret_code"] != 0:
+            return None
+        return (resp["result"] or {}).get("data") or []
     
     def query_existing_order(self, symbol: str, order_id: str) -> dict:
         data = {}
-        try:
-            resp = self._client.query_active_order(
-                symbol=symbol,
-                order_id=order_id,
-            )
-        except pybit.exceptions.InvalidRequestError:
+        resp = self._request(
+            "query_active_order",
+            symbol=symbol,
+            order_id=order_id,
+        )
+
+        if resp["ret_code"] != 0:
             print(f"Couldn't fetch order for symbol ({symbol}) and order_id ({order_id})")
-        else:
-            if resp["ret_code"] == 0 and resp["result"]:
-                data = resp["result"]
-        return data
\ No newline at end of file
+        elif resp["result"]:
+            data = resp["result"]
+        return data
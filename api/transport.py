@@ -0,0 +1,109 @@
+import logging
+import random
+import time
+
+import requests
+import pybit.exceptions
+
+from pybit import usdt_perpetual
+from requests.adapters import HTTPAdapter
+from typing import Optional, Union
+
+from api.metrics import metrics
+from api.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 0.5 # seconds, doubled on every retry
+BACKOFF_MAX = 8.0
+
+# ByBit ret_codes worth retrying: recv_window/timestamp errors, rate limits and
+# "server busy" style errors. Anything else is a real rejection - including 30034
+# ("order not exists"), which resending the same cancel/replace won't change.
+RETRYABLE_CODES = {10002, 10006, 10016, 30035, 130035, 130150}
+RETRYABLE_HTTP_STATUS = {403, 409, 429, 500, 502, 503, 504} # 403 = IP rate limit, 409 = pybit's undecodable JSON
+
+
+class Transport:
+    """HTTP layer under RestClient
+
+    One pooled keep-alive session (pybit's requests.Session with a bigger connection pool),
+    separate connect/read timeouts, a shared client-side rate limiter that every call
+    waits on, and jittered exponential backoff on errors that are safe to retry.
+    pybit's own fixed-delay retry loop is switched off, so retries happen only here.
+
+    Calls that aren't idempotent (placing/cancelling orders) are only retried when
+    the request can't have reached the matching engine: connect failures and rejections
+    like rate limits. A read timeout on those is returned as a failure, not resent.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        api_key: Union[str, None] = None,
+        api_secret: Union[str, None] = None,
+        rate_limiter: Optional[TokenBucket] = None,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 10,
+        max_attempts: int = MAX_ATTEMPTS,
+        pool_size: int = 16,
+    ):
+        # without a shared limiter, fall back to roughly one call every 0.1s
+        self._rate_limiter = rate_limiter or TokenBucket(10, 1)
+        self._max_attempts = max_attempts
+        self.http = usdt_perpetual.HTTP(
+            endpoint=url,
+            api_key=api_key,
+            api_secret=api_secret,
+            request_timeout=(connect_timeout, read_timeout),
+            max_retries=1,
+            retry_codes=set(),
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.http.client.mount("https://", adapter)
+        self.http.client.mount("http://", adapter)
+
+    def _retryable(self, error: Exception, idempotent: bool) -> bool:
+        if isinstance(error, pybit.exceptions.InvalidRequestError):
+            return error.status_code in RETRYABLE_CODES
+        if isinstance(error, pybit.exceptions.FailedRequestError):
+            return error.status_code in RETRYABLE_HTTP_STATUS and (idempotent or error.status_code in (403, 429))
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            return idempotent
+        return False
+
+    def request(self, method: str, idempotent: bool = True, **kwargs) -> dict:
+        """Calls usdt_perpetual.HTTP.<method>(**kwargs)
+
+        Returns the response on success. On failure returns a response-shaped dict with a
+        non-zero ret_code, so every RestClient method handles errors the same way.
+        """
+        error: Optional[Exception] = None
+        latency = metrics.histogram("rest_request_seconds", "REST call latency per attempt", endpoint=method)
+        for attempt in range(self._max_attempts):
+            waited = time.perf_counter()
+            self._rate_limiter.acquire()
+            started = time.perf_counter()
+            metrics.observe("rest_throttle_seconds", started - waited)
+            try:
+                resp = getattr(self.http, method)(**kwargs)
+                latency.observe(time.perf_counter() - started)
+                return resp
+            except (pybit.exceptions.InvalidRequestError,
+                    pybit.exceptions.FailedRequestError,
+                    requests.exceptions.RequestException) as e:
+                latency.observe(time.perf_counter() - started)
+                metrics.counter("rest_errors_total", "failed REST attempts", endpoint=method).inc()
+                error = e
+                if not self._retryable(e, idempotent) or attempt == self._max_attempts - 1:
+                    break
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+                logger.warning(f"{method} failed ({e}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+
+        logger.error(f"{method} failed: {error}")
+        ret_code = getattr(error, "status_code", -1)
+        return {"ret_code": ret_code if ret_code else -1, "ret_msg": str(error), "result": {}}
@@ -0,0 +1,61 @@
+import argparse
+import time
+import numpy as np
+
+from strategy.cointegration import calculate_cointegration, calculate_cointegration_statsmodels
+from strategy.engle_granger import batch_cointegration, upper_triangle_pairs
+
+
+def random_universe(n_symbols: int, n_candles: int, seed: int = 0) -> np.ndarray:
+    # (symbols, candles) closes: shared random walks plus AR(1) noise, so both
+    # cointegrated and unrelated pairs are in the mix
+    rng = np.random.default_rng(seed)
+    walks = 100 + np.cumsum(rng.normal(0, 1, (4, n_candles)), axis=1)
+    noise = np.zeros((n_symbols, n_candles))
+    shocks = rng.normal(0, 0.5, (n_symbols, n_candles))
+    for t in range(1, n_candles):
+        noise[:, t] = 0.8 * noise[:, t - 1] + shocks[:, t]
+    return walks[np.arange(n_symbols) % 4] * (1 + 0.1 * np.arange(n_symbols))[:, None] + noise
+
+
+def run_benchmark(n_pairs: int = 50, n_candles: int = 1000, n_symbols: int = 40, seed: int = 0) -> dict:
+    """Per-pair time of the native Engle-Granger test vs statsmodels, and of a batched scan"""
+    closes = random_universe(max(n_symbols, 2), n_candles, seed)
+    idx_1, idx_2 = upper_triangle_pairs(len(closes))
+    pairs = list(zip(idx_1[:n_pairs], idx_2[:n_pairs]))
+
+    calculate_cointegration_statsmodels(closes[0], closes[1]) # the import isn't part of the timing
+
+    started = time.perf_counter()
+    for i, j in pairs:
+        calculate_cointegration(closes[i], closes[j])
+    native = (time.perf_counter() - started) / len(pairs)
+
+    started = time.perf_counter()
+    for i, j in pairs:
+        calculate_cointegration_statsmodels(closes[i], closes[j])
+    statsmodels = (time.perf_counter() - started) / len(pairs)
+
+    started = time.perf_counter()
+    batch_cointegration(closes, idx_1, idx_2)
+    batched = (time.perf_counter() - started) / len(idx_1)
+
+    return {
+        "candles": n_candles,
+        "native_ms_per_pair": native * 1e3,
+        "statsmodels_ms_per_pair": statsmodels * 1e3,
+        "speedup": statsmodels / native,
+        "batched_ms_per_pair": batched * 1e3,
+        "batched_pairs": len(idx_1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Native Engle-Granger test vs statsmodels")
+    parser.add_argument("--pairs", help="Pairs timed one by one", default=50, type=int)
+    parser.add_argument("--candles", default=1000, type=int)
+    parser.add_argument("--symbols", help="Universe size for the batched scan", default=40, type=int)
+    args = parser.parse_args()
+
+    for key, value in run_benchmark(args.pairs, args.candles, args.symbols).items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
@@ -0,0 +1,96 @@
+import argparse
+import json
+import time
+
+from typing import Dict, List, Tuple
+
+from api.orderbook import OrderBook
+from mock_exchange.matching import apply_book_message
+from mock_exchange.replay import synthetic_session
+
+
+def dict_trade_details(levels: List[dict], direction: str, capital: float, stop_loss_fail_safe: float,
+                       price_rounding: int, quantity_rounding: int) -> Tuple[float, float, float]:
+    # Execution.get_trade_details before the sorted OrderBook: float-convert and sort every
+    # level of the dict book on each call. Returns (order price, stop loss, quantity).
+    order_price = 0
+    quantity = 0
+    stop_loss = 0
+    bid_items_list = []
+    ask_items_list = []
+    for level in levels:
+        price = float(level["price"])
+        if level["side"] == "Buy":
+            bid_items_list.append(price)
+        else:
+            ask_items_list.append(price)
+
+    if len(ask_items_list) > 0 and len(bid_items_list) > 0:
+        ask_items_list.sort()
+        bid_items_list.sort()
+        bid_items_list.reverse()
+        nearest_ask = ask_items_list[0]
+        nearest_bid = bid_items_list[0]
+        if direction == "Long":
+            order_price = nearest_bid
+            stop_loss = round(order_price * (1 - stop_loss_fail_safe), price_rounding)
+        else:
+            order_price = nearest_ask
+            stop_loss = round(order_price * (1 + stop_loss_fail_safe), price_rounding)
+        quantity = round(capital / order_price, quantity_rounding) if capital > 0 else 0
+    return (order_price, stop_loss, quantity)
+
+
+def book_messages(symbol: str = "BTCUSDT", updates: int = 3000, seed: int = 0) -> List[dict]:
+    # a snapshot and then deltas for one symbol, from the mock exchange's synthetic session
+    session = synthetic_session(seconds=updates / 20, updates_per_second=20, seed=seed)
+    return [msg for _, msg in session.events if msg["topic"].endswith(f".{symbol}")]
+
+
+def _per_call(fn, items) -> float:
+    started = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - started) / len(items)
+
+
+def run_benchmark(updates: int = 3000, seed: int = 0) -> dict:
+    """Per-message/per-call time of the dict book vs the sorted OrderBook, 25 levels a side"""
+    messages = book_messages(updates=updates, seed=seed)
+    deltas = messages[1:]
+
+    levels: Dict[str, dict] = {}
+    apply_book_message(levels, messages[0])
+    book = OrderBook("BTCUSDT")
+    book.apply(messages[0])
+    dict_delta = _per_call(lambda msg: apply_book_message(levels, msg), deltas)
+    book_delta = _per_call(book.apply, deltas)
+
+    calls = range(updates)
+    level_list = list(levels.values())
+    dict_details = _per_call(lambda _: dict_trade_details(level_list, "Long", 1000, 0.15, 2, 3), calls)
+    book_details = _per_call(lambda _: book.best_bid_ask(), calls)
+    book_copy_details = _per_call(lambda _: book.copy().best_bid_ask(), calls) # what get_orderbook hands out
+    depth_query = _per_call(lambda _: (book.vwap("Buy", 100), book.liquidity("Sell", 5)), calls)
+    json_loads = _per_call(json.loads, [json.dumps(msg) for msg in deltas])
+
+    return {
+        "messages": len(messages),
+        "dict_delta_us": dict_delta * 1e6,
+        "orderbook_delta_us": book_delta * 1e6,
+        "json_loads_us": json_loads * 1e6,
+        "dict_trade_details_us": dict_details * 1e6,
+        "orderbook_best_bid_ask_us": book_details * 1e6,
+        "orderbook_copy_best_bid_ask_us": book_copy_details * 1e6,
+        "vwap_liquidity_us": depth_query * 1e6,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dict order book vs the sorted OrderBook")
+    parser.add_argument("--updates", help="Deltas replayed", default=3000, type=int)
+    parser.add_argument("--seed", default=0, type=int)
+    args = parser.parse_args()
+
+    for key, value in run_benchmark(args.updates, args.seed).items():
+        print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
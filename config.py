@@ -1,9 +1,17 @@
 from dataclasses import dataclass
 import os
+from typing import Union
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# environment variable behind each setting that has to be given
+_ENV_NAMES = {"api_url": "TESTNET_REST_BASE_URL", "ws_public_url": "TESTNET_WS_PUBLIC_URL"}
+
+def _interval(value: str) -> Union[int, str]:
+    # ByBit's minute counts stay ints; "D", "4h", "1D" etc. stay strings
+    return int(value) if value.isdigit() else value
+
 @dataclass(frozen=True)
 class Config:
     api_key: str = os.getenv("TESTNET_API_KEY", "")
@@ -11,7 +19,9 @@ class Config:
     api_url: str = os.getenv("TESTNET_REST_BASE_URL", "")
     ws_public_url: str = os.getenv("TESTNET_WS_PUBLIC_URL", "")
 
-    interval: int = int(os.getenv("TIME_RANGE", 60))
+    interval: Union[int, str] = _interval(os.getenv("TIME_RANGE", "60")) # minutes, or e.g. "4h"/"1D" with a base_interval
+    # download and store this finer interval (e.g. 1) once and resample it to `interval` locally ("" = download `interval`)
+    base_interval: Union[int, str] = _interval(os.getenv("BASE_INTERVAL", ""))
     zscore_window: int = int(os.getenv("Z_SCORE_LIMIT", 21))
     limit: int = int(os.getenv("HISTORY_DEPTH", 0))
 
@@ -25,5 +35,34 @@ class Config:
     tradeable_capital_usdt: int = 400 # tradeable capital to be split between both pairs
     stop_loss_fail_safe: float = 0.15 # stop loss in market order in case of drastic event
     signal_trigger_threshold: float = 0.01 # z-score threshold which determines whether we trade or not
+    hedge_ratio_forgetting: float = float(os.getenv("HEDGE_RATIO_FORGETTING", 1)) # 1 = OLS over the cached HISTORY_DEPTH candles, < 1 favours recent ones
+
+    limit_order: bool = True # indicates whether to place limit orders (else use market orders)
+
+    # ByBit allows 50 GET requests/s per IP sustained, 70/s for up to 5 seconds
+    rest_rate_limit: float = float(os.getenv("REST_RATE_LIMIT", 50))
+    rest_burst: int = int(os.getenv("REST_BURST", 70))
+    download_workers: int = int(os.getenv("DOWNLOAD_WORKERS", 8)) # concurrent price history downloads
+    rest_connect_timeout: float = float(os.getenv("REST_CONNECT_TIMEOUT", 3.05)) # seconds
+    rest_read_timeout: float = float(os.getenv("REST_READ_TIMEOUT", 10)) # seconds
+
+    # Cointegration scan pre-filters (0 = off)
+    screen_top_k: int = int(os.getenv("SCREEN_TOP_K", 0)) # only test each symbol's K most return-correlated partners
+    min_turnover_24h: float = float(os.getenv("MIN_TURNOVER_24H", 0)) # skip symbols trading less than this (USDT) per day
+    scan_skip_p_above: float = float(os.getenv("SCAN_SKIP_P_ABOVE", 1)) # rescans don't retest pairs last seen above this p-value...
+    scan_max_skips: int = int(os.getenv("SCAN_MAX_SKIPS", 24)) # ...more than this many times in a row
+
+    account_snapshot_ttl: float = float(os.getenv("ACCOUNT_SNAPSHOT_TTL", 2)) # seconds positions/orders are reused for
+
+    # Latency/throughput metrics (api/metrics.py) for the live loop
+    metrics_port: int = int(os.getenv("METRICS_PORT", 0)) # serve Prometheus text on this port (0 = off)
+    metrics_json_file: str = os.getenv("METRICS_JSON_FILE", "") # write a JSON snapshot here periodically ("" = off)
+    metrics_dump_every: float = float(os.getenv("METRICS_DUMP_EVERY", 60)) # seconds
+
+    orderbook_stale_after: float = float(os.getenv("ORDERBOOK_STALE_AFTER", 10)) # seconds without an update before reconnecting
 
-    limit_order: bool = True # indicates whether to place limit orders (else use market orders)
\ No newline at end of file
+    def require(self, *fields: str):
+        # fail at startup rather than connecting to wherever an empty/default setting leads
+        missing = [f"{field} ({_ENV_NAMES.get(field, field.upper())})" for field in fields if not getattr(self, field)]
+        if missing:
+            raise ValueError(f"Missing config: {', '.join(missing)} - set it in the environment or .env")
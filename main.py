@@ -1,13 +1,13 @@
+import asyncio
 import signal
 import sys
 import argparse
 import logging
 
-from time import sleep
 from config import Config
-from strategy.test import Test
-from strategy.execution import Execution
-from api.rest_client import RestClient
+
+# Strategy and API modules are imported inside the branch that needs them, so
+# e.g. --close_all doesn't wait on matplotlib/statsmodels before cancelling anything
 
 
 def signal_handler(sig, frame):
@@ -18,6 +18,14 @@ def signal_handler(sig, frame):
 signal.signal(signal.SIGINT, signal_handler)
 
 
+def start_metrics(config: Config):
+    from api.metrics import dump_metrics_periodically, serve_metrics
+    if config.metrics_port:
+        serve_metrics(config.metrics_port)
+    if config.metrics_json_file:
+        dump_metrics_periodically(config.metrics_json_file, config.metrics_dump_every)
+
+
 # 20230521 - Cointegrated pairs: 1000BTTUSDT,CHZUSDT
 # 20230531 - Cointegrated pairs: SFPUSDT, USDCUSDT
 if __name__ == "__main__":
@@ -26,8 +34,13 @@ if __name__ == "__main__":
     parser.add_argument("--sym2", help="Symbol 2", default="ETHUSDT")
     parser.add_argument("--logfile", help="Log filename", default="statbot_logs.txt")
     parser.add_argument("--generate", help="Generate cointegration data", default=False, action="store_true")
+    parser.add_argument("--workers", help="Worker processes for the cointegration scan (0 = all cores)", default=1, type=int)
     parser.add_argument("--plot", help="Plot graph", default=False, action="store_true")
+    parser.add_argument("--backtest", help="Backtest the pair saved by --plot (3_backtest_file.csv)", default=False, action="store_true")
+    parser.add_argument("--sweep", help="Sweep z-score window/threshold/hedge lookback over the top --pairs pairs (default 10)", default=False, action="store_true")
     parser.add_argument("--close_all", help="Cancel all positions", default=False, action="store_true")
+    parser.add_argument("--pairs", help="Trade the top N pairs from 2_cointegrated_pairs.csv (0 = just --sym1/--sym2)", default=0, type=int)
+    parser.add_argument("--record", help="Record order book and trade streams (of --sym1/--sym2, or the top --pairs pairs) into this directory until Ctrl+C", default="")
     args = parser.parse_args()
 
     config = Config()
@@ -35,17 +48,33 @@ if __name__ == "__main__":
     symbol_2 = args.sym2 
 
     if args.generate:
+        from strategy.test import Test
+        config.require("api_url", "ws_public_url")
         print("Generating cointegration data...")
         t = Test(config, symbol_1, symbol_2)
-        t.run()
+        t.run(workers=args.workers)
         sys.exit(0)
 
     if args.plot:
+        from strategy.test import Test
         print(f"Plotting graph for ({symbol_1}) and ({symbol_2})...")
         t = Test(config, symbol_1, symbol_2)
         t.plot()
         sys.exit(0)
 
+    if args.sweep:
+        from strategy.test import Test
+        print("Sweeping strategy parameters...")
+        t = Test(config, symbol_1, symbol_2)
+        t.sweep(n_pairs=args.pairs or 10, workers=args.workers)
+        sys.exit(0)
+
+    if args.backtest:
+        from strategy.backtest import backtest_file
+        print("Backtesting 3_backtest_file.csv...")
+        backtest_file(config)
+        sys.exit(0)
+
     logname = args.logfile
     logging.basicConfig(
         filename=logname,
@@ -56,10 +85,61 @@ if __name__ == "__main__":
     )
     logger = logging.getLogger('StatBot')
 
+    if args.record:
+        config.require("ws_public_url")
+        from api.market_log import MarketLogWriter, MarketRecorder
+        symbols = [symbol_1, symbol_2]
+        if args.pairs > 0:
+            from strategy.portfolio import load_top_pairs
+            symbols = [symbol for pair in load_top_pairs("2_cointegrated_pairs.csv", args.pairs) for symbol in pair]
+        print(f"Recording {', '.join(symbols)} into {args.record} (Ctrl+C to stop)")
+        MarketRecorder(config.ws_public_url, symbols, MarketLogWriter(args.record, symbols)).run()
+        sys.exit(0)
+
+    config.require("api_url", "ws_public_url")
+    from api.rate_limit import TokenBucket
+    from api.rest_client import RestClient
+    # one rate limiter for every pair's calls, so they can't add up past ByBit's limits
+    rc = RestClient(
+        url=config.api_url,
+        api_key=config.api_key,
+        api_secret=config.api_secret,
+        rate_limiter=TokenBucket(config.rest_rate_limit, config.rest_burst),
+        request_timeout=config.rest_read_timeout,
+        connect_timeout=config.rest_connect_timeout,
+    )
+
+    if args.pairs > 0:
+        from strategy.portfolio import Portfolio, load_top_pairs
+        pairs = load_top_pairs("2_cointegrated_pairs.csv", args.pairs)
+        logger.info(f"Running for {len(pairs)} pairs: {pairs}")
+        portfolio = Portfolio(config, rc, pairs)
+
+        if args.close_all:
+            logger.warning(f"Closing all active orders for {pairs}")
+            portfolio.close_all_positions()
+            sys.exit(0)
+
+        logger.info("Setting leverage for every symbol")
+        portfolio.set_leverage()
+
+        start_metrics(config)
+        logger.info("Seeking trades...")
+        try:
+            asyncio.run(portfolio.trading_loop().run())
+        finally:
+            portfolio.close()
+        sys.exit(0)
+
+    from api.account import AccountSnapshot
+    from api.orderbook import OrderBookFeed
+    from strategy.execution import Execution
+
     logger.info(f"Running for symbol 1 ({symbol_1}) and symbol 2 ({symbol_2})")
 
-    rc = RestClient(url=config.api_url, api_key=config.api_key, api_secret=config.api_secret)
-    execution = Execution(config, rc, symbol_1, symbol_2)
+    orderbook_feed = OrderBookFeed(config.ws_public_url, stale_after=config.orderbook_stale_after)
+    account = AccountSnapshot(rc, [symbol_1, symbol_2], config.account_snapshot_ttl)
+    execution = Execution(config, rc, symbol_1, symbol_2, orderbook_feed=orderbook_feed, account=account)
 
     if args.close_all:
         logger.warning(f"Closing all active orders for {symbol_1} and {symbol_2}")
@@ -69,51 +149,16 @@ if __name__ == "__main__":
     logger.info("Setting leverage for both symbols")
     execution.set_leverage(symbol_1)
     execution.set_leverage(symbol_2)
-    
-    killswitch = 0
-    signal_side = ""
 
+    # Order book updates, candle closes and order/position updates drive the
+    # killswitch state machine (see PairTrader) instead of a fixed sleep
+    from strategy.trading_loop import PairTrader, TradingLoop
+    trader = PairTrader(execution, symbol_1, symbol_2)
+    trading_loop = TradingLoop(config, [trader], orderbook_feed, account)
+
+    start_metrics(config)
     logger.info("Seeking trades...")
-    while True:
-        print("Killswitch:", killswitch)
-        sleep(3) # avoid breaching API rate limit
-
-        # Check if open trades already exist
-        symbol_1_open = execution.open_positions_found(symbol_1)
-        symbol_2_open = execution.open_positions_found(symbol_2)
-
-        # Check if active positions exist
-        symbol_1_active = execution.active_order_found(symbol_1)
-        symbol_2_active = execution.active_order_found(symbol_2)
-
-        checks = [symbol_1_open, symbol_1_active, symbol_2_open, symbol_2_active]
-        logger.info(f"Checks: {checks}")
-
-        manage_new_trades = not any(checks)
-
-        # Can only look to manage new trades if all of the above checks are false
-        if manage_new_trades and killswitch == 0:
-            logger.info("Managing new trades...")
-            killswitch, signal_side = execution.manage_new_trades(killswitch)
-
-        # check for signal to be false
-        # if the signal_side was positive, and now the zscore is negative, it means a mean reversion
-        # has happened, so we need to close the trades
-        # vice versa, if the signal_side was negative, but now the zscore is positive, mean reversion
-        # happened, so we need to close the trades
-        if killswitch == 1:
-            zscore, _ = execution.get_latest_zscore(symbol_1, symbol_2)
-            if signal_side == "positive" and zscore < 0:
-                killswitch = 2
-            if signal_side == "negative" and zscore > 0:
-                killswitch = 2
-
-            # Put back to zero if trades are closed
-            if manage_new_trades and killswitch != 2:
-                killswitch = 0
-
-        # Close all active orders and positions
-        if killswitch == 2:
-            logger.info("Closing existing trades...")
-            killswitch = execution.close_all_positions(killswitch)
-            sleep(5) # bot waits before placing new trades
\ No newline at end of file
+    try:
+        asyncio.run(trading_loop.run())
+    finally:
+        trader.close()
@@ -0,0 +1,120 @@
+import argparse
+import asyncio
+import dataclasses
+import logging
+import time
+
+from typing import Optional
+
+from config import Config
+from mock_exchange.replay import Session, record_session, synthetic_session
+from mock_exchange.server import MockExchange
+
+logger = logging.getLogger(__name__)
+
+
+def run_benchmark(
+    session: Session,
+    speed: float = 1.0,
+    seconds: float = 60.0,
+    latency: float = 0.0,
+    min_step_interval: float = 0.5,
+    config: Optional[Config] = None,
+) -> dict:
+    """Runs the live trading loop for the session's first two symbols against a MockExchange
+    for `seconds`, and returns throughput/latency numbers
+
+    Same wiring as main.py's single pair mode, just pointed at the mock. Private streams
+    are off (no API key in the config), so order monitoring polls like it does when they fail.
+    """
+    from api.account import AccountSnapshot
+    from api.metrics import metrics
+    from api.orderbook import OrderBookFeed
+    from api.rate_limit import TokenBucket
+    from api.rest_client import RestClient
+    from strategy.execution import Execution
+    from strategy.trading_loop import PairTrader, TradingLoop
+
+    exchange = MockExchange(session, speed=speed, latency=latency).start()
+    symbol_1, symbol_2 = session.symbols[:2]
+    config = dataclasses.replace(
+        config or Config(),
+        api_url=exchange.url,
+        ws_public_url=exchange.ws_url,
+        api_key="",
+        api_secret="",
+        interval=max(1, session.interval // 60),
+        limit=min(len(session.klines[symbol]) for symbol in (symbol_1, symbol_2)),
+    )
+
+    rc = RestClient(
+        url=config.api_url,
+        api_key="mock", # the mock doesn't check signatures, pybit just needs something to sign with
+        api_secret="mock",
+        rate_limiter=TokenBucket(config.rest_rate_limit, config.rest_burst),
+        request_timeout=config.rest_read_timeout,
+        connect_timeout=config.rest_connect_timeout,
+    )
+    orderbook_feed = OrderBookFeed(config.ws_public_url, stale_after=config.orderbook_stale_after)
+    account = AccountSnapshot(rc, [symbol_1, symbol_2], config.account_snapshot_ttl)
+    execution = Execution(config, rc, symbol_1, symbol_2, orderbook_feed=orderbook_feed, account=account)
+    trader = PairTrader(execution, symbol_1, symbol_2)
+    trading_loop = TradingLoop(config, [trader], orderbook_feed, account, min_step_interval=min_step_interval)
+
+    async def run():
+        try:
+            await asyncio.wait_for(trading_loop.run(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    started = time.perf_counter()
+    asyncio.run(run()) # also waits for a step still running in its worker thread
+    elapsed = time.perf_counter() - started
+    trader.close()
+    orderbook_feed.close()
+    exchange.stop()
+
+    snapshot = metrics.to_dict()
+    rest_calls = sum(value["count"] for key, value in snapshot.items() if key.startswith("rest_request_seconds"))
+    return {
+        "seconds": elapsed,
+        "steps": trading_loop.steps,
+        "steps_per_second": trading_loop.steps / elapsed,
+        "rest_calls": rest_calls,
+        "tick_to_decision": trading_loop.latency.summary(),
+        "including_queueing": trading_loop.queue_delay.summary(),
+        "calculate_metrics_p50": snapshot.get("calculate_metrics_seconds", {}).get("p50"),
+        "tick_to_order_p50": snapshot.get("tick_to_order_seconds", {}).get("p50"),
+        "exchange": dict(exchange.engine.stats),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the trading loop against a local mock exchange")
+    parser.add_argument("--session", help="Recorded session to replay (default: synthetic BTCUSDT/ETHUSDT books)")
+    parser.add_argument("--record", help="Record the testnet order books of --sym1/--sym2 into this session file and exit")
+    parser.add_argument("--sym1", default="BTCUSDT")
+    parser.add_argument("--sym2", default="ETHUSDT")
+    parser.add_argument("--speed", help="Replay speed (1 = as recorded, 0 = as fast as possible)", default=1.0, type=float)
+    parser.add_argument("--seconds", help="How long to run (or record) for", default=60.0, type=float)
+    parser.add_argument("--latency", help="Seconds added to every REST response", default=0.0, type=float)
+    parser.add_argument("--min_step_interval", help="TradingLoop throttle between steps", default=0.5, type=float)
+    parser.add_argument("--logfile", help="Log filename", default="benchmark_logs.txt")
+    args = parser.parse_args()
+
+    logging.basicConfig(filename=args.logfile, filemode="w", level=logging.INFO,
+                        format='%(asctime)s:%(msecs)d - %(name)s [%(levelname)s]: %(message)s', datefmt="%H:%M:%S")
+    config = Config()
+
+    if args.record:
+        config.require("api_url", "ws_public_url")
+        from api.rest_client import RestClient
+        rc = RestClient(config.api_url, config.api_key, config.api_secret)
+        session = record_session(config.ws_public_url, rc, [args.sym1, args.sym2], args.seconds, config.interval)
+        session.save(args.record)
+        print(f"Recorded {len(session.events)} order book messages over {session.duration:.0f}s into {args.record}")
+    else:
+        session = Session.load(args.session) if args.session else synthetic_session((args.sym1, args.sym2))
+        results = run_benchmark(session, args.speed, args.seconds, args.latency, args.min_step_interval, config)
+        for key, value in results.items():
+            print(f"{key}: {value}")
@@ -0,0 +1,239 @@
+import datetime
+import threading
+import time
+import uuid
+
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# (ret_code, ret_msg) for the rejections the bot can run into
+PARAMS_ERROR = (10001, "params error")
+ORDER_NOT_EXISTS = (130010, "order not exists or too late to cancel")
+REDUCE_ONLY_NO_POSITION = (130125, "current position is zero, cannot fix reduce-only order qty")
+
+ACTIVE_STATUSES = ("Created", "New", "PartiallyFilled")
+
+
+def _now_iso() -> str:
+    return datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def apply_book_message(levels: Dict[str, dict], msg: dict):
+    # Same snapshot/delta handling as api/orderbook.py, on a dict of level id -> level
+    data = msg["data"]
+    if msg["type"] == "snapshot":
+        levels.clear()
+        for level in (data["order_book"] if isinstance(data, dict) else data):
+            levels[level["id"]] = dict(level)
+    elif msg["type"] == "delta":
+        for level in data.get("delete", []):
+            levels.pop(level["id"], None)
+        for level in data.get("update", []) + data.get("insert", []):
+            levels[level["id"]] = {**levels.get(level["id"], {}), **level}
+
+
+class MatchingEngine:
+    """Order books, orders, one-way positions and mark price klines for the mock exchange
+
+    Books only move with the replayed market data - the bot's orders don't take liquidity
+    out of them. Market orders fill in full at the best opposite price. Limit orders rest
+    until the replayed book trades through them (best ask <= buy price, best bid >= sell
+    price); PostOnly orders that would cross on arrival are cancelled, like on ByBit.
+    Stop losses are stored but never triggered.
+    """
+
+    def __init__(self, symbols: List[str], interval_seconds: int, klines: Optional[Dict[str, List[dict]]] = None):
+        self.symbols = list(symbols)
+        self.interval_seconds = interval_seconds
+        self.stats = {"orders": 0, "fills": 0, "cancels": 0, "rejects": 0, "book_updates": 0}
+
+        self._books: Dict[str, Dict[str, dict]] = {symbol: {} for symbol in self.symbols}
+        self._orders: Dict[str, dict] = {} # order_id -> order, in placement order
+        self._positions: Dict[str, Tuple[float, float]] = {symbol: (0.0, 0.0) for symbol in self.symbols} # (signed size, entry price)
+        self._trades: Dict[str, Deque[dict]] = {symbol: deque(maxlen=500) for symbol in self.symbols}
+        self._candles: Dict[str, Dict[int, List[float]]] = {symbol: {} for symbol in self.symbols}
+        self._lock = threading.RLock()
+
+        # recorded candles are shifted so the newest one closes as the current (wall clock) candle opens
+        current = int(time.time() // interval_seconds * interval_seconds)
+        for symbol, history in (klines or {}).items():
+            for k, candle in enumerate(history):
+                start = current - (len(history) - k) * interval_seconds
+                self._candles[symbol][start] = [float(candle[field]) for field in ("open", "high", "low", "close")]
+
+    # Market data
+
+    def apply(self, msg: dict):
+        symbol = msg["topic"].rsplit(".", 1)[1]
+        with self._lock:
+            apply_book_message(self._books[symbol], msg)
+            self.stats["book_updates"] += 1
+            best_bid, best_ask = self.best_bid_ask(symbol)
+            if best_bid and best_ask:
+                self._on_price(symbol, best_bid, best_ask)
+
+    def _on_price(self, symbol: str, best_bid: float, best_ask: float):
+        mid = (best_bid + best_ask) / 2
+        start = int(time.time() // self.interval_seconds * self.interval_seconds)
+        candles = self._candles[symbol]
+        candle = candles.get(start)
+        if candle is None:
+            previous = candles[max(candles)][3] if candles else mid
+            candles[start] = [previous, max(previous, mid), min(previous, mid), mid]
+        else:
+            candle[1], candle[2], candle[3] = max(candle[1], mid), min(candle[2], mid), mid
+
+        # one print per update at the touch, so recent-trading-records has something to average
+        levels = self._books[symbol].values()
+        size = min(level["size"] for level in levels if float(level["price"]) in (best_bid, best_ask))
+        self._trades[symbol].appendleft({
+            "id": str(uuid.uuid4()), "symbol": symbol, "price": mid, "qty": float(size),
+            "side": "Buy", "time": _now_iso(), "trade_time_ms": int(time.time() * 1000), "is_block_trade": False,
+        })
+
+        for order in self._orders.values():
+            if order["symbol"] != symbol or order["order_status"] not in ACTIVE_STATUSES:
+                continue
+            if order["side"] == "Buy" and best_ask <= order["price"]:
+                self._fill(order, order["price"])
+            elif order["side"] == "Sell" and best_bid >= order["price"]:
+                self._fill(order, order["price"])
+
+    def book(self, symbol: str) -> List[dict]:
+        with self._lock:
+            return [dict(level) for level in self._books[symbol].values()]
+
+    def best_bid_ask(self, symbol: str) -> Tuple[float, float]:
+        best_bid, best_ask = 0.0, 0.0
+        with self._lock:
+            for level in self._books[symbol].values():
+                price = float(level["price"])
+                if level["side"] == "Buy":
+                    best_bid = max(best_bid, price)
+                elif best_ask == 0 or price < best_ask:
+                    best_ask = price
+        return (best_bid, best_ask)
+
+    def klines(self, symbol: str, from_time: int, limit: int) -> List[dict]:
+        with self._lock:
+            candles = self._candles[symbol]
+            starts = sorted(start for start in candles if start >= from_time)[:limit]
+            return [
+                {"symbol": symbol, "period": str(self.interval_seconds // 60), "start_at": start,
+                 "open": candles[start][0], "high": candles[start][1], "low": candles[start][2], "close": candles[start][3]}
+                for start in starts
+            ]
+
+    def trades(self, symbol: str, limit: int) -> List[dict]:
+        with self._lock:
+            return list(self._trades[symbol])[:limit]
+
+    # Orders and positions
+
+    def place_order(self, params: dict) -> Tuple[int, str, dict]:
+        try:
+            symbol = params["symbol"]
+            side = params["side"]
+            order_type = params["order_type"]
+            qty = float(params["qty"])
+            price = float(params.get("price") or 0)
+        except (KeyError, ValueError):
+            return (*PARAMS_ERROR, {})
+        if symbol not in self._books or side not in ("Buy", "Sell") or qty <= 0 or (order_type == "Limit" and price <= 0):
+            self.stats["rejects"] += 1
+            return (*PARAMS_ERROR, {})
+
+        with self._lock:
+            position, _ = self._positions[symbol]
+            reduce_only = str(params.get("reduce_only")).lower() == "true"
+            if reduce_only:
+                # only the part that actually reduces the position is kept
+                reducing = position < 0 if side == "Buy" else position > 0
+                if not reducing:
+                    self.stats["rejects"] += 1
+                    return (*REDUCE_ONLY_NO_POSITION, {})
+                qty = min(qty, abs(position))
+
+            now = _now_iso()
+            order = {
+                "order_id": str(uuid.uuid4()), "user_id": 1, "symbol": symbol, "side": side,
+                "order_type": order_type, "price": price, "qty": qty,
+                "time_in_force": params.get("time_in_force", "GoodTillCancel"), "order_status": "New",
+                "last_exec_price": 0.0, "cum_exec_qty": 0.0, "cum_exec_value": 0.0, "cum_exec_fee": 0.0,
+                "reduce_only": reduce_only, "close_on_trigger": False, "order_link_id": "",
+                "created_time": now, "updated_time": now, "take_profit": 0.0,
+                "stop_loss": float(params.get("stop_loss") or 0), "position_idx": int(params.get("position_idx") or 0),
+            }
+            self._orders[order["order_id"]] = order
+            self.stats["orders"] += 1
+
+            best_bid, best_ask = self.best_bid_ask(symbol)
+            touch = best_ask if side == "Buy" else best_bid
+            crosses = touch > 0 and (order_type == "Market" or (touch <= price if side == "Buy" else touch >= price))
+            if order_type == "Market":
+                if touch > 0:
+                    self._fill(order, touch)
+                else:
+                    order["order_status"] = "Rejected" # empty book
+            elif crosses and order["time_in_force"] == "PostOnly":
+                order["order_status"] = "Cancelled"
+            elif crosses:
+                self._fill(order, touch)
+            return (0, "OK", dict(order))
+
+    def _fill(self, order: dict, price: float):
+        qty = order["qty"]
+        signed = qty if order["side"] == "Buy" else -qty
+        position, entry = self._positions[order["symbol"]]
+        new_position = position + signed
+        if position == 0 or (position > 0) == (signed > 0):
+            entry = (abs(position) * entry + qty * price) / abs(new_position) # adding to the position
+        elif new_position != 0 and (new_position > 0) != (position > 0):
+            entry = price # flipped through zero
+        self._positions[order["symbol"]] = (new_position, entry if new_position else 0.0)
+
+        order.update({
+            "order_status": "Filled", "last_exec_price": price, "cum_exec_qty": qty,
+            "cum_exec_value": qty * price, "updated_time": _now_iso(),
+        })
+        self.stats["fills"] += 1
+
+    def cancel_order(self, symbol: str, order_id: str) -> Tuple[int, str, dict]:
+        with self._lock:
+            order = self._orders.get(order_id)
+            if not order or order["symbol"] != symbol or order["order_status"] not in ACTIVE_STATUSES:
+                return (*ORDER_NOT_EXISTS, {})
+            order["order_status"] = "Cancelled"
+            order["updated_time"] = _now_iso()
+            self.stats["cancels"] += 1
+            return (0, "OK", {"order_id": order_id})
+
+    def cancel_all(self, symbol: str) -> List[str]:
+        with self._lock:
+            active = [order["order_id"] for order in self._orders.values()
+                      if order["symbol"] == symbol and order["order_status"] in ACTIVE_STATUSES]
+            for order_id in active:
+                self.cancel_order(symbol, order_id)
+            return active
+
+    def orders(self, symbol: str, statuses: Optional[List[str]] = None) -> List[dict]:
+        with self._lock:
+            return [dict(order) for order in reversed(list(self._orders.values()))
+                    if order["symbol"] == symbol and (not statuses or order["order_status"] in statuses)]
+
+    def order(self, symbol: str, order_id: str) -> Optional[dict]:
+        with self._lock:
+            order = self._orders.get(order_id)
+            return dict(order) if order and order["symbol"] == symbol else None
+
+    def position(self, symbol: str) -> dict:
+        with self._lock:
+            size, entry = self._positions[symbol]
+            best_bid, best_ask = self.best_bid_ask(symbol)
+        mark = (best_bid + best_ask) / 2
+        return {
+            "user_id": 1, "symbol": symbol, "side": "Buy" if size > 0 else "Sell" if size < 0 else "None",
+            "size": abs(size), "entry_price": entry, "position_value": abs(size) * entry,
+            "unrealised_pnl": size * (mark - entry) if size else 0.0,
+            "leverage": 1, "is_isolated": True, "position_idx": 0, "mode": "MergedSingle",
+        }
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+import math
+import threading
+import time
+import numpy as np
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple
+
+from api.orderbook import ORDERBOOK_TOPIC
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Session:
+    """Market data the mock exchange replays
+
+    klines seed each symbol's mark price history (REST kline dicts, oldest first) and
+    events are (seconds since the session started, order book WebSocket message).
+    Saved as JSON lines: a header with interval/symbols/klines, then one event per line.
+    """
+
+    interval: int # kline interval in seconds
+    symbols: List[str]
+    klines: Dict[str, List[dict]] = field(default_factory=dict)
+    events: List[Tuple[float, dict]] = field(default_factory=list)
+
+    @property
+    def duration(self) -> float:
+        return self.events[-1][0] if self.events else 0.0
+
+    def save(self, path: str):
+        with open(path, "w") as fh:
+            fh.write(json.dumps({"interval": self.interval, "symbols": self.symbols, "klines": self.klines}) + "\n")
+            for t, msg in self.events:
+                fh.write(json.dumps({"t": t, "msg": msg}) + "\n")
+
+    @classmethod
+    def load(cls, path: str) -> "Session":
+        with open(path) as fh:
+            header = json.loads(fh.readline())
+            events = [(line["t"], line["msg"]) for line in map(json.loads, fh) if line]
+        return cls(header["interval"], header["symbols"], header["klines"], events)
+
+
+def book_levels(symbol: str, mid: float, tick: float, sizes: np.ndarray) -> Dict[str, dict]:
+    # 25 levels a side around mid, ids derived from the price like ByBit's
+    depth = len(sizes) // 2
+    best_bid = math.floor(mid / tick - 0.5) * tick
+    levels = {}
+    for k in range(depth):
+        for side, price in (("Buy", best_bid - k * tick), ("Sell", best_bid + (k + 1) * tick)):
+            level_id = str(int(round(price * 10000)))
+            levels[level_id] = {"price": f"{price:.4f}", "symbol": symbol, "id": level_id, "side": side,
+                                "size": int(sizes[2 * k + (side == "Sell")])}
+    return levels
+
+
+def book_delta(old: Dict[str, dict], new: Dict[str, dict]) -> dict:
+    return {
+        "delete": [{"price": level["price"], "symbol": level["symbol"], "id": level_id, "side": level["side"]}
+                   for level_id, level in old.items() if level_id not in new],
+        "update": [level for level_id, level in new.items() if level_id in old and old[level_id] != level],
+        "insert": [level for level_id, level in new.items() if level_id not in old],
+    }
+
+
+def synthetic_session(
+    symbols: Tuple[str, str] = ("BTCUSDT", "ETHUSDT"),
+    prices: Tuple[float, float] = (30000.0, 2000.0),
+    ticks: Tuple[float, float] = (0.5, 0.05),
+    seconds: float = 600,
+    updates_per_second: float = 20,
+    interval: int = 60,
+    history: int = 200,
+    seed: int = 0,
+) -> Session:
+    """Two cointegrated order books (a shared random walk plus a mean-reverting spread),
+    for benchmarking without a recording"""
+    rng = np.random.default_rng(seed)
+
+    def pair_path(n: int, sigma: float, start: np.ndarray) -> np.ndarray:
+        walk = np.cumsum(rng.normal(0, sigma, n))
+        spread = np.zeros(n)
+        for k in range(1, n): # OU spread, reverting over ~20 steps
+            spread[k] = 0.95 * spread[k - 1] + rng.normal(0, sigma)
+        return np.exp(np.log(start)[:, None] + np.vstack([walk, walk + spread]))
+
+    candles = pair_path(history + 1, 0.004, np.array(prices))
+    klines = {}
+    for s, symbol in enumerate(symbols):
+        closes = candles[s]
+        klines[symbol] = [
+            {"open": closes[k - 1], "high": max(closes[k - 1], closes[k]), "low": min(closes[k - 1], closes[k]), "close": closes[k]}
+            for k in range(1, history + 1)
+        ]
+
+    n_updates = int(seconds * updates_per_second)
+    mids = pair_path(n_updates, 0.004 / math.sqrt(interval * updates_per_second), candles[:, -1])
+    times = np.sort(rng.uniform(0, seconds, (len(symbols), n_updates)), axis=1)
+
+    events = []
+    for s, symbol in enumerate(symbols):
+        topic = f"{ORDERBOOK_TOPIC}.{symbol}"
+        book = book_levels(symbol, mids[s, 0], ticks[s], rng.integers(1, 500, 50))
+        events.append((0.0, {"topic": topic, "type": "snapshot", "data": {"order_book": list(book.values())}}))
+        for k in range(1, n_updates):
+            sizes = rng.integers(1, 500, 50)
+            new_book = book_levels(symbol, mids[s, k], ticks[s], sizes)
+            events.append((float(times[s, k]), {"topic": topic, "type": "delta", "data": book_delta(book, new_book)}))
+            book = new_book
+    events.sort(key=lambda event: event[0])
+    return Session(interval, list(symbols), klines, events)
+
+
+def record_session(ws_url: str, rest_client, symbols: List[str], seconds: float, interval: int, history: int = 200) -> Session:
+    """Records the public order book streams for `seconds`, plus each symbol's kline history"""
+    import websocket
+    from api.rest_client import interval_to_seconds
+
+    interval_seconds = interval_to_seconds(interval)
+    klines = {}
+    for symbol in symbols:
+        prices = rest_client.get_price_history(symbol, interval, history, int(time.time()) - history * interval_seconds)
+        klines[symbol] = [
+            {name: float(candle[name]) for name in ("open", "high", "low", "close")}
+            for candle in sorted((prices or {}).get("result") or [], key=lambda candle: candle["start_at"])
+        ]
+
+    events: List[Tuple[float, dict]] = []
+    started = time.time()
+
+    def on_message(ws, message):
+        msg = json.loads(message)
+        if msg.get("topic", "").startswith(ORDERBOOK_TOPIC):
+            events.append((time.time() - started, msg))
+
+    ws = websocket.WebSocketApp(
+        ws_url,
+        on_open=lambda ws: ws.send(json.dumps({"op": "subscribe", "args": [f"{ORDERBOOK_TOPIC}.{symbol}" for symbol in symbols]})),
+        on_message=on_message,
+    )
+    threading.Timer(seconds, ws.close).start()
+    ws.run_forever(ping_interval=20, ping_timeout=10)
+    logger.info(f"Recorded {len(events)} order book messages for {', '.join(symbols)}")
+    return Session(interval_seconds, list(symbols), klines, events)
+
+
+async def replay(session: Session, on_event: Callable[[dict], None], speed: float = 1.0, repeat: bool = True):
+    """Feeds the session's events to on_event, `speed` times faster than recorded (<= 0 = no waiting)
+
+    Exchange timestamps are rewritten to the replay time, so receive lag is measured
+    against the replay rather than the recording. With repeat, the session loops from its
+    first snapshots again.
+    """
+    if not session.events:
+        return # nothing to replay, and looping over nothing would never yield to the server
+    while True:
+        started = time.perf_counter()
+        for t, msg in session.events:
+            if speed > 0:
+                delay = t / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                await asyncio.sleep(0) # still let the server answer pings and subscriptions
+            on_event({**msg, "timestamp_e6": int(time.time() * 1e6)})
+        if not repeat:
+            return
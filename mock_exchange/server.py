@@ -0,0 +1,253 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import deque
+from typing import List, Optional, Set
+from urllib.parse import parse_qsl, urlparse
+
+import websockets
+
+from api.orderbook import ORDERBOOK_TOPIC
+from mock_exchange.matching import PARAMS_ERROR, MatchingEngine
+from mock_exchange.replay import Session, replay
+
+logger = logging.getLogger(__name__)
+
+
+class MockExchange:
+    """Local stand-in for ByBit: the USDT perpetual REST endpoints RestClient calls, plus the
+    public orderBookL2_25 WebSocket stream, both backed by a MatchingEngine fed by a replayed Session
+
+    Point Config.api_url at `url` and Config.ws_public_url at `ws_url`. Signatures aren't
+    checked, so any (non-None) API key works. `latency` adds that many seconds to every
+    REST response to stand in for the network round trip.
+
+    With a `rate_limit`, REST requests beyond that many in any one second window are
+    rejected like ByBit does: ret_code 10006 by default, or a bare HTTP 429 with
+    rate_limit_status=429. `stats` counts both, and `accepted` keeps the time of every
+    request that got through.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        speed: float = 1.0,
+        repeat: bool = True,
+        latency: float = 0.0,
+        rate_limit: float = 0.0,
+        rate_limit_status: int = 10006,
+        host: str = "127.0.0.1",
+        http_port: int = 0,
+        ws_port: int = 0,
+    ):
+        self.session = session
+        self.engine = MatchingEngine(session.symbols, session.interval, session.klines)
+        self._speed = speed
+        self._repeat = repeat
+        self._latency = latency
+        self._rate_limit = rate_limit
+        self._rate_limit_status = rate_limit_status
+        self._window: deque = deque() # times of the requests accepted in the last second
+        self._rate_lock = threading.Lock()
+        self.stats = {"requests": 0, "rate_limited": 0}
+        self.accepted: List[float] = []
+        self._host = host
+        self._http_port = http_port
+        self._ws_port = ws_port
+
+        self._http: Optional[ThreadingHTTPServer] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: dict = {} # topic -> set of WebSocket connections
+        self._clients: Set = set()
+        self._ws_ready = threading.Event()
+        self._stopped: Optional[asyncio.Event] = None
+        self.replay_done = threading.Event()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self._host}:{self._http.server_port}"
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://{self._host}:{self._ws_port}"
+
+    def start(self) -> "MockExchange":
+        self._http = ThreadingHTTPServer((self._host, self._http_port), self._http_handler())
+        self._http.daemon_threads = True
+        threading.Thread(target=self._http.serve_forever, name="mock-http", daemon=True).start()
+        threading.Thread(target=lambda: asyncio.run(self._run_ws()), name="mock-ws", daemon=True).start()
+        self._ws_ready.wait(10)
+        logger.info(f"Mock exchange on {self.url} / {self.ws_url}, replaying {len(self.session.events)} events at {self._speed}x")
+        return self
+
+    def stop(self):
+        if self._http:
+            self._http.shutdown()
+        if self._loop and self._stopped:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+    def drop_connections(self):
+        # closes every WebSocket client, like the exchange dropping them, to exercise reconnects
+        async def close_all():
+            await asyncio.gather(*(ws.close() for ws in list(self._clients)), return_exceptions=True)
+        asyncio.run_coroutine_threadsafe(close_all(), self._loop)
+
+    # WebSocket side
+
+    async def _run_ws(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        async with websockets.serve(self._ws_client, self._host, self._ws_port) as server:
+            self._ws_port = server.sockets[0].getsockname()[1]
+            self._ws_ready.set()
+            task = asyncio.create_task(self._replay())
+            await self._stopped.wait()
+            task.cancel()
+
+    async def _replay(self):
+        await replay(self.session, self._publish, self._speed, self._repeat)
+        self.replay_done.set()
+
+    def _publish(self, msg: dict):
+        self.engine.apply(msg)
+        clients: Set = self._subscribers.get(msg["topic"], set())
+        if clients:
+            websockets.broadcast(clients, json.dumps(msg))
+
+    async def _ws_client(self, ws, path=None):
+        topics = []
+        self._clients.add(ws)
+        try:
+            async for message in ws:
+                request = json.loads(message)
+                if request.get("op") == "ping":
+                    await ws.send(json.dumps({"success": True, "ret_msg": "pong", "request": request}))
+                elif request.get("op") == "subscribe":
+                    await ws.send(json.dumps({"success": True, "ret_msg": "", "request": request}))
+                    for topic in request.get("args", []):
+                        symbol = topic.rsplit(".", 1)[-1]
+                        if not topic.startswith(ORDERBOOK_TOPIC) or symbol not in self.engine.symbols:
+                            continue
+                        # snapshot and registration happen without awaiting in between, so no delta is missed
+                        snapshot = {"topic": topic, "type": "snapshot", "data": {"order_book": self.engine.book(symbol)},
+                                    "timestamp_e6": int(time.time() * 1e6)}
+                        self._subscribers.setdefault(topic, set()).add(ws)
+                        topics.append(topic)
+                        await ws.send(json.dumps(snapshot))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self._clients.discard(ws)
+            for topic in topics:
+                self._subscribers[topic].discard(ws)
+
+    # REST side
+
+    def _admit(self) -> bool:
+        with self._rate_lock:
+            now = time.monotonic()
+            self.stats["requests"] += 1
+            while self._window and now - self._window[0] >= 1.0:
+                self._window.popleft()
+            if self._rate_limit and len(self._window) >= self._rate_limit:
+                self.stats["rate_limited"] += 1
+                return False
+            self._window.append(now)
+            self.accepted.append(now)
+            return True
+
+    def _route(self, method: str, path: str, params: dict):
+        engine = self.engine
+        symbol = params.get("symbol", "")
+        if symbol and symbol not in engine.symbols:
+            return (*PARAMS_ERROR, {})
+
+        if path == "/v2/public/time":
+            return (0, "OK", {})
+        if path == "/v2/public/symbols":
+            return (0, "OK", [{"name": name, "alias": name, "status": "Trading", "base_currency": name[:-4],
+                               "quote_currency": "USDT", "maker_fee": "0.0001", "taker_fee": "0.0006"}
+                              for name in engine.symbols])
+        if path == "/v2/public/tickers":
+            tickers = []
+            for name in engine.symbols:
+                best_bid, best_ask = engine.best_bid_ask(name)
+                tickers.append({"symbol": name, "bid_price": str(best_bid), "ask_price": str(best_ask),
+                                "mark_price": str((best_bid + best_ask) / 2), "turnover_24h": "1e9", "volume_24h": "1e6"})
+            return (0, "OK", tickers)
+        if path == "/public/linear/mark-price-kline":
+            return (0, "OK", engine.klines(symbol, int(params.get("from", 0)), int(params.get("limit", 200))))
+        if path == "/public/linear/recent-trading-records":
+            return (0, "OK", engine.trades(symbol, int(params.get("limit", 500))))
+
+        if path == "/private/linear/position/list":
+            if symbol:
+                return (0, "OK", [engine.position(symbol)])
+            return (0, "OK", [{"data": engine.position(name), "is_valid": True} for name in engine.symbols])
+        if path == "/private/linear/position/switch-isolated":
+            return (0, "OK", {})
+        if path == "/private/linear/order/create":
+            return engine.place_order(params)
+        if path == "/private/linear/order/cancel":
+            return engine.cancel_order(symbol, params.get("order_id", ""))
+        if path == "/private/linear/order/cancel-all":
+            return (0, "OK", engine.cancel_all(symbol))
+        if path == "/private/linear/order/list":
+            statuses = params["order_status"].split(",") if params.get("order_status") else None
+            orders = engine.orders(symbol, statuses)
+            return (0, "OK", {"current_page": 1, "last_page": 1, "data": orders})
+        if path == "/private/linear/order/search":
+            if params.get("order_id"):
+                order = engine.order(symbol, params["order_id"])
+                return (0, "OK", order) if order else (0, "OK", None)
+            return (0, "OK", engine.orders(symbol, ["Created", "New", "PartiallyFilled"]))
+        return None
+
+    def _http_handler(self):
+        exchange = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # keep-alive, like the real API
+
+            def _respond(self, method: str, params: dict):
+                if exchange._latency:
+                    time.sleep(exchange._latency)
+                if not exchange._admit():
+                    if exchange._rate_limit_status == 429:
+                        self.send_response(429)
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    routed = (10006, "too many visits!", {})
+                else:
+                    routed = exchange._route(method, urlparse(self.path).path, params)
+                if routed is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                ret_code, ret_msg, result = routed
+                body = json.dumps({"ret_code": ret_code, "ret_msg": ret_msg, "ext_code": "", "ext_info": "",
+                                   "result": result, "time_now": f"{time.time():.6f}"}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._respond("GET", dict(parse_qsl(urlparse(self.path).query)))
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                self._respond("POST", json.loads(body) if body else {})
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
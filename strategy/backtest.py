@@ -0,0 +1,202 @@
+import numpy as np
+import pandas as pd
+
+from dataclasses import dataclass
+from typing import Optional
+
+import config
+from api.rest_client import interval_to_seconds
+
+DEFAULT_FEE_RATE = 0.0006 # ByBit taker fee, charged on every fill
+DEFAULT_SLIPPAGE = 0.0005 # adverse price move per fill, as a fraction of the price
+
+TRADE_COLUMNS = ["entry_idx", "exit_idx", "side", "entry_zscore", "exit_zscore",
+                 "long_entry", "long_exit", "short_entry", "short_exit", "fees", "pnl", "exit_reason"]
+
+
+@dataclass
+class BacktestResult:
+    equity: np.ndarray # account value at every candle close
+    trades: pd.DataFrame
+    stats: dict
+
+
+def _segments(zscore: np.ndarray) -> np.ndarray:
+    # Sign of the z-score carried forward over zeros/NaNs, split into runs of the same sign.
+    # A run ends exactly where the live bot's exit rule (z-score flipping sign) fires.
+    sign = np.sign(np.nan_to_num(zscore))
+    last_nonzero = np.where(sign != 0, np.arange(len(sign)), 0)
+    np.maximum.accumulate(last_nonzero, out=last_nonzero)
+    carried = sign[last_nonzero]
+    return np.concatenate(([0], np.cumsum(carried[1:] != carried[:-1])))
+
+
+def run_backtest(
+    prices_1: np.ndarray,
+    prices_2: np.ndarray,
+    zscore: np.ndarray,
+    capital: float,
+    signal_trigger_threshold: float,
+    stop_loss_fail_safe: float,
+    fee_rate: float = DEFAULT_FEE_RATE,
+    slippage: float = DEFAULT_SLIPPAGE,
+    interval_seconds: Optional[int] = None,
+) -> BacktestResult:
+    """Replays the live rules on candle closes, without a per-candle loop
+
+    Entry: abs(zscore) > signal_trigger_threshold while flat. A positive z-score goes
+    long symbol 2 / short symbol 1, a negative one the other way round, half the capital
+    on each leg (as in Execution.manage_new_trades). Exit: the z-score flips sign.
+    Stop loss: a leg closing stop_loss_fail_safe against its entry closes the pair, and
+    nothing is opened again until the z-score flips (the bot would still be holding the
+    other leg until then). Fills are at the candle close, moved against us by slippage.
+    """
+    prices_1 = np.asarray(prices_1, dtype=float)
+    prices_2 = np.asarray(prices_2, dtype=float)
+    zscore = np.asarray(zscore, dtype=float)
+    n_candles = len(zscore)
+
+    # 1) One possible trade per z-score segment: entry on its first "hot" candle,
+    # exit on the first candle of the next segment (or the last candle, still open)
+    segment = _segments(zscore)
+    segment_starts = np.flatnonzero(np.diff(segment, prepend=-1))
+    hot = np.flatnonzero(np.abs(np.nan_to_num(zscore)) > signal_trigger_threshold)
+    traded_segments, first_hot = np.unique(segment[hot], return_index=True)
+    entries = hot[first_hot]
+    exits = np.append(segment_starts, n_candles - 1)[np.minimum(traded_segments + 1, len(segment_starts))]
+    still_open = traded_segments + 1 >= len(segment_starts)
+    keep = exits > entries # a hot candle at the very end can't be traded
+    entries, exits, still_open = entries[keep], exits[keep], still_open[keep]
+
+    side = np.sign(zscore[entries]) # +1: long symbol 2 / short symbol 1
+    long_is_2 = side > 0
+
+    def leg(prices_if_2, prices_if_1, idx):
+        return np.where(long_is_2, prices_if_2[idx], prices_if_1[idx])
+
+    long_entry_mid = leg(prices_2, prices_1, entries)
+    short_entry_mid = leg(prices_1, prices_2, entries)
+
+    # 2) Stop losses: first candle in (entry, exit] where either leg is through its stop
+    in_trade = np.zeros(n_candles + 1, dtype=np.int64)
+    np.add.at(in_trade, entries + 1, 1)
+    np.add.at(in_trade, exits + 1, -1)
+    candles = np.flatnonzero(np.cumsum(in_trade)[:-1] > 0)
+    trade_of = np.searchsorted(entries, candles, side="left") - 1 # a trade's exit candle can be the next one's entry
+    long_now = np.where(long_is_2[trade_of], prices_2[candles], prices_1[candles])
+    short_now = np.where(long_is_2[trade_of], prices_1[candles], prices_2[candles])
+    stopped = (long_now <= long_entry_mid[trade_of] * (1 - stop_loss_fail_safe)) | \
+              (short_now >= short_entry_mid[trade_of] * (1 + stop_loss_fail_safe))
+    stopped_trades, first_stop = np.unique(trade_of[stopped], return_index=True)
+    stop_candles = candles[stopped][first_stop]
+    # stopped on the flip candle itself counts as a signal exit, but a trade still open at the
+    # end has no flip candle - a stop on the last candle is a stop
+    early = (stop_candles < exits[stopped_trades]) | still_open[stopped_trades]
+    stopped_trades, stop_candles = stopped_trades[early], stop_candles[early]
+    exit_reason = np.where(still_open, "open", "signal").astype(object)
+    exits = exits.copy()
+    exits[stopped_trades] = stop_candles
+    exit_reason[stopped_trades] = "stop_loss"
+
+    # 3) Fills, fees and P&L
+    long_entry = long_entry_mid * (1 + slippage)
+    short_entry = short_entry_mid * (1 - slippage)
+    long_exit = leg(prices_2, prices_1, exits) * (1 - slippage)
+    short_exit = leg(prices_1, prices_2, exits) * (1 + slippage)
+
+    leg_capital = capital * 0.5
+    long_qty = leg_capital / long_entry
+    short_qty = leg_capital / short_entry
+    entry_fees = fee_rate * (long_qty * long_entry + short_qty * short_entry)
+    fees = entry_fees + fee_rate * (long_qty * long_exit + short_qty * short_exit)
+    pnl = long_qty * (long_exit - long_entry) + short_qty * (short_entry - short_exit) - fees
+
+    # 4) Equity: realised P&L booked on the exit candle, open trades marked to market
+    realised = np.zeros(n_candles)
+    np.add.at(realised, exits, pnl)
+    equity = capital + np.cumsum(realised)
+
+    holding = np.zeros(n_candles + 1, dtype=np.int64)
+    np.add.at(holding, entries, 1)
+    np.add.at(holding, exits, -1)
+    open_candles = np.flatnonzero(np.cumsum(holding)[:-1] > 0) # [entry, exit)
+    trade_of = np.searchsorted(entries, open_candles, side="right") - 1
+    long_now = np.where(long_is_2[trade_of], prices_2[open_candles], prices_1[open_candles])
+    short_now = np.where(long_is_2[trade_of], prices_1[open_candles], prices_2[open_candles])
+    equity[open_candles] += long_qty[trade_of] * (long_now - long_entry[trade_of]) \
+        + short_qty[trade_of] * (short_entry[trade_of] - short_now) - entry_fees[trade_of]
+
+    trades = pd.DataFrame({
+        "entry_idx": entries,
+        "exit_idx": exits,
+        "side": np.where(long_is_2, "positive", "negative"),
+        "entry_zscore": zscore[entries],
+        "exit_zscore": zscore[exits],
+        "long_entry": long_entry,
+        "long_exit": long_exit,
+        "short_entry": short_entry,
+        "short_exit": short_exit,
+        "fees": fees,
+        "pnl": pnl,
+        "exit_reason": exit_reason,
+    }, columns=TRADE_COLUMNS)
+
+    return BacktestResult(equity, trades, _summary(equity, trades, capital, interval_seconds))
+
+
+def _summary(equity: np.ndarray, trades: pd.DataFrame, capital: float, interval_seconds: Optional[int]) -> dict:
+    pnl = trades["pnl"].to_numpy()
+    returns = np.diff(equity) / equity[:-1] if len(equity) > 1 else np.zeros(0)
+    drawdown = equity / np.maximum.accumulate(equity) - 1 if len(equity) else np.zeros(0)
+    losses = -pnl[pnl < 0].sum()
+
+    sharpe = np.nan
+    if returns.std() > 0:
+        periods = 365 * 24 * 60 * 60 / interval_seconds if interval_seconds else 1 # per candle if unknown
+        sharpe = returns.mean() / returns.std() * np.sqrt(periods)
+
+    return {
+        "candles": len(equity),
+        "trades": len(pnl),
+        "win_rate": float((pnl > 0).mean()) if len(pnl) else np.nan,
+        "total_pnl": float(pnl.sum()),
+        "total_return": float(equity[-1] / capital - 1) if len(equity) else 0.0,
+        "total_fees": float(trades["fees"].sum()),
+        "profit_factor": float(pnl[pnl > 0].sum() / losses) if losses > 0 else np.inf,
+        "max_drawdown": float(drawdown.min()) if len(drawdown) else 0.0,
+        "sharpe": float(sharpe),
+        "avg_holding_candles": float((trades["exit_idx"] - trades["entry_idx"]).mean()) if len(pnl) else 0.0,
+        "stop_losses": int((trades["exit_reason"] == "stop_loss").sum()),
+    }
+
+
+def backtest_file(
+    config: config.Config,
+    backtest_file: str = "3_backtest_file.csv",
+    trades_file: str = "4_backtest_trades.csv",
+    equity_file: str = "4_backtest_equity.csv",
+    fee_rate: float = DEFAULT_FEE_RATE,
+    slippage: float = DEFAULT_SLIPPAGE,
+) -> BacktestResult:
+    # 3_backtest_file.csv is written by plot_trends: <symbol 1>, <symbol 2>, Spread, Z-Score
+    df = pd.read_csv(backtest_file)
+    symbol_1, symbol_2 = df.columns[0], df.columns[1]
+
+    result = run_backtest(
+        df[symbol_1].to_numpy(),
+        df[symbol_2].to_numpy(),
+        df["Z-Score"].to_numpy(),
+        capital=config.tradeable_capital_usdt,
+        signal_trigger_threshold=config.signal_trigger_threshold,
+        stop_loss_fail_safe=config.stop_loss_fail_safe,
+        fee_rate=fee_rate,
+        slippage=slippage,
+        interval_seconds=interval_to_seconds(config.interval),
+    )
+
+    result.trades.to_csv(trades_file, index=False)
+    pd.DataFrame({"equity": result.equity}).to_csv(equity_file, index=False)
+    print(f"Backtest of {symbol_1}/{symbol_2} - saved trades to {trades_file} and equity curve to {equity_file}")
+    for name, value in result.stats.items():
+        print(f"  {name}: {value}")
+    return result
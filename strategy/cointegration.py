@@ -1,16 +1,20 @@
 import math
-import statsmodels.api as sm
-import pandas as pd
+import time
 import numpy as np
 
-from typing import List, Union
+from collections import Counter
+from typing import List, Literal, Tuple, Union
 
-from statsmodels.tsa.stattools import coint
 from dataclasses import dataclass
 
+from strategy.engle_granger import batch_cointegration, upper_triangle_pairs
+from strategy.parallel_scan import ScanProgress, iter_pair_results, resolve_workers
+from strategy.screening import screen_pairs, screen_report
 
-def _form_key(symbol1, symbol2):
-    return f"{symbol1}-{symbol2}"
+# pandas is imported inside the functions that build Series/DataFrames, so the live
+# loop (which only uses the numpy parts of this module) starts without it
+
+COINT_COLUMNS = ["sym_1", "sym_2", "p_value", "t_value", "c_value", "hedge_ratio", "zero_crossings"]
 
 
 def extract_close_prices(prices: list):
@@ -23,53 +27,133 @@ def extract_close_prices(prices: list):
     return close_prices
 
 
-def get_cointegration_pairs(price_data: dict):
-    seen = {}
-    pairs: List[dict[str, Union[str, float, int]]] = []
-    count = 0
-    skipped = 0
+def stack_close_prices(price_data: dict) -> Tuple[List[str], np.ndarray]:
+    # One (symbols, candles) matrix of close prices. Symbols with NaN closes, or a
+    # different history length to the rest of the universe, can't be stacked so are left out.
+    series = {}
     for symbol, data in price_data.items():
-        for symbol2, data2 in price_data.items():
-            if symbol == symbol2:
-                continue
-            if _form_key(symbol, symbol2) in seen \
-                    or _form_key(symbol2, symbol) in seen:
-                # not using continue cause 180x180 is BIG!
-                break
-
-            series_1 = extract_close_prices(data["result"])
-            series_2 = extract_close_prices(data2["result"])
-
-            coint = calculate_cointegration(series_1, series_2)
-
-            if not coint:
-                skipped += 1
-                continue
-
-            if coint.cointegrated:
-                seen[_form_key(symbol, symbol2)] = True
-                pairs.append({
-                    "sym_1": symbol,
-                    "sym_2": symbol2,
-                    "p_value": coint.p_value,
-                    "t_value": coint.t_value,
-                    "c_value": coint.c_value,
-                    "hedge_ratio": coint.hedge_ratio,
-                    "zero_crossings": coint.zero_crossings,
-                })
+        close_prices = extract_close_prices(data["result"])
+        if close_prices:
+            series[symbol] = close_prices
+
+    if not series:
+        return [], np.empty((0, 0))
+
+    length, _ = Counter(len(close_prices) for close_prices in series.values()).most_common(1)[0]
+    symbols = [symbol for symbol, close_prices in series.items() if len(close_prices) == length]
+    closes = np.array([series[symbol] for symbol in symbols], dtype=float)
+    return symbols, closes
+
+
+def get_cointegration_pairs(
+    price_data: dict,
+    engine: Literal["vectorized", "statsmodels"] = "vectorized",
+    workers: int = 1,
+    top_k: int = 0,
+):
+    symbols, closes = stack_close_prices(price_data)
+    skipped = len(price_data) - len(symbols)
+    if skipped:
+        print(f"Cointegration - Skipped {skipped} symbols with missing or short histories.")
+    return find_cointegrated_pairs(symbols, closes, engine, workers, top_k)
+
+
+def find_cointegrated_pairs(
+    symbols: List[str],
+    closes: np.ndarray,
+    engine: Literal["vectorized", "statsmodels"] = "vectorized",
+    workers: int = 1,
+    top_k: int = 0,
+):
+    # closes is a (symbols, candles) matrix, e.g. from stack_close_prices or PriceStore.load_closes.
+    # With top_k > 0 only each symbol's top_k most correlated partners are tested (see screening.py)
+    import pandas as pd
+    started = time.perf_counter()
+    total = len(symbols) * (len(symbols) - 1) // 2
+    if top_k > 0:
+        idx_1, idx_2 = screen_pairs(closes, top_k)
+        print(screen_report(len(symbols), idx_1, started))
+    else:
+        idx_1, idx_2 = upper_triangle_pairs(len(symbols))
+
+    if engine == "statsmodels":
+        return _get_cointegration_pairs_statsmodels(symbols, closes, idx_1, idx_2)
+
+    print(f"Cointegration - Testing {len(idx_1)} pairs across {len(symbols)} symbols "
+          f"with {resolve_workers(workers)} worker(s).")
 
-        count += 1
-        if (count + skipped) % 20 == 0:
-            print(f"Cointegration - Processed {count} symbols. Skipped {skipped} symbols.")
+    pairs: List[dict[str, Union[str, float, int]]] = []
+    for i, j, results in iter_pair_results(closes, workers, (idx_1, idx_2)):
+        pairs.extend(cointegrated_rows(symbols, i, j, results))
+
+    elapsed = time.perf_counter() - started
+    if top_k > 0 and len(idx_1):
+        print(f"Cointegration - Screened scan took {elapsed:.1f}s, "
+              f"testing all {total} pairs would take ~{elapsed / len(idx_1) * total:.1f}s")
+    else:
+        print(f"Cointegration - Scan took {elapsed:.1f}s")
 
-    coint_df = pd.DataFrame(pairs)
+    coint_df = pd.DataFrame(pairs, columns=COINT_COLUMNS)
+    coint_df = coint_df.sort_values("zero_crossings", ascending=False)
+
+    return coint_df
+
+
+def cointegrated_rows(symbols: List[str], idx_1: np.ndarray, idx_2: np.ndarray, results: dict) -> List[dict]:
+    # Same flag and rounding as calculate_cointegration / Cointegration
+    cointegrated = (results["p_value"] < 0.5) & (results["t_value"] < results["c_value"])
+    rows = []
+    for k in np.flatnonzero(cointegrated):
+        rows.append({
+            "sym_1": symbols[idx_1[k]],
+            "sym_2": symbols[idx_2[k]],
+            "p_value": round(float(results["p_value"][k]), 2),
+            "t_value": round(float(results["t_value"][k]), 2),
+            "c_value": round(float(results["c_value"][k]), 2),
+            "hedge_ratio": round(float(results["hedge_ratio"][k]), 2),
+            "zero_crossings": int(results["zero_crossings"][k]),
+        })
+    return rows
+
+
+def _get_cointegration_pairs_statsmodels(symbols: List[str], closes: np.ndarray, idx_1: np.ndarray, idx_2: np.ndarray):
+    # Reference implementation: one statsmodels coint + OLS fit per pair.
+    # Each unordered pair is tested exactly once.
+    import pandas as pd
+    pairs: List[dict[str, Union[str, float, int]]] = []
+    skipped = 0
+    progress = ScanProgress(len(idx_1))
+    for i, j in zip(idx_1, idx_2):
+        coint = calculate_cointegration_statsmodels(closes[i], closes[j])
+        progress.update(1)
+
+        if not coint:
+            skipped += 1
+            continue
+
+        if coint.cointegrated:
+            pairs.append({
+                "sym_1": symbols[i],
+                "sym_2": symbols[j],
+                "p_value": coint.p_value,
+                "t_value": coint.t_value,
+                "c_value": coint.c_value,
+                "hedge_ratio": coint.hedge_ratio,
+                "zero_crossings": coint.zero_crossings,
+            })
+
+    print(f"Cointegration - Skipped {skipped} pairs.")
+
+    coint_df = pd.DataFrame(pairs, columns=COINT_COLUMNS)
     coint_df = coint_df.sort_values("zero_crossings", ascending=False)
 
     return coint_df
 
 
 def calculate_spread(series_1, series_2, hedge_ratio):
-    return pd.Series(series_1) - (pd.Series(series_2) * hedge_ratio)
+    # hedge_ratio is one value, or one per candle (e.g. from calculate_hedge_ratios)
+    import pandas as pd
+    return pd.Series(series_1) - (pd.Series(series_2) * np.asarray(hedge_ratio))
 
 
 @dataclass
@@ -106,6 +190,32 @@ class Cointegration:
 
 
 def calculate_cointegration(series_1, series_2):
+    # Native Engle-Granger test (strategy/engle_granger.py) - same numbers as the
+    # statsmodels version below, without its import or per-call overhead
+    closes = np.vstack([np.asarray(series_1, dtype=float), np.asarray(series_2, dtype=float)])
+    results = batch_cointegration(closes, np.array([0]), np.array([1]))
+
+    p_value = float(results["p_value"][0])
+    t_value = float(results["t_value"][0])
+    c_value = float(results["c_value"][0])
+    if math.isnan(p_value):
+        return None
+
+    return Cointegration(
+        p_value,
+        c_value,
+        t_value,
+        float(results["hedge_ratio"][0]),
+        bool(p_value < 0.5 and t_value < c_value),
+        int(results["zero_crossings"][0]),
+    )
+
+
+def calculate_cointegration_statsmodels(series_1, series_2):
+    # Reference implementation. statsmodels takes seconds to import, so only pay for it when used
+    import statsmodels.api as sm
+    from statsmodels.tsa.stattools import coint
+
     coint_flag = False
     coint_result = coint(series_1, series_2)
 
@@ -140,6 +250,75 @@ def calculate_cointegration(series_1, series_2):
     )
 
 
+class RecursiveHedgeRatio:
+    """Incremental version of the hedge ratio in calculate_cointegration
+
+    Recursive least squares for series_1 = hedge_ratio * series_2 (no constant, like the
+    sm.OLS fit), with an optional forgetting factor: each candle's weight decays by
+    `forgetting` per newer candle. For a single regressor RLS reduces to two decayed
+    running sums, so each update is O(1). forgetting=1 gives exactly the OLS hedge ratio
+    of every candle seen so far.
+    """
+
+    def __init__(self, forgetting: float = 1.0):
+        if not 0 < forgetting <= 1:
+            raise ValueError(f"forgetting must be in (0, 1], got {forgetting}")
+        self._forgetting = forgetting
+        self._sxy = 0.0
+        self._sxx = 0.0
+        self._count = 0
+
+    @property
+    def forgetting(self) -> float:
+        return self._forgetting
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def hedge_ratio(self) -> float:
+        if self._sxx == 0:
+            return math.nan
+        return self._sxy / self._sxx
+
+    def reset(self):
+        self._sxy = 0.0
+        self._sxx = 0.0
+        self._count = 0
+
+    def update(self, value_1: float, value_2: float) -> float:
+        self._sxy = self._forgetting * self._sxy + value_1 * value_2
+        self._sxx = self._forgetting * self._sxx + value_2 * value_2
+        self._count += 1
+        return self.hedge_ratio
+
+    def peek(self, value_1: float, value_2: float) -> float:
+        # hedge ratio if (value_1, value_2) were the newest candle, without storing it
+        sxx = self._forgetting * self._sxx + value_2 * value_2
+        if sxx == 0:
+            return math.nan
+        return (self._forgetting * self._sxy + value_1 * value_2) / sxx
+
+    def extend(self, series_1, series_2) -> float:
+        for value_1, value_2 in zip(series_1, series_2):
+            self.update(value_1, value_2)
+        return self.hedge_ratio
+
+
+def calculate_hedge_ratios(series_1, series_2, forgetting: float = 1.0) -> np.ndarray:
+    # Hedge ratio as of every candle (RecursiveHedgeRatio after each update), so
+    # calculate_spread(series_1, series_2, calculate_hedge_ratios(...)) has no look-ahead
+    series_1 = np.asarray(series_1, dtype=float)
+    series_2 = np.asarray(series_2, dtype=float)
+    if forgetting == 1.0:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.cumsum(series_1 * series_2) / np.cumsum(series_2 * series_2)
+
+    estimator = RecursiveHedgeRatio(forgetting)
+    return np.array([estimator.update(value_1, value_2) for value_1, value_2 in zip(series_1, series_2)])
+
+
 # Standard deviation = measure of how dispersed data is compared to mean value (over X amount of days)
 # Higher standard deviation = smaller z-score
 #
@@ -149,6 +328,7 @@ def calculate_cointegration(series_1, series_2):
 # Mean = mean spread over X amount of days
 # Higher mean = z-score goes further towards/along -ve value = spread more likely to be lower than mean
 def calculate_zscore(spread_data, window):
+    import pandas as pd
     df = pd.DataFrame(spread_data)
     rolling_window = df.rolling(center=False, window=window)
     mean = rolling_window.mean()
@@ -157,3 +337,144 @@ def calculate_zscore(spread_data, window):
 
     df["z-score"] = (spread_value - mean) / standard_deviation
     return df["z-score"].astype(float).to_list()
+
+
+def calculate_spread_zscores(series_1, series_2, zscore_window: int, forgetting: float = 1.0) -> list:
+    # Offline counterpart of SpreadZScore: every candle's spread uses the hedge ratio of the
+    # candles up to and including it, over exactly the series given
+    hedge_ratios = calculate_hedge_ratios(series_1, series_2, forgetting)
+    return calculate_zscore(calculate_spread(series_1, series_2, hedge_ratios), zscore_window)
+
+
+class RollingZScore:
+    """Streaming version of calculate_zscore, for the live loop
+
+    Keeps the last `window` spread values in a ring buffer alongside a running
+    (Welford) mean and sum of squared deviations, so each update is O(1).
+    Matches calculate_zscore(...)[-1]: NaN until the window is full, sample std (ddof=1).
+    """
+
+    def __init__(self, window: int):
+        self._window = window
+        self._values = np.zeros(window)
+        self._head = 0 # slot the next value is written to
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._latest = math.nan
+
+    @property
+    def window(self) -> int:
+        return self._window
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def zscore(self) -> float:
+        return self._zscore(self._latest, self._count, self._mean, self._m2)
+
+    def reset(self):
+        self._head = 0
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._latest = math.nan
+
+    def update(self, value: float) -> float:
+        if self._count == self._window:
+            self._count, self._mean, self._m2 = self._remove(
+                self._values[self._head], self._count, self._mean, self._m2)
+        self._count, self._mean, self._m2 = self._add(value, self._count, self._mean, self._m2)
+
+        self._values[self._head] = value
+        self._head = (self._head + 1) % self._window
+        self._latest = value
+
+        # Sliding Welford slowly accumulates rounding error, so refresh from the buffer once per lap
+        if self._head == 0 and self._count == self._window:
+            self._mean = float(self._values.mean())
+            self._m2 = float(((self._values - self._mean) ** 2).sum())
+
+        return self.zscore
+
+    def extend(self, values) -> float:
+        for value in values:
+            self.update(value)
+        return self.zscore
+
+    def peek(self, value: float) -> float:
+        # z-score if value were the newest entry, without storing it
+        count, mean, m2 = self._count, self._mean, self._m2
+        if count == self._window:
+            count, mean, m2 = self._remove(self._values[self._head], count, mean, m2)
+        count, mean, m2 = self._add(value, count, mean, m2)
+        return self._zscore(value, count, mean, m2)
+
+    def _zscore(self, value: float, count: int, mean: float, m2: float) -> float:
+        if count < self._window or count < 2:
+            return math.nan
+        variance = m2 / (count - 1)
+        if variance <= 0:
+            return math.nan
+        return (value - mean) / math.sqrt(variance)
+
+    @staticmethod
+    def _add(value: float, count: int, mean: float, m2: float) -> Tuple[int, float, float]:
+        count += 1
+        delta = value - mean
+        mean += delta / count
+        m2 += delta * (value - mean)
+        return count, mean, m2
+
+    @staticmethod
+    def _remove(value: float, count: int, mean: float, m2: float) -> Tuple[int, float, float]:
+        if count <= 1:
+            return 0, 0.0, 0.0
+        count -= 1
+        delta = value - mean
+        mean -= delta / count
+        m2 -= delta * (value - mean)
+        return count, mean, m2
+
+
+class SpreadZScore:
+    """Live z-score of series_1 - hedge_ratio * series_2 over the cached kline window
+
+    A bounded-window rebuild, not an O(1) recursive update: when a candle closes, the
+    hedge ratio and z-score are replayed over the closed candles of the current window,
+    O(window) once per candle. Every spread in the window depends on the hedge ratio
+    accumulated from the window's first candle, and that moves with each candle, so
+    sliding the estimate can't be done in O(1) while matching the offline numbers.
+    In between closes, the live (last) candle is only peeked, in O(1). Gives the same
+    numbers as calculate_spread_zscores(...)[-1] on the same closes, which is what
+    --plot, --backtest and --sweep use.
+    """
+
+    def __init__(self, zscore_window: int, forgetting: float = 1.0):
+        self._hedge = RecursiveHedgeRatio(forgetting)
+        self._zscore = RollingZScore(zscore_window)
+        self._replayed = False
+
+    @property
+    def hedge_ratio(self) -> float:
+        return self._hedge.hedge_ratio
+
+    def reset(self):
+        self._hedge.reset()
+        self._zscore.reset()
+        self._replayed = False
+
+    def update(self, series_1, series_2, candle_closed: bool = True) -> float:
+        # series_1/series_2: the kline window, last value being the live candle
+        if candle_closed or not self._replayed:
+            self._hedge.reset()
+            self._zscore.reset()
+            for value_1, value_2 in zip(series_1[:-1], series_2[:-1]):
+                hedge_ratio = self._hedge.update(value_1, value_2)
+                self._zscore.update(value_1 - value_2 * hedge_ratio)
+            self._replayed = True
+
+        hedge_ratio = self._hedge.peek(series_1[-1], series_2[-1])
+        return self._zscore.peek(series_1[-1] - series_2[-1] * hedge_ratio)
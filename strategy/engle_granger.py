@@ -0,0 +1,161 @@
+import math
+import numpy as np
+
+from typing import Dict, Tuple
+
+# Number of pairs pushed through the batched regressions at once.
+# Each chunk holds a (pairs, candles, lags) design matrix, so this keeps memory bounded.
+PAIR_CHUNK_SIZE = 512
+
+# Same "perfectly colinear" cut-off statsmodels.coint uses
+_COLINEAR_RSQUARED = 1 - 100 * np.sqrt(np.finfo(np.double).eps)
+
+# MacKinnon tables for the only case we run: two I(1) series, regression with a constant.
+# Copied from statsmodels.tsa.adfvalues (N=2, "c") so the scan doesn't have to import statsmodels.
+# p-values: MacKinnon (1994) surface, critical values: MacKinnon (2010) response surface.
+_TAU_MAX = 0.92
+_TAU_MIN = -18.86
+_TAU_STAR = -2.62
+_TAU_SMALLP = (2.92, 1.5012, 0.039796)
+_TAU_LARGEP = (2.1945, 0.64695, -0.29198, -0.042377)
+_TAU_CRIT = ( # 1%, 5%, 10% - coefficients of 1, 1/nobs, 1/nobs^2, 1/nobs^3
+    (-3.89644, -10.9519, -33.527, 0.0),
+    (-3.33613, -6.1101, -6.823, 0.0),
+    (-3.04445, -4.2412, -2.72, 0.0),
+)
+
+
+def upper_triangle_pairs(n_symbols: int) -> Tuple[np.ndarray, np.ndarray]:
+    # every unordered pair (i, j) with i < j, exactly once
+    return np.triu_indices(n_symbols, k=1)
+
+
+def default_maxlag(nobs: int) -> int:
+    # Schwert (1989) rule used by adfuller, with no deterministic terms in the ADF regression
+    maxlag = int(np.ceil(12.0 * np.power(nobs / 100.0, 1 / 4.0)))
+    return min(nobs // 2 - 1, maxlag)
+
+
+def _adf_design(resid: np.ndarray, lags: int, trim: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Builds the ADF regression for every row of resid at once:
+    #   diff(e)_t = g * e_{t-1} + sum_j b_j * diff(e)_{t-j}
+    # trim is the number of leading diffs dropped (so all lag lengths share the same rows)
+    n_candles = resid.shape[1]
+    xdiff = np.diff(resid, axis=1)
+    columns = [resid[:, trim:n_candles - 1]]
+    for lag in range(1, lags + 1):
+        columns.append(xdiff[:, trim - lag:n_candles - 1 - lag])
+    return np.stack(columns, axis=2), xdiff[:, trim:]
+
+
+def _solve_leading(gram: np.ndarray, xty: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray]:
+    inverse = np.linalg.inv(gram[:, :size, :size])
+    params = np.einsum("pkl,pl->pk", inverse, xty[:, :size])
+    return params, inverse
+
+
+def batch_adf(resid: np.ndarray, maxlag: int) -> np.ndarray:
+    """ADF t-statistics (no constant, AIC lag selection) for every row of resid"""
+    n_pairs, n_candles = resid.shape
+
+    # 1) Pick the lag length per row, using the same rows for every candidate lag
+    design, endog = _adf_design(resid, maxlag, maxlag)
+    nobs = endog.shape[1]
+    gram = np.einsum("pnk,pnl->pkl", design, design)
+    xty = np.einsum("pnk,pn->pk", design, endog)
+    yty = np.einsum("pn,pn->p", endog, endog)
+
+    aic = np.empty((n_pairs, maxlag + 1))
+    for lag in range(maxlag + 1):
+        params, _ = _solve_leading(gram, xty, lag + 1)
+        ssr = yty - np.einsum("pk,pk->p", params, xty[:, :lag + 1])
+        # -2 * llf + 2 * k, without the terms that are equal for every lag
+        aic[:, lag] = nobs * np.log(ssr / nobs) + 2 * (lag + 1)
+    best_lags = np.argmin(aic, axis=1)
+
+    # 2) Re-run the regression with the chosen lag (this uses more rows than the search did)
+    t_values = np.empty(n_pairs)
+    for lag in np.unique(best_lags):
+        rows = best_lags == lag
+        design, endog = _adf_design(resid[rows], lag, lag)
+        nobs = endog.shape[1]
+        gram = np.einsum("pnk,pnl->pkl", design, design)
+        xty = np.einsum("pnk,pn->pk", design, endog)
+        params, inverse = _solve_leading(gram, xty, lag + 1)
+        fitted = np.einsum("pnk,pk->pn", design, params)
+        sigma2 = np.sum((endog - fitted) ** 2, axis=1) / (nobs - lag - 1)
+        t_values[rows] = params[:, 0] / np.sqrt(sigma2 * inverse[:, 0, 0])
+
+    return t_values
+
+
+def mackinnon_crit(nobs: int) -> np.ndarray:
+    # 1%, 5% and 10% critical values of the Engle-Granger t-statistic, as mackinnoncrit(N=2, "c")
+    return np.array([np.polynomial.polynomial.polyval(1.0 / nobs, coef) for coef in _TAU_CRIT])
+
+
+def mackinnon_p(t_values: np.ndarray) -> np.ndarray:
+    # Approximate p-values of Engle-Granger t-statistics, as mackinnonp(t, "c", N=2)
+    t_values = np.asarray(t_values, dtype=float)
+    with np.errstate(invalid="ignore"): # +-inf t-values (colinear pairs) are clipped below
+        small = np.polynomial.polynomial.polyval(t_values, _TAU_SMALLP)
+        large = np.polynomial.polynomial.polyval(t_values, _TAU_LARGEP)
+    z = np.where(t_values <= _TAU_STAR, small, large)
+    # standard normal cdf, via erfc so scipy isn't needed either
+    p_values = np.array([0.5 * math.erfc(-value / math.sqrt(2)) for value in z.ravel()]).reshape(z.shape)
+    p_values[t_values > _TAU_MAX] = 1.0
+    p_values[t_values < _TAU_MIN] = 0.0
+    return p_values
+
+
+def batch_cointegration(closes: np.ndarray, idx_1: np.ndarray, idx_2: np.ndarray) -> Dict[str, np.ndarray]:
+    """Engle-Granger test for the pairs (closes[idx_1], closes[idx_2])
+
+    closes is a (symbols, candles) matrix. Results match calculate_cointegration_statsmodels
+    (statsmodels coint + OLS hedge ratio), just computed for many pairs at once.
+    """
+    n_candles = closes.shape[1]
+    maxlag = default_maxlag(n_candles)
+
+    # Cointegrating regression (series_1 on series_2 plus a constant) comes straight from
+    # the covariance matrix - one matrix multiply for the whole universe
+    centred = closes - closes.mean(axis=1, keepdims=True)
+    cov = centred @ centred.T
+    # Hedge ratio is OLS without a constant, same as sm.OLS(series_1, series_2)
+    raw = closes @ closes.T
+
+    t_values = np.empty(len(idx_1))
+    hedge_ratios = np.empty(len(idx_1))
+    zero_crossings = np.empty(len(idx_1), dtype=int)
+
+    for start in range(0, len(idx_1), PAIR_CHUNK_SIZE):
+        i = idx_1[start:start + PAIR_CHUNK_SIZE]
+        j = idx_2[start:start + PAIR_CHUNK_SIZE]
+        chunk = slice(start, start + len(i))
+
+        beta = cov[i, j] / cov[j, j]
+        resid = centred[i] - beta[:, None] * centred[j]
+        rsquared = cov[i, j] ** 2 / (cov[i, i] * cov[j, j])
+
+        t_chunk = np.full(len(i), -np.inf)
+        fit = rsquared < _COLINEAR_RSQUARED
+        if fit.any():
+            t_chunk[fit] = batch_adf(resid[fit], maxlag)
+        t_values[chunk] = t_chunk
+
+        hedge_ratio = raw[i, j] / raw[j, j]
+        spread = closes[i] - closes[j] * hedge_ratio[:, None]
+        hedge_ratios[chunk] = hedge_ratio
+        zero_crossings[chunk] = np.count_nonzero(np.diff(np.sign(spread), axis=1), axis=1)
+
+    # nobs - 1 to match statsmodels.coint (which matches Stata's egranger)
+    c_value = mackinnon_crit(n_candles - 1)[1]
+    p_values = mackinnon_p(t_values)
+
+    return {
+        "t_value": t_values,
+        "p_value": p_values,
+        "c_value": np.full(len(idx_1), c_value),
+        "hedge_ratio": hedge_ratios,
+        "zero_crossings": zero_crossings,
+    }
@@ -2,17 +2,22 @@ from dataclasses import dataclass
 from typing import Union, List, Literal, Tuple, Optional
 import config, json
 
-from pybit import usdt_perpetual
-from time import sleep
-import datetime
 import logging
+import math
+import threading
+import time
 
-from strategy.cointegration import extract_close_prices
+from concurrent.futures import ThreadPoolExecutor
+
+from api.account import AccountSnapshot
+from api.kline_cache import KlineCache
+from api.metrics import metrics
+from api.orderbook import OrderBook, OrderBookFeed
 from api.rest_client import RestClient
 
 from statistics import mean
 
-from strategy.cointegration import calculate_cointegration, calculate_spread, calculate_zscore
+from strategy.cointegration import calculate_cointegration, Cointegration, SpreadZScore
 
 logger = logging.getLogger(__name__)
 
@@ -38,14 +43,44 @@ class Execution:
         symbol_1: str,
         symbol_2: str,
         state_file: Optional[str] = None,
+        orderbook_feed: Optional[OrderBookFeed] = None,
+        kline_cache: Optional[KlineCache] = None,
+        account: Optional[AccountSnapshot] = None,
     ):
         self._config = config
         self._rc = rest_client
+        self._orderbooks = orderbook_feed or OrderBookFeed(
+            config.ws_public_url, stale_after=config.orderbook_stale_after)
+        self._klines = kline_cache or KlineCache(rest_client, config.interval, config.limit, base_interval=config.base_interval)
+        self._account = account or AccountSnapshot(rest_client, [symbol_1, symbol_2], config.account_snapshot_ttl)
+        self._account.add_symbols([symbol_1, symbol_2]) # no-op unless the snapshot is shared with other pairs
         self._symbol_1 = symbol_1
         self._symbol_2 = symbol_2
         self._state_file = state_file
 
-    def get_trade_details(self, orderbook: list, direction: str = "Long", capital: float = 0) -> Union[TradeDetails, None]:
+        # Hedge ratio and rolling z-score over the cached window, rebuilt once per closed candle
+        self._zscore = SpreadZScore(config.zscore_window, config.hedge_ratio_forgetting)
+        self._zscore_candle: Optional[int] = None # start_at of the live candle self._zscore was last rebuilt for
+        self._latest_candle: Optional[int] = None # start_at of the live candle from get_latest_klines
+        self._coint: Optional[Cointegration] = None
+        self._coint_candle: Optional[int] = None
+
+        # Set by the trading loop on order/position updates, so order monitoring
+        # wakes up on a fill instead of always sleeping out the full interval
+        self._account_update = threading.Event()
+
+        # the two legs of a trade are submitted from here at the same time
+        self._leg_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix=f"legs-{symbol_1}-{symbol_2}")
+
+        # time.perf_counter() of the market event that triggered the current decision,
+        # set by the trading loop so order placement can report tick-to-order latency
+        self.tick: Optional[float] = None
+
+    def close(self):
+        # waits for legs still in flight, so a pair isn't left half sent
+        self._leg_pool.shutdown(wait=True)
+
+    def get_trade_details(self, orderbook: Optional[OrderBook], direction: str = "Long", capital: float = 0) -> Union[TradeDetails, None]:
         
         # Set calculation and output variables
         price_rounding = 20
@@ -53,12 +88,10 @@ class Execution:
         order_price = 0
         quantity = 0
         stop_loss = 0
-        bid_items_list = [] # bid refers to highest price buyer will pay
-        ask_items_list = [] # ask refers to lowest price at which seller will sell
 
         # Get prices, stop loss and quantity
         if orderbook:
-            symbol = orderbook[0]["symbol"]
+            symbol = orderbook.symbol
 
             # Set price rounding
             if symbol == self._symbol_1:
@@ -68,25 +101,11 @@ class Execution:
                 price_rounding = self._config.price_rounding_ticker_2
                 quantity_rounding = self._config.quantity_rounding_ticker_2
 
-            # Organise prices
-            for level in orderbook:
-                price = float(level["price"])
-                if level["side"] == "Buy":
-                    bid_items_list.append(price)
-                else:
-                    ask_items_list.append(price)
-
             # Calculate price, size, stop loss and average liquidity
-            if len(ask_items_list) > 0 and len(bid_items_list) > 0:
-
-                # Sort list - to get the best price
-                ask_items_list.sort() # get lowest ask price at beginning of list
-                bid_items_list.sort()
-                bid_items_list.reverse() # get highest bid price at beginning of list
+            if len(orderbook.asks) > 0 and len(orderbook.bids) > 0:
 
-                # Get nearest ask, nearest bid and orderbook spread
-                nearest_ask = ask_items_list[0]
-                nearest_bid = bid_items_list[0]
+                # Get nearest ask, nearest bid (the book is kept sorted, best level first)
+                nearest_bid, nearest_ask = orderbook.best_bid_ask()
 
                 # Calculate order price and hard stop loss
                 if direction == "Long":
@@ -108,17 +127,9 @@ class Execution:
     def get_position_info(self, symbol: str) -> List[PositionInfo]:
         positions = []
 
-        position = self._rc.get_my_position(symbol)
-
-        if not "ret_msg" in position.keys() or not position["ret_msg"] == "OK":
-            return positions
-        
-        if not len(position["result"]) > 0:
-            return positions
-        
         # expect max. 2 positions - one for buy and one for sell
         # for this strategy, we will only get 1 result, because we are either buying or selling a symbol, not both!
-        for pos in position["result"]:
+        for pos in self._account.positions(symbol):
             if pos["size"] > 0:
                 positions.append(
                     PositionInfo(
@@ -132,7 +143,9 @@ class Execution:
         return positions
 
     def place_marker_close_order(self, symbol, position, size, position_idx):
-        return self._rc.close_position(symbol, position, size, position_idx)
+        result = self._rc.close_position(symbol, position, size, position_idx)
+        self._account.invalidate()
+        return result
 
     # cancel all active orders
     def close_all_positions(self, kill_switch: int):
@@ -144,6 +157,7 @@ class Execution:
 
         for symbol in [self._symbol_1, self._symbol_2]:
             res = self._rc.cancel_all_active_orders(symbol)
+            self._account.invalidate()
             if res:
                 logger.warning(f"Cancelled these active orders for symbol ({symbol}): {', '.join(res)}")
             else:
@@ -163,7 +177,8 @@ class Execution:
     def set_leverage(self, ticker):
         return self._rc.set_leverage(ticker)
 
-    def place_order(self, trade_details: TradeDetails, direction: Literal["Long", "Short"]) -> dict:
+    def place_order(self, trade_details: TradeDetails, direction: Literal["Long", "Short"], tick: Optional[float] = None) -> dict:
+        # tick = time.perf_counter() of the market event this order was decided on, if any
         side = "Buy" if direction == "Long" else "Sell"
 
         if self._config.limit_order:
@@ -182,108 +197,109 @@ class Execution:
                 stop_loss=trade_details.stop_loss,
             )
 
+        self._account.invalidate()
+        if tick is not None:
+            metrics.observe("tick_to_order_seconds", time.perf_counter() - tick)
         return result
 
-    @staticmethod
-    def _get_order_book(ticker: str) -> list:
-        ws = usdt_perpetual.WebSocket(
-            test=True,
-            ping_interval=2,  # the default is 30
-            ping_timeout=1,  # the default is 10
-            domain="bybit",  # the default is "bybit"
-            retries=0
-        )
-
-        orderbooks: List[list] = []
-        done = False
-        def handler(msg):
-            nonlocal done
-            orderbooks.append(msg["data"])
-            done = True
-
-        ws.orderbook_25_stream(handler, ticker)
-
-        while not done:
-            sleep(0.1)
-
-        return orderbooks[0]
+    def _get_order_book(self, ticker: str) -> Optional[OrderBook]:
+        return self._orderbooks.get_orderbook(ticker)
 
     def initalise_order_execution(self, ticker: str, direction: Literal["Long", "Short"], capital: float) -> str:
-        orderbook = Execution._get_order_book(ticker)
+        orderbook = self._get_order_book(ticker)
         trade_details = self.get_trade_details(orderbook, direction, capital)
+        order_id, _ = self._submit_order(trade_details, direction, self.tick)
+        return order_id
 
+    def _submit_order(self, trade_details: Optional[TradeDetails], direction: Literal["Long", "Short"], tick: Optional[float] = None) -> Tuple[str, float]:
+        # (order id or "" on failure, time.perf_counter() when the order went out)
         if not trade_details:
             print("Orderbook is empty, so cannot initialise order exeuction")
-            return ""
+            return ("", time.perf_counter())
 
-        order = self.place_order(trade_details, direction)
+        submitted = time.perf_counter()
+        order = self.place_order(trade_details, direction, tick)
         if "result" in order:
             if "order_id" in order["result"]:
-                return order["result"]["order_id"]
+                return (order["result"]["order_id"], submitted)
             
         print("Did not place order :(")
-        return ""
+        return ("", submitted)
+
+    def place_legs(self, legs: List[Tuple[str, Literal["Long", "Short"], float]], tick: Optional[float] = None) -> List[str]:
+        """Places the (ticker, direction, capital) legs concurrently, returning their order ids ("" = failed)
+
+        Both books are read and both orders sized before anything is sent, then the orders
+        go out together from the leg pool, so the second leg isn't waiting on the first
+        one's round trip. If only one of two legs goes through, it's cancelled again so the
+        pair is retried as a whole rather than left half on. A leg that (partly) filled
+        before it could be cancelled is kept, and the caller retries the missing one.
+        """
+        prepared = [
+            (self.get_trade_details(self._get_order_book(ticker), direction, capital), direction)
+            for ticker, direction, capital in legs
+        ]
+        futures = [self._leg_pool.submit(self._submit_order, trade_details, direction, tick) for trade_details, direction in prepared]
+        results = [future.result() for future in futures]
+        order_ids = [order_id for order_id, _ in results]
+
+        if len(results) == 2:
+            gap = abs(results[1][1] - results[0][1])
+            metrics.observe("leg_submission_gap_seconds", gap)
+            logger.info(f"Submitted {legs[0][0]} and {legs[1][0]} legs {gap * 1000:.1f}ms apart")
+
+            if bool(order_ids[0]) != bool(order_ids[1]):
+                placed = 0 if order_ids[0] else 1
+                ticker = legs[placed][0]
+                cancelled = self._rc.cancel_active_order(ticker, order_ids[placed])
+                if not cancelled:
+                    # too late - unless the exchange already dropped it (e.g. a PostOnly that would have crossed)
+                    existing = self.query_existing_order(ticker, order_ids[placed])
+                    cancelled = bool(existing) and existing[2] in ["Cancelled", "Rejected"]
+                self._account.invalidate()
+
+                if cancelled:
+                    logger.warning(f"{legs[1 - placed][0]} leg failed, cancelled the {ticker} leg ({order_ids[placed]})")
+                    order_ids[placed] = ""
+                else:
+                    logger.warning(f"{legs[1 - placed][0]} leg failed and the {ticker} leg was already (partly) filled, keeping it")
+        return order_ids
     
-    def _get_timestamps(self) -> Tuple[int, int, int]:
-        timeframe = self._config.interval
-        history_depth = self._config.limit
-
-        start_time = next_time = 0
-        now = datetime.datetime.now()
-
-        if timeframe == 60: # timeframe of 1 hour
-            start_time = now - datetime.timedelta(hours=history_depth)
-            next_time = now + datetime.timedelta(minutes=history_depth)
-        elif timeframe == "D": # timeframe of 1 day
-            start_time = now - datetime.timedelta(days=history_depth)
-            next_time = now + datetime.timedelta(hours=history_depth)
-        else:
-            return (0, 0, 0)
-
-        start_time_seconds = int(start_time.timestamp())
-        next_time_seconds = int(next_time.timestamp())
-        now_seconds = int(now.timestamp())
-
-        return (
-            start_time_seconds,
-            now_seconds,
-            next_time_seconds,
-        )
-
     # The K-line consists of the opening price, closing price, the highest price,
     # and lowest price within a certain period of time
     def get_price_klines(self, ticker: str) -> list:
-        kline_limit = self._config.limit
-
-        # Get prices
-        time_start_seconds, _, _ = self._get_timestamps()
-        prices = self._rc.get_price_history(
-            ticker,
-            interval=self._config.interval,
-            limit=kline_limit,
-            from_time=time_start_seconds,
-        )
-
-        sleep(0.1) # manage API calls
-        
-        # prices is None if API error encountered
-        if prices and len(prices["result"]) == kline_limit:
-            return prices["result"]
+        # served from the local cache, which only asks the API for candles newer than it has
+        return self._klines.get_klines(ticker)
 
-        return []
-    
     def get_latest_klines(self, symbol_1: str, symbol_2: str) -> Tuple[list, list]:
         series_1 = []
         series_2 = []
 
-        prices_1 = self.get_price_klines(symbol_1)
-        prices_2 = self.get_price_klines(symbol_2)
-
-        if len(prices_1) > 0:
-            series_1 = extract_close_prices(prices_1)
-
-        if len(prices_2) > 0:
-            series_2 = extract_close_prices(prices_2)
+        closes_1 = self._klines.get_closes(symbol_1)
+        closes_2 = self._klines.get_closes(symbol_2)
+        latest_1 = self._klines.latest_start(symbol_1)
+        latest_2 = self._klines.latest_start(symbol_2)
+        if latest_1 != latest_2 and latest_1 is not None and latest_2 is not None:
+            # one cache hasn't seen the new candle yet - give it another go
+            lagging = symbol_1 if latest_1 < latest_2 else symbol_2
+            self._klines.refresh(lagging, force=True)
+            closes_1 = self._klines.get_closes(symbol_1)
+            closes_2 = self._klines.get_closes(symbol_2)
+            latest_1 = self._klines.latest_start(symbol_1)
+            latest_2 = self._klines.latest_start(symbol_2)
+
+        if len(closes_1) > 0:
+            series_1 = closes_1.tolist()
+
+        if len(closes_2) > 0:
+            series_2 = closes_2.tolist()
+
+        # only a candle both symbols have counts as the new live one, so the estimators are
+        # never rebuilt over windows that don't line up (until then the live spread is peeked)
+        if latest_1 == latest_2 and latest_1 is not None:
+            self._latest_candle = latest_1
+        else:
+            logger.warning(f"Klines for {symbol_1} ({latest_1}) and {symbol_2} ({latest_2}) are on different candles")
 
         return (series_1, series_2)
 
@@ -297,19 +313,32 @@ class Execution:
 
         return (quantity_avg, trades[0]["price"])
     
-    def calculate_metrics(self, series_1, series_2) -> Tuple[bool, list]:
-        coint = calculate_cointegration(series_1, series_2)
-        if coint:
-            spread = calculate_spread(series_1, series_2, coint.hedge_ratio)
-            zscore = calculate_zscore(spread, self._config.zscore_window)
-            return (coint.cointegrated, zscore)
-        return (False, [])
-    
+    def calculate_metrics(self, series_1, series_2) -> Tuple[bool, float]:
+        with metrics.time("calculate_metrics_seconds"):
+            return self._calculate_metrics(series_1, series_2)
+
+    def _calculate_metrics(self, series_1, series_2) -> Tuple[bool, float]:
+        # The full cointegration test only informs the log, so it's rerun once per candle
+        if self._coint_candle is None or self._coint_candle != self._latest_candle:
+            self._coint = calculate_cointegration(series_1, series_2)
+            self._coint_candle = self._latest_candle
+        if self._coint:
+            zscore = self._update_zscore(series_1, series_2)
+            return (self._coint.cointegrated, zscore)
+        return (False, math.nan)
+
+    def _update_zscore(self, series_1, series_2) -> float:
+        # The last value of each series is the live (unclosed) candle, so the estimators are
+        # only rebuilt when the window has moved on, and the live spread is peeked
+        candle_closed = self._zscore_candle is None or self._zscore_candle != self._latest_candle
+        self._zscore_candle = self._latest_candle
+        return self._zscore.update(series_1, series_2, candle_closed)
+
     def get_latest_zscore(self, ticker_1: str, ticker_2: str) -> Tuple[float, bool]:
-        orderbook_1 = Execution._get_order_book(ticker_1)
+        orderbook_1 = self._get_order_book(ticker_1)
         trade_details_1 = self.get_trade_details(orderbook_1)
 
-        orderbook_2 = Execution._get_order_book(ticker_2)
+        orderbook_2 = self._get_order_book(ticker_2)
         trade_details_2 = self.get_trade_details(orderbook_2)
 
         if not trade_details_1 or not trade_details_2:
@@ -323,8 +352,8 @@ class Execution:
 
         # Deviating a little from tutorial, because we do care
         # whether pairs are still cointegrated at this point
-        cointegrated, zscore_list = self.calculate_metrics(series_1, series_2)
-        return (zscore_list[-1], cointegrated)
+        cointegrated, zscore = self.calculate_metrics(series_1, series_2)
+        return (zscore, cointegrated)
     
     def open_positions_found(self, ticker: str):
         positions = self.get_position_info(ticker)
@@ -334,7 +363,7 @@ class Execution:
             return False
         
     def active_order_found(self, ticker: str):
-        active_order = self._rc.get_active_order(ticker)
+        active_order = self._account.active_orders(ticker)
         if len(active_order) > 0:
             return True
         else:
@@ -349,7 +378,7 @@ class Execution:
         return (0, 0)
     
     def get_active_position(self, ticker: str):
-        active_order = self._rc.get_active_order(ticker)
+        active_order = self._account.active_orders(ticker)
         if len(active_order) > 0:
             return (active_order[0]["price"], active_order[0]["qty"])
         return (0, 0)
@@ -416,6 +445,13 @@ class Execution:
         if order_status in ["Cancelled", "Rejected", "PendingCancel"]:
             return "Try again"
         
+    def notify_account_update(self):
+        self._account_update.set()
+
+    def _wait_for_account_update(self, timeout: float):
+        self._account_update.wait(timeout)
+        self._account_update.clear()
+
     def manage_new_trades(self, killswitch: int) -> Tuple[int, str]:
         signal_side = ""
         ticker_1, ticker_2 = self._symbol_1, self._symbol_2
@@ -496,19 +532,28 @@ class Execution:
             short_order_status = ""
             long_count = 0
             short_count = 0
+            tick = self.tick # the first placement is decided on the trading loop's event
 
             while killswitch == 0:
+                # place whichever legs need (re)placing, together
+                legs = []
+                if long_count == 0:
+                    legs.append((long_ticker, "Long", initial_capital))
+                if short_count == 0:
+                    legs.append((short_ticker, "Short", initial_capital))
+                order_ids = dict(zip([direction for _, direction, _ in legs], self.place_legs(legs, tick))) if legs else {}
+
                 # place long order
                 if long_count == 0:
-                    long_order_id = self.initalise_order_execution(long_ticker, "Long", initial_capital)
+                    long_order_id = order_ids["Long"]
                     long_count = 1 if long_order_id != "" else 0
                     long_remaining_capital = long_remaining_capital - initial_capital
 
                     logger.info(f"[Long] placed order for {long_ticker}: {long_order_id}")
 
-                # place long order
+                # place short order
                 if short_count == 0:
-                    short_order_id = self.initalise_order_execution(short_ticker, "Short", initial_capital)
+                    short_order_id = order_ids["Short"]
                     short_count = 1 if short_order_id != "" else 0
                     short_remaining_capital = short_remaining_capital - initial_capital
 
@@ -522,10 +567,11 @@ class Execution:
                 if not self._config.limit_order and long_count and short_count:
                     killswitch = 1
 
-                sleep(3) # give time for orders to register
+                self._wait_for_account_update(3) # give time for orders to register
 
                 # Check limit orders and ensure z-score is still within range
                 new_zscore, _ = self.get_latest_zscore(ticker_1, ticker_2)
+                tick = time.perf_counter() # re-placements are decided on this read, not the original event
                 logger.info(f"New z-score: {new_zscore} -- old z-score: {zscore}")
                 if killswitch == 0:
                     new_zscore_positive = new_zscore > 0
@@ -572,6 +618,7 @@ class Execution:
                     else:
                         self._rc.cancel_all_active_orders(long_ticker)
                         self._rc.cancel_all_active_orders(short_ticker)
+                        self._account.invalidate()
                         killswitch = 1
 
         return (killswitch, signal_side)
@@ -0,0 +1,111 @@
+import math
+import os
+import time
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Iterator, Optional, Tuple
+
+from strategy.engle_granger import batch_cointegration, upper_triangle_pairs
+
+MAX_CHUNK_SIZE = 2048 # pairs per task handed to a worker
+MIN_CHUNK_SIZE = 64
+
+# Set in each worker by _attach_worker
+_shm: Optional[shared_memory.SharedMemory] = None
+_closes: Optional[np.ndarray] = None
+_idx_1: Optional[np.ndarray] = None
+_idx_2: Optional[np.ndarray] = None
+
+
+class ScanProgress:
+    def __init__(self, total: int, label: str = "Cointegration", every_seconds: float = 2.0):
+        self._total = total
+        self._label = label
+        self._every = every_seconds
+        self._done = 0
+        self._started = time.monotonic()
+        self._last_print = 0.0
+
+    def update(self, done: int):
+        self._done += done
+        now = time.monotonic()
+        if self._done < self._total and now - self._last_print < self._every:
+            return
+        self._last_print = now
+
+        elapsed = now - self._started
+        pct = 100 * self._done / self._total if self._total else 100
+        eta = elapsed / self._done * (self._total - self._done) if self._done else 0
+        print(f"{self._label} - {pct:.0f}% ({self._done}/{self._total} pairs). "
+              f"Elapsed {elapsed:.1f}s, ETA {eta:.1f}s")
+
+
+def resolve_workers(workers: int) -> int:
+    # 0 (or less) means use every core
+    if workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+def _chunk_size(n_pairs: int, workers: int) -> int:
+    # aim for a few chunks per worker so slow chunks don't leave cores idle at the end
+    size = math.ceil(n_pairs / (workers * 4)) if n_pairs else 1
+    return max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, size))
+
+
+def _attach_worker(name: str, shape: Tuple[int, int], idx_1: np.ndarray, idx_2: np.ndarray):
+    global _shm, _closes, _idx_1, _idx_2
+    _shm = shared_memory.SharedMemory(name=name)
+    _closes = np.ndarray(shape, dtype=np.float64, buffer=_shm.buf)
+    _idx_1, _idx_2 = idx_1, idx_2
+
+
+def _scan_chunk(start: int, stop: int) -> Tuple[int, int, dict]:
+    return start, stop, batch_cointegration(_closes, _idx_1[start:stop], _idx_2[start:stop])
+
+
+def iter_pair_results(
+    closes: np.ndarray,
+    workers: int = 1,
+    pairs: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+) -> Iterator[Tuple[np.ndarray, np.ndarray, dict]]:
+    """Runs batch_cointegration over every i < j pair (or just `pairs`), yielding (idx_1, idx_2, results) per chunk
+
+    With workers > 1 the pairs are split into chunks and spread over a process pool.
+    The close price matrix is placed in shared memory once, rather than pickled into every task.
+    """
+    workers = resolve_workers(workers)
+    idx_1, idx_2 = pairs if pairs is not None else upper_triangle_pairs(closes.shape[0])
+    n_pairs = len(idx_1)
+    chunk_size = _chunk_size(n_pairs, workers)
+    progress = ScanProgress(n_pairs)
+
+    if workers == 1 or n_pairs <= chunk_size:
+        for start in range(0, n_pairs, chunk_size):
+            i, j = idx_1[start:start + chunk_size], idx_2[start:start + chunk_size]
+            results = batch_cointegration(closes, i, j)
+            progress.update(len(i))
+            yield i, j, results
+        return
+
+    shm = shared_memory.SharedMemory(create=True, size=closes.nbytes)
+    try:
+        np.ndarray(closes.shape, dtype=np.float64, buffer=shm.buf)[:] = closes
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_attach_worker,
+            initargs=(shm.name, closes.shape, idx_1, idx_2),
+        ) as executor:
+            futures = [
+                executor.submit(_scan_chunk, start, min(start + chunk_size, n_pairs))
+                for start in range(0, n_pairs, chunk_size)
+            ]
+            for future in as_completed(futures):
+                start, stop, results = future.result()
+                progress.update(stop - start)
+                yield idx_1[start:stop], idx_2[start:stop], results
+    finally:
+        shm.close()
+        shm.unlink()
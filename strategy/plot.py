@@ -3,20 +3,20 @@ import matplotlib.pyplot as plt
 
 from strategy.cointegration import (
     extract_close_prices,
-    calculate_cointegration,
+    calculate_hedge_ratios,
     calculate_spread,
     calculate_zscore
 )
 
 
-def plot_trends(symbol_data_1, symbol_data_2, window):
+def plot_trends(symbol_data_1, symbol_data_2, window, forgetting: float = 1.0):
     # Extract prices
     prices_1 = extract_close_prices(symbol_data_1["data"])
     prices_2 = extract_close_prices(symbol_data_2["data"])
 
-    # Calculate spread
-    coint = calculate_cointegration(prices_1, prices_2)
-    spread = calculate_spread(prices_1, prices_2, coint.hedge_ratio)
+    # Calculate spread - each candle with the hedge ratio of the candles up to it, like
+    # the live loop (SpreadZScore), so the z-scores here are the ones it trades on
+    spread = calculate_spread(prices_1, prices_2, calculate_hedge_ratios(prices_1, prices_2, forgetting))
 
     # Calculate z-score
     zscore = calculate_zscore(spread, window)
@@ -0,0 +1,87 @@
+import dataclasses
+import logging
+
+from typing import List, Tuple
+
+import config
+from api.account import AccountSnapshot
+from api.kline_cache import KlineCache
+from api.orderbook import OrderBookFeed
+from api.rest_client import RestClient
+from strategy.execution import Execution
+from strategy.trading_loop import PairTrader, TradingLoop
+
+logger = logging.getLogger(__name__)
+
+
+def load_top_pairs(pairs_file: str, n_pairs: int) -> List[Tuple[str, str]]:
+    # Best pairs first (the scan sorts by zero crossings). A symbol is only traded in one
+    # pair, because position checks and closing work per symbol, not per pair.
+    import pandas as pd # only needed for this one read, the live loop otherwise runs without it
+    coint_df = pd.read_csv(pairs_file)
+    pairs = []
+    used = set()
+    for sym_1, sym_2 in zip(coint_df["sym_1"], coint_df["sym_2"]):
+        if sym_1 in used or sym_2 in used:
+            continue
+        pairs.append((sym_1, sym_2))
+        used.update((sym_1, sym_2))
+        if len(pairs) == n_pairs:
+            break
+    return pairs
+
+
+class Portfolio:
+    """Trades several cointegrated pairs from one process
+
+    Every pair gets its own Execution and killswitch state machine (PairTrader), but they
+    all share one RestClient, order book feed, kline cache and account snapshot, so adding
+    a pair adds its symbols' streams and not another copy of every connection and poll.
+    tradeable_capital_usdt is split evenly across the pairs.
+    """
+
+    def __init__(self, config: config.Config, rest_client: RestClient, pairs: List[Tuple[str, str]]):
+        self._config = config
+        self._rc = rest_client
+        self.pairs = pairs
+
+        symbols = [symbol for pair in pairs for symbol in pair]
+        self.orderbook_feed = OrderBookFeed(config.ws_public_url, stale_after=config.orderbook_stale_after)
+        self.kline_cache = KlineCache(rest_client, config.interval, config.limit, base_interval=config.base_interval)
+        self.account = AccountSnapshot(rest_client, symbols, config.account_snapshot_ttl)
+
+        pair_config = dataclasses.replace(config, tradeable_capital_usdt=config.tradeable_capital_usdt / max(len(pairs), 1))
+        self.traders = [
+            PairTrader(
+                Execution(
+                    pair_config,
+                    rest_client,
+                    symbol_1,
+                    symbol_2,
+                    orderbook_feed=self.orderbook_feed,
+                    kline_cache=self.kline_cache,
+                    account=self.account,
+                ),
+                symbol_1,
+                symbol_2,
+            )
+            for symbol_1, symbol_2 in pairs
+        ]
+        logger.info(f"Portfolio of {len(pairs)} pairs, {pair_config.tradeable_capital_usdt} USDT each: "
+                    f"{', '.join(f'{s1}/{s2}' for s1, s2 in pairs)}")
+
+    def set_leverage(self):
+        for trader in self.traders:
+            for symbol in trader.symbols:
+                trader.execution.set_leverage(symbol)
+
+    def close_all_positions(self):
+        for trader in self.traders:
+            trader.killswitch = trader.execution.close_all_positions(2)
+
+    def close(self):
+        for trader in self.traders:
+            trader.close()
+
+    def trading_loop(self) -> TradingLoop:
+        return TradingLoop(self._config, self.traders, self.orderbook_feed, self.account)
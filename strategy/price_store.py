@@ -0,0 +1,168 @@
+import json
+import os
+import numpy as np
+
+from typing import Dict, List, Optional, Tuple
+
+from api.resample import KLINE_FIELDS, resample_candles, resample_closes, same_window
+
+PRICE_FIELDS = KLINE_FIELDS
+INDEX_FILE = "index.json"
+
+
+class PriceStore:
+    """Columnar on-disk price histories: one (symbols, candles) .npy matrix per field
+
+    The matrices are opened memory-mapped, so loading one symbol (or a subset) only
+    reads those rows instead of parsing every symbol's history. Symbols with shorter
+    histories are NaN padded at the end, their real length is kept in the index.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._index: Optional[dict] = None
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self._path, INDEX_FILE))
+
+    def _field_file(self, field: str) -> str:
+        return os.path.join(self._path, f"{field}.npy")
+
+    def save(self, price_histories: Dict[str, dict]):
+        self._write({
+            symbol: {field: [kline[field] for kline in data["result"]] for field in PRICE_FIELDS}
+            for symbol, data in price_histories.items()
+        })
+
+    def _write(self, histories: Dict[str, Dict[str, np.ndarray]]):
+        # histories: symbol -> field -> values, oldest first
+        symbols = list(histories.keys())
+        lengths = [len(histories[symbol]["start_at"]) for symbol in symbols]
+        n_candles = max(lengths, default=0)
+
+        os.makedirs(self._path, exist_ok=True)
+        for field in PRICE_FIELDS:
+            matrix = np.full((len(symbols), n_candles), np.nan)
+            for row, symbol in enumerate(symbols):
+                matrix[row, :lengths[row]] = histories[symbol][field]
+            # write then rename, so readers never see a partly written file
+            tmp_file = self._field_file(field) + ".tmp"
+            with open(tmp_file, "wb") as fh:
+                np.save(fh, matrix)
+            os.replace(tmp_file, self._field_file(field))
+
+        # index last, so a half-written store is never mistaken for a complete one
+        self._index = {"symbols": symbols, "lengths": lengths, "fields": list(PRICE_FIELDS)}
+        with open(os.path.join(self._path, INDEX_FILE), "w") as fh:
+            json.dump(self._index, fh)
+
+    def _load_index(self) -> dict:
+        if self._index is None:
+            with open(os.path.join(self._path, INDEX_FILE)) as fh:
+                self._index = json.load(fh)
+        return self._index
+
+    def symbols(self) -> List[str]:
+        return list(self._load_index()["symbols"])
+
+    def __len__(self):
+        return len(self._load_index()["symbols"])
+
+    def __contains__(self, symbol: str):
+        return symbol in self._load_index()["symbols"]
+
+    def _rows(self, symbols: Optional[List[str]]) -> Tuple[List[str], List[int]]:
+        all_symbols = self._load_index()["symbols"]
+        if symbols is None:
+            return list(all_symbols), list(range(len(all_symbols)))
+        positions = {symbol: row for row, symbol in enumerate(all_symbols)}
+        symbols = [symbol for symbol in symbols if symbol in positions]
+        return symbols, [positions[symbol] for symbol in symbols]
+
+    def load_field(self, field: str, symbols: Optional[List[str]] = None) -> Tuple[List[str], np.ndarray]:
+        matrix = np.load(self._field_file(field), mmap_mode="r")
+        symbols, rows = self._rows(symbols)
+        if rows == list(range(len(matrix))):
+            return symbols, matrix # whole universe in storage order - hand back the memory map itself
+        return symbols, matrix[rows]
+
+    def load_closes(self, symbols: Optional[List[str]] = None, interval_seconds: Optional[int] = None) -> Tuple[List[str], np.ndarray]:
+        # Only complete histories - same rule as stack_close_prices (no NaN closes, full length) -
+        # that all cover the same candles, so a symbol whose top-up failed isn't paired with
+        # shifted windows. With interval_seconds, the stored candles are resampled to that interval.
+        symbols, closes = self.load_field("close", symbols)
+        complete = ~np.isnan(closes).any(axis=1)
+        if not complete.all():
+            symbols, closes = [symbol for symbol, keep in zip(symbols, complete) if keep], closes[complete]
+
+        starts = self.load_field("start_at", symbols)[1]
+        if interval_seconds is None:
+            same_grid = same_window(starts)
+            closes = closes if same_grid.all() else closes[same_grid]
+        else:
+            same_grid, closes = resample_closes(starts, closes, interval_seconds)
+        if same_grid.all():
+            return symbols, closes
+        print(f"Left out {(~same_grid).sum()} symbol(s) whose candles don't line up with the rest")
+        return [symbol for symbol, keep in zip(symbols, same_grid) if keep], closes
+
+    def load_klines(self, symbol: str, interval_seconds: Optional[int] = None) -> list:
+        # One symbol in the REST "result" format, optionally resampled to interval_seconds
+        index = self._load_index()
+        length = index["lengths"][index["symbols"].index(symbol)]
+        candles = np.column_stack([self.load_field(field, [symbol])[1][0, :length] for field in PRICE_FIELDS])
+        if interval_seconds is not None:
+            candles = resample_candles(candles, interval_seconds)
+        return [
+            {field: (int(row[k]) if field == "start_at" else float(row[k])) for k, field in enumerate(PRICE_FIELDS)}
+            for row in candles
+        ]
+
+    def latest_starts(self) -> Dict[str, int]:
+        # start_at of each symbol's newest stored candle
+        index = self._load_index()
+        _, starts = self.load_field("start_at")
+        return {
+            symbol: int(starts[row, length - 1])
+            for row, (symbol, length) in enumerate(zip(index["symbols"], index["lengths"])) if length > 0
+        }
+
+    def append(self, price_histories: Dict[str, dict], max_candles: int):
+        # Merges newer candles (REST "result" format) into the stored histories. A stored
+        # candle with the same start_at is replaced (the newest one is usually still open),
+        # and each history keeps only its last max_candles candles.
+        index = self._load_index()
+        # copied out of the memory maps, because the files are about to be rewritten
+        stored = {field: np.array(self.load_field(field)[1]) for field in PRICE_FIELDS}
+        rows = {symbol: row for row, symbol in enumerate(index["symbols"])}
+
+        merged = {}
+        for symbol in dict.fromkeys(index["symbols"] + list(price_histories)):
+            columns = {field: np.empty(0) for field in PRICE_FIELDS}
+            if symbol in rows:
+                length = index["lengths"][rows[symbol]]
+                columns = {field: stored[field][rows[symbol], :length] for field in PRICE_FIELDS}
+
+            klines = price_histories.get(symbol, {}).get("result") or []
+            if klines:
+                keep = columns["start_at"] < klines[0]["start_at"]
+                columns = {
+                    field: np.concatenate([columns[field][keep], [kline[field] for kline in klines]])[-max_candles:]
+                    for field in PRICE_FIELDS
+                }
+            merged[symbol] = columns
+
+        self._write(merged)
+
+    def migrate_json(self, json_path: str) -> bool:
+        # One-off conversion of the old indented JSON price file
+        if self.exists() or not os.path.exists(json_path):
+            return False
+        print(f"Migrating {json_path} to {self._path}")
+        with open(json_path) as json_file:
+            self.save(json.load(json_file))
+        return True
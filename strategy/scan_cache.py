@@ -0,0 +1,108 @@
+import hashlib
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from typing import List
+
+from strategy.cointegration import COINT_COLUMNS, cointegrated_rows
+from strategy.engle_granger import upper_triangle_pairs
+from strategy.parallel_scan import iter_pair_results, resolve_workers
+from strategy.screening import screen_pairs, screen_report
+
+RESULT_FIELDS = ["p_value", "t_value", "c_value", "hedge_ratio", "zero_crossings"]
+CACHE_COLUMNS = ["sym_1", "sym_2", "hash_1", "hash_2"] + RESULT_FIELDS + ["skipped"]
+
+
+def symbol_hashes(closes: np.ndarray) -> List[str]:
+    # Fingerprint of each symbol's close price window - a pair needs retesting only if
+    # either of its symbols' fingerprints changed
+    return [hashlib.blake2b(np.ascontiguousarray(row).tobytes(), digest_size=8).hexdigest() for row in closes]
+
+
+class ScanCache:
+    """Cointegration results of every tested pair (not just the cointegrated ones), keyed
+    by pair and the fingerprints of both price windows, stored as a CSV"""
+
+    def __init__(self, path: str):
+        self._path = path
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def load(self) -> pd.DataFrame:
+        if not os.path.exists(self._path):
+            return pd.DataFrame(columns=CACHE_COLUMNS)
+        return pd.read_csv(self._path, dtype={"hash_1": str, "hash_2": str})
+
+    def save(self, results: pd.DataFrame):
+        tmp_path = self._path + ".tmp"
+        results.to_csv(tmp_path, index=False, columns=CACHE_COLUMNS)
+        os.replace(tmp_path, self._path)
+
+
+def find_cointegrated_pairs_cached(
+    symbols: List[str],
+    closes: np.ndarray,
+    cache: ScanCache,
+    workers: int = 1,
+    top_k: int = 0,
+    skip_p_above: float = 1.0,
+    max_skips: int = 24,
+) -> pd.DataFrame:
+    """find_cointegrated_pairs, but only pairs whose price windows changed since the
+    cached run are tested again
+
+    Pairs whose last p-value was above skip_p_above aren't retested either (they keep
+    their old result) until they've been skipped max_skips times in a row.
+    """
+    started = time.perf_counter()
+    if top_k > 0:
+        idx_1, idx_2 = screen_pairs(closes, top_k)
+        print(screen_report(len(symbols), idx_1, started))
+    else:
+        idx_1, idx_2 = upper_triangle_pairs(len(symbols))
+
+    names = np.array(symbols, dtype=object)
+    hashes = np.array(symbol_hashes(closes), dtype=object)
+    current = pd.DataFrame({
+        "sym_1": names[idx_1], "sym_2": names[idx_2],
+        "hash_1": hashes[idx_1], "hash_2": hashes[idx_2],
+        "idx_1": idx_1, "idx_2": idx_2,
+    })
+    cached = cache.load().rename(columns={"hash_1": "cached_hash_1", "hash_2": "cached_hash_2"})
+    merged = current.merge(cached, on=["sym_1", "sym_2"], how="left")
+
+    unchanged = (merged["hash_1"] == merged["cached_hash_1"]) & (merged["hash_2"] == merged["cached_hash_2"])
+    skip = ~unchanged & (merged["p_value"] > skip_p_above) & (merged["skipped"] < max_skips)
+    retest = (~unchanged & ~skip).to_numpy()
+    print(f"Cointegration - {int(unchanged.sum())} pairs unchanged, {int(skip.sum())} skipped as far from "
+          f"significant, testing {int(retest.sum())} with {resolve_workers(workers)} worker(s).")
+
+    merged.loc[skip, "skipped"] = merged.loc[skip, "skipped"] + 1
+    merged.loc[retest, "skipped"] = 0
+    # skipped pairs keep their old result, but are stored against their old windows
+    merged.loc[skip, "hash_1"] = merged.loc[skip, "cached_hash_1"]
+    merged.loc[skip, "hash_2"] = merged.loc[skip, "cached_hash_2"]
+
+    test_rows = np.flatnonzero(retest)
+    if len(test_rows):
+        position = {(i, j): row for row, i, j in zip(test_rows, idx_1[test_rows], idx_2[test_rows])}
+        values = {field: merged[field].to_numpy(dtype=float) for field in RESULT_FIELDS}
+        for i, j, results in iter_pair_results(closes, workers, (idx_1[test_rows], idx_2[test_rows])):
+            rows = [position[(a, b)] for a, b in zip(i, j)]
+            for field in RESULT_FIELDS:
+                values[field][rows] = results[field]
+        for field in RESULT_FIELDS:
+            merged[field] = values[field]
+
+    merged["skipped"] = merged["skipped"].fillna(0).astype(int)
+    cache.save(merged)
+    print(f"Cointegration - Scan took {time.perf_counter() - started:.1f}s (results cached in {cache.path})")
+
+    results = {field: merged[field].to_numpy(dtype=float) for field in RESULT_FIELDS}
+    pairs = cointegrated_rows(symbols, merged["idx_1"].to_numpy(), merged["idx_2"].to_numpy(), results)
+    coint_df = pd.DataFrame(pairs, columns=COINT_COLUMNS)
+    return coint_df.sort_values("zero_crossings", ascending=False)
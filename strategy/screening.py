@@ -0,0 +1,56 @@
+import time
+import numpy as np
+
+from typing import List, Tuple
+
+
+def return_correlations(closes: np.ndarray) -> np.ndarray:
+    # Correlation matrix of log returns for a (symbols, candles) close price matrix,
+    # from one matrix multiply of the standardised returns
+    returns = np.diff(np.log(closes), axis=1)
+    returns = returns - returns.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(returns, axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = returns / norms
+    correlations = returns @ returns.T
+    return np.nan_to_num(correlations, nan=-1.0) # flat series can't be paired
+
+
+def screen_pairs(closes: np.ndarray, top_k: int, min_correlation: float = -1.0) -> Tuple[np.ndarray, np.ndarray]:
+    """Candidate (idx_1, idx_2) pairs for the cointegration test
+
+    Keeps each symbol's top_k most correlated partners (by log return correlation), so
+    the expensive Engle-Granger test only runs on pairs that move together at all.
+    A pair is kept if it's in the top_k of either symbol. Pairs come back with
+    idx_1 < idx_2 in upper-triangle order, like upper_triangle_pairs.
+    """
+    n_symbols = closes.shape[0]
+    correlations = return_correlations(closes)
+    np.fill_diagonal(correlations, -np.inf)
+
+    k = min(top_k, n_symbols - 1)
+    if k <= 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    partners = np.argpartition(-correlations, k - 1, axis=1)[:, :k]
+    rows = np.repeat(np.arange(n_symbols), k)
+    cols = partners.ravel()
+    keep = correlations[rows, cols] >= min_correlation
+
+    idx_1 = np.minimum(rows[keep], cols[keep])
+    idx_2 = np.maximum(rows[keep], cols[keep])
+    keys = np.unique(idx_1 * n_symbols + idx_2) # sorted, so upper-triangle order
+    return keys // n_symbols, keys % n_symbols
+
+
+def screen_report(n_symbols: int, idx_1: np.ndarray, started: float) -> str:
+    total = n_symbols * (n_symbols - 1) // 2
+    return f"Screening - kept {len(idx_1)} of {total} pairs ({total - len(idx_1)} pruned) " \
+           f"in {time.perf_counter() - started:.2f}s"
+
+
+def filter_by_turnover(symbols: List[dict], tickers: dict, min_turnover: float) -> List[dict]:
+    # symbols as returned by RestClient.get_symbols, tickers by RestClient.get_tickers
+    return [
+        symbol for symbol in symbols
+        if float(tickers.get(symbol["name"], {}).get("turnover_24h") or 0) >= min_turnover
+    ]
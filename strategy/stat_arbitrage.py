@@ -6,22 +6,38 @@
 #   4.1 - plot charts
 #   4.2 - how many times does z-score cross 0 line
 #   4.3 - filter for best co-integrated pairs
-# 5. Backtest
+# 5. Backtest (strategy/backtest.py, run with --backtest after --plot)
 
-import sys, time
+import sys, logging
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Optional, Union
 
 from api.ws import WebSocket
 from api.rest_client import RestClient
+from api.rate_limit import TokenBucket
+from strategy.screening import filter_by_turnover
+
+logger = logging.getLogger(__name__)
 
 
 class StatArbitrage:
     def __init__(self,
                  ws_public_url: str,
                  rest_api_url: str,
-                 price_interval: int):
+                 price_interval: Union[int, str],
+                 rate_limit: float = 50,
+                 burst: int = 70,
+                 workers: int = 8,
+                 request_timeout: float = 10):
         self._ws = WebSocket(ws_public_url)
-        self._rc = RestClient(rest_api_url)
+        self._rc = RestClient(
+            rest_api_url,
+            rate_limiter=TokenBucket(rate_limit, burst),
+            request_timeout=request_timeout,
+        )
         self._interval = price_interval
+        self._workers = workers
         print(f"Ping: {self._ws.ping()}")
 
     def get_tradeable_symbols(self):
@@ -33,30 +49,50 @@ class StatArbitrage:
             print(f"Fetched {len(symbols)} symbols")
         return symbols
 
-    def get_price_histories(self, symbols, limit):
+    def filter_liquid_symbols(self, symbols, min_turnover: float):
+        # one tickers request instead of judging liquidity from each symbol's history
+        tickers = self._rc.get_tickers()
+        liquid = filter_by_turnover(symbols, tickers, min_turnover)
+        print(f"Kept {len(liquid)} of {len(symbols)} symbols with 24h turnover >= {min_turnover}")
+        return liquid
+
+    def _fetch_price_history(self, name: str, limit: int, from_time: int = -1) -> Union[dict, None]:
+        # rate limits, timeouts and connection errors are already retried with backoff by
+        # the transport, so None here means the symbol really failed
+        prices = self._rc.get_price_history(symbol=name, interval=self._interval, limit=limit, from_time=from_time)
+        if not prices:
+            logger.warning(f"Fetching price history for {name} failed")
+        return prices
+
+    def get_price_histories(self, symbols, limit, from_times: Optional[Dict[str, int]] = None):
+        # from_times maps symbol -> start_at to fetch from, for topping up stored histories;
+        # those symbols get whatever is newer, the rest a full `limit` history
+        from_times = from_times or {}
         price_histories = {}
         success = 0
         failures = 0
         skipped = 0
-        for symbol in symbols:
-            name = symbol["name"]
-            prices = self._rc.get_price_history(
-                symbol=name,
-                interval=self._interval,
-                limit=limit)
-
-            if not prices:
-                failures += 1
-            else:
-                if len(prices["result"]) < limit:
-                    skipped += 1
-                else:
-                    price_histories[name] = prices
-                    success += 1
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            futures = {
+                executor.submit(self._fetch_price_history, symbol["name"], limit, from_times.get(symbol["name"], -1)): symbol["name"]
+                for symbol in symbols
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                prices = future.result()
 
-            time.sleep(0.1) # 100ms
+                if not prices:
+                    failures += 1
+                else:
+                    if len(prices["result"]) < limit and name not in from_times:
+                        skipped += 1
+                    else:
+                        price_histories[name] = prices
+                        success += 1
 
-            if (success + failures + skipped) % 20 == 0:
-                print(f"Successes: {success}. Failures: {failures}. Skipped: {skipped}")
+                if (success + failures + skipped) % 20 == 0:
+                    print(f"Successes: {success}. Failures: {failures}. Skipped: {skipped}")
 
-        return price_histories
+        # keep the exchange's symbol order, regardless of which download finished first
+        order = {symbol["name"]: k for k, symbol in enumerate(symbols)}
+        return dict(sorted(price_histories.items(), key=lambda item: order[item[0]]))
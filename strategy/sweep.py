@@ -0,0 +1,152 @@
+import time
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional, Sequence, Tuple
+
+import config
+from api.rest_client import interval_to_seconds
+from strategy.backtest import DEFAULT_FEE_RATE, DEFAULT_SLIPPAGE, run_backtest
+from strategy.cointegration import calculate_hedge_ratios
+from strategy.parallel_scan import ScanProgress, resolve_workers
+
+SWEEP_WINDOWS = (10, 21, 30, 50, 100)
+SWEEP_THRESHOLDS = (0.5, 1.0, 1.5, 2.0, 2.5)
+SWEEP_HEDGE_LOOKBACKS = (0, 100, 250) # 0 = hedge ratio of every candle so far (as --plot and the live loop do)
+
+SWEEP_COLUMNS = ["sym_1", "sym_2", "window", "threshold", "hedge_lookback",
+                 "trades", "win_rate", "total_return", "sharpe", "max_drawdown", "profit_factor", "stop_losses"]
+
+
+def _cumsum(values: np.ndarray) -> np.ndarray:
+    return np.concatenate(([0.0], np.cumsum(values)))
+
+
+def _rolling_sum(cumsum: np.ndarray, window: int) -> np.ndarray:
+    # sums over values[t - window + 1:t + 1] for every t >= window - 1
+    return cumsum[window:] - cumsum[:-window]
+
+
+def rolling_spread(prices_1: np.ndarray, prices_2: np.ndarray, lookback: int, forgetting: float = 1.0) -> Tuple[np.ndarray, int]:
+    # Spread using the OLS (no constant) hedge ratio of the trailing `lookback` candles,
+    # or of every candle so far when lookback is 0 (calculate_hedge_ratios, as the live
+    # loop does). Returns the spread and its first valid index.
+    if lookback <= 0:
+        return prices_1 - calculate_hedge_ratios(prices_1, prices_2, forgetting) * prices_2, 0
+    xy = _rolling_sum(_cumsum(prices_1 * prices_2), lookback)
+    yy = _rolling_sum(_cumsum(prices_2 * prices_2), lookback)
+    start = lookback - 1
+    return prices_1[start:] - xy / yy * prices_2[start:], start
+
+
+def rolling_zscores(spread: np.ndarray, windows: Sequence[int]) -> dict:
+    # Same z-score as calculate_zscore (pandas rolling mean / sample std), for every window
+    # from a single pair of cumulative sums. Each z-score array starts at index window - 1.
+    centred = spread - spread.mean() # keeps the sum of squares well conditioned
+    sums = _cumsum(centred)
+    squares = _cumsum(centred * centred)
+    zscores = {}
+    for window in windows:
+        if window < 2 or window > len(spread):
+            continue
+        total = _rolling_sum(sums, window)
+        mean = total / window
+        variance = (_rolling_sum(squares, window) - total * mean) / (window - 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            zscores[window] = (centred[window - 1:] - mean) / np.sqrt(np.maximum(variance, 0))
+    return zscores
+
+
+def sweep_pair(
+    symbol_1: str,
+    symbol_2: str,
+    prices_1: np.ndarray,
+    prices_2: np.ndarray,
+    windows: Sequence[int],
+    thresholds: Sequence[float],
+    lookbacks: Sequence[int],
+    capital: float,
+    stop_loss_fail_safe: float,
+    fee_rate: float = DEFAULT_FEE_RATE,
+    slippage: float = DEFAULT_SLIPPAGE,
+    interval_seconds: Optional[int] = None,
+    forgetting: float = 1.0,
+) -> List[dict]:
+    rows = []
+    for lookback in lookbacks:
+        if lookback > len(prices_1):
+            continue
+        spread, spread_start = rolling_spread(prices_1, prices_2, lookback, forgetting)
+        for window, zscore in rolling_zscores(spread, windows).items():
+            start = spread_start + window - 1
+            for threshold in thresholds:
+                result = run_backtest(
+                    prices_1[start:], prices_2[start:], zscore,
+                    capital=capital,
+                    signal_trigger_threshold=threshold,
+                    stop_loss_fail_safe=stop_loss_fail_safe,
+                    fee_rate=fee_rate,
+                    slippage=slippage,
+                    interval_seconds=interval_seconds,
+                )
+                stats = result.stats
+                rows.append({
+                    "sym_1": symbol_1,
+                    "sym_2": symbol_2,
+                    "window": window,
+                    "threshold": threshold,
+                    "hedge_lookback": lookback,
+                    **{column: stats[column] for column in SWEEP_COLUMNS[5:]},
+                })
+    return rows
+
+
+def run_sweep(
+    config: config.Config,
+    pairs: List[Tuple[str, str]],
+    symbols: List[str],
+    closes: np.ndarray,
+    windows: Sequence[int] = SWEEP_WINDOWS,
+    thresholds: Sequence[float] = SWEEP_THRESHOLDS,
+    lookbacks: Sequence[int] = SWEEP_HEDGE_LOOKBACKS,
+    workers: int = 1,
+    rank_by: str = "sharpe",
+) -> pd.DataFrame:
+    # closes is a (symbols, candles) matrix, e.g. from PriceStore.load_closes.
+    # Every pair is one task: its spreads and cumulative sums are built once and reused
+    # across the whole grid, and pairs run in separate processes.
+    rows_of = {symbol: row for row, symbol in enumerate(symbols)}
+    pairs = [(s1, s2) for s1, s2 in pairs if s1 in rows_of and s2 in rows_of]
+    workers = resolve_workers(workers)
+    combos = len(windows) * len(thresholds) * len(lookbacks)
+    print(f"Sweep - {combos} parameter combinations across {len(pairs)} pairs with {workers} worker(s).")
+
+    common = dict(
+        windows=windows,
+        thresholds=thresholds,
+        lookbacks=lookbacks,
+        capital=config.tradeable_capital_usdt,
+        stop_loss_fail_safe=config.stop_loss_fail_safe,
+        interval_seconds=interval_to_seconds(config.interval),
+        forgetting=config.hedge_ratio_forgetting,
+    )
+    tasks = [(s1, s2, np.asarray(closes[rows_of[s1]]), np.asarray(closes[rows_of[s2]])) for s1, s2 in pairs]
+
+    started = time.perf_counter()
+    progress = ScanProgress(len(tasks), label="Sweep")
+    rows = []
+    if workers == 1:
+        for task in tasks:
+            rows.extend(sweep_pair(*task, **common))
+            progress.update(1)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(sweep_pair, *task, **common) for task in tasks]
+            for future in as_completed(futures):
+                rows.extend(future.result())
+                progress.update(1)
+    print(f"Sweep - {len(rows)} backtests in {time.perf_counter() - started:.1f}s")
+
+    results = pd.DataFrame(rows, columns=SWEEP_COLUMNS)
+    return results.sort_values([rank_by, "total_return"], ascending=False, na_position="last")
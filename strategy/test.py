@@ -1,8 +1,12 @@
-import json
+import time
+import pandas as pd
 
+from api.rest_client import interval_to_seconds
+from api.resample import fetch_plan
 from strategy.stat_arbitrage import StatArbitrage
-from strategy.cointegration import get_cointegration_pairs
-from strategy.plot import plot_trends
+from strategy.price_store import PriceStore
+from strategy.scan_cache import ScanCache, find_cointegrated_pairs_cached
+from strategy.sweep import run_sweep
 
 class Test:
     def __init__(self, config, symbol_1: str, symbol_2: str):
@@ -10,45 +14,94 @@ class Test:
         self._symbol_1 = symbol_1
         self._symbol_2 = symbol_2
 
-        self._prices_file = "1_price_histories.json"
+        self._legacy_prices_file = "1_price_histories.json" # pre-columnar format, migrated on first use
+        self._prices_store = PriceStore("1_price_histories")
         self._cointegrated_pairs_file = "2_cointegrated_pairs.csv"
+        self._scan_cache = ScanCache("2_scan_cache.csv") # every tested pair, for incremental rescans
+        self._sweep_file = "5_parameter_sweep.csv"
 
-    def run(self):
+        # with a base interval the store holds base candles, resampled to config.interval when read
+        self._fetch_interval, self._fetch_limit, self._resample_seconds = fetch_plan(
+            config.interval, config.base_interval, config.limit)
+
+    def run(self, workers: int = 1):
         sa = StatArbitrage(
             ws_public_url=self._config.ws_public_url,
             rest_api_url=self._config.api_url,
-            price_interval=self._config.interval,
+            price_interval=self._fetch_interval,
+            rate_limit=self._config.rest_rate_limit,
+            burst=self._config.rest_burst,
+            workers=self._config.download_workers,
+            request_timeout=self._config.rest_read_timeout,
         )
 
         # 1) Get tradable symbols
         symbols = sa.get_tradeable_symbols()
+        if self._config.min_turnover_24h > 0:
+            symbols = sa.filter_liquid_symbols(symbols, self._config.min_turnover_24h)
+
+        # 2.1) Get price history - only what's newer than the stored histories, if there are any
+        self._prices_store.migrate_json(self._legacy_prices_file)
+        if self._prices_store.exists():
+            latest = self._prices_store.latest_starts()
+            interval = interval_to_seconds(self._fetch_interval)
+            current_candle = int(time.time() // interval * interval)
+            stale = [symbol for symbol in symbols if latest.get(symbol["name"], -1) < current_candle]
+            print(f"{len(symbols) - len(stale)} symbols already up to date, topping up {len(stale)}")
+            from_times = {symbol["name"]: latest[symbol["name"]] for symbol in stale if symbol["name"] in latest}
+            price_histories = sa.get_price_histories(stale, self._fetch_limit, from_times=from_times)
 
-        # 2.1) Get price history
-        price_histories = sa.get_price_histories(symbols, self._config.limit)
+            # 2.2) Merge them into the columnar store
+            if len(price_histories) > 0:
+                self._prices_store.append(price_histories, self._fetch_limit)
+                print(f"Updated prices in {self._prices_store.path} for {len(price_histories)} symbols")
+        else:
+            price_histories = sa.get_price_histories(symbols, self._fetch_limit)
 
-        # 2.2) Output prices to JSON file
-        if len(price_histories) > 0:
-            print(f"Writing price histories to {self._prices_file}")
-            with open(self._prices_file, "w") as fh:
-                json.dump(price_histories, fh, indent=4)
-            print(f"Saved prices to {self._prices_file} for {len(price_histories)} symbols")
+            # 2.2) Output prices to the columnar store
+            if len(price_histories) > 0:
+                print(f"Writing price histories to {self._prices_store.path}")
+                self._prices_store.save(price_histories)
+                print(f"Saved prices to {self._prices_store.path} for {len(price_histories)} symbols")
 
-        # 3) Find co-integrated pairs (and output to CSV file)
-        with open(self._prices_file) as json_file:
-            price_data = json.load(json_file)
-            if len(price_data) > 0:
-                print(f"Getting co-integrated pairs (and saving into {self._cointegrated_pairs_file})")
-                coint_pairs_df = get_cointegration_pairs(price_data)
-                coint_pairs_df.to_csv(self._cointegrated_pairs_file, index=False)
+        # 3) Find co-integrated pairs (and output to CSV file). Pairs whose price windows
+        # haven't moved since the last scan are served from the scan cache.
+        if self._prices_store.exists() and len(self._prices_store) > 0:
+            print(f"Getting co-integrated pairs (and saving into {self._cointegrated_pairs_file})")
+            symbols, closes = self._prices_store.load_closes([symbol["name"] for symbol in symbols], self._resample_seconds)
+            coint_pairs_df = find_cointegrated_pairs_cached(
+                symbols,
+                closes,
+                self._scan_cache,
+                workers=workers,
+                top_k=self._config.screen_top_k,
+                skip_p_above=self._config.scan_skip_p_above,
+                max_skips=self._config.scan_max_skips,
+            )
+            coint_pairs_df.to_csv(self._cointegrated_pairs_file, index=False)
 
     # 4) Plot trends and save to file (for backtesting)
     def plot(self):
+        from strategy.plot import plot_trends # matplotlib is slow to import and only needed here
         symbol_1 = self._symbol_1
         symbol_2 = self._symbol_2
-        with open(self._prices_file) as json_file:
-            price_data = json.load(json_file)
-            if len(price_data) > 0:
-                print(f"Plotting trend for ({symbol_1}) and ({symbol_2})")
-                symbol_data_1 = {"symbol": symbol_1, "data": price_data[symbol_1]["result"]}
-                symbol_data_2 = {"symbol": symbol_2, "data": price_data[symbol_2]["result"]}
-                plot_trends(symbol_data_1, symbol_data_2, self._config.zscore_window)
+        self._prices_store.migrate_json(self._legacy_prices_file)
+        if self._prices_store.exists() and len(self._prices_store) > 0:
+            print(f"Plotting trend for ({symbol_1}) and ({symbol_2})")
+            # only these two symbols are read from disk
+            symbol_data_1 = {"symbol": symbol_1, "data": self._prices_store.load_klines(symbol_1, self._resample_seconds)}
+            symbol_data_2 = {"symbol": symbol_2, "data": self._prices_store.load_klines(symbol_2, self._resample_seconds)}
+            plot_trends(symbol_data_1, symbol_data_2, self._config.zscore_window, self._config.hedge_ratio_forgetting)
+
+    # 6) Sweep z-score window / trigger threshold / hedge ratio lookback over the best pairs
+    def sweep(self, n_pairs: int = 10, workers: int = 1):
+        self._prices_store.migrate_json(self._legacy_prices_file)
+        if self._prices_store.exists() and len(self._prices_store) > 0:
+            # the top rows as they are - unlike trading, a symbol can be swept in several pairs
+            coint_df = pd.read_csv(self._cointegrated_pairs_file).head(n_pairs)
+            pairs = list(zip(coint_df["sym_1"], coint_df["sym_2"]))
+            symbols, closes = self._prices_store.load_closes(list(dict.fromkeys(symbol for pair in pairs for symbol in pair)), self._resample_seconds)
+            results = run_sweep(self._config, pairs, symbols, closes, workers=workers)
+            results.to_csv(self._sweep_file, index=False)
+            print(f"Saved ranked sweep results to {self._sweep_file}")
+            print(results.head(10).to_string(index=False))
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import time
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional
+
+import config
+from api.account import AccountSnapshot
+from api.metrics import metrics
+from api.orderbook import OrderBookFeed
+from api.rest_client import interval_to_seconds
+from strategy.execution import Execution
+
+logger = logging.getLogger(__name__)
+
+KLINE_CLOSE_DELAY = 2.0 # seconds after a candle boundary before the closed candle is reliably available
+
+
+@dataclass
+class MarketEvent:
+    kind: str # "orderbook", "kline", "account" or "heartbeat"
+    symbol: str
+    received: float # time.perf_counter() when the event was queued
+
+
+class PairTrader:
+    """Killswitch state machine for one pair
+
+    0 = seeking trades, 1 = in a trade (waiting for the z-score to flip), 2 = closing.
+    step() runs one pass of it - the body of the old polling loop in main.py.
+    """
+
+    def __init__(self, execution: Execution, symbol_1: str, symbol_2: str, close_cooldown: float = 5.0):
+        self.execution = execution
+        self.symbol_1 = symbol_1
+        self.symbol_2 = symbol_2
+        self.killswitch = 0
+        self.signal_side = ""
+        self._close_cooldown = close_cooldown
+        self._cooldown_until = 0.0
+
+    @property
+    def symbols(self) -> List[str]:
+        return [self.symbol_1, self.symbol_2]
+
+    def close(self):
+        self.execution.close()
+
+    def step(self, tick: Optional[float] = None):
+        # tick = time.perf_counter() of the event that triggered this step, if any
+        # bot waits after closing before placing new trades
+        if time.monotonic() < self._cooldown_until:
+            return
+
+        execution = self.execution
+        execution.tick = tick
+        symbol_1, symbol_2 = self.symbol_1, self.symbol_2
+        print(f"[{symbol_1}/{symbol_2}] Killswitch:", self.killswitch)
+
+        # Check if open trades already exist
+        symbol_1_open = execution.open_positions_found(symbol_1)
+        symbol_2_open = execution.open_positions_found(symbol_2)
+
+        # Check if active positions exist
+        symbol_1_active = execution.active_order_found(symbol_1)
+        symbol_2_active = execution.active_order_found(symbol_2)
+
+        checks = [symbol_1_open, symbol_1_active, symbol_2_open, symbol_2_active]
+        logger.info(f"[{symbol_1}/{symbol_2}] Checks: {checks}")
+
+        manage_new_trades = not any(checks)
+
+        # Can only look to manage new trades if all of the above checks are false
+        if manage_new_trades and self.killswitch == 0:
+            logger.info("Managing new trades...")
+            self.killswitch, self.signal_side = execution.manage_new_trades(self.killswitch)
+
+        # check for signal to be false
+        # if the signal_side was positive, and now the zscore is negative, it means a mean reversion
+        # has happened, so we need to close the trades
+        # vice versa, if the signal_side was negative, but now the zscore is positive, mean reversion
+        # happened, so we need to close the trades
+        if self.killswitch == 1:
+            zscore, _ = execution.get_latest_zscore(symbol_1, symbol_2)
+            if self.signal_side == "positive" and zscore < 0:
+                self.killswitch = 2
+            if self.signal_side == "negative" and zscore > 0:
+                self.killswitch = 2
+
+            # Put back to zero if trades are closed
+            if manage_new_trades and self.killswitch != 2:
+                self.killswitch = 0
+
+        # Close all active orders and positions
+        if self.killswitch == 2:
+            logger.info("Closing existing trades...")
+            self.killswitch = execution.close_all_positions(self.killswitch)
+            self._cooldown_until = time.monotonic() + self._close_cooldown
+
+
+class LatencyStats:
+    def __init__(self, size: int = 1000):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def summary(self) -> str:
+        if not self._samples:
+            return "no samples"
+        ordered = sorted(self._samples)
+        pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+        return f"n={len(ordered)} p50={pick(0.5):.1f}ms p95={pick(0.95):.1f}ms max={ordered[-1] * 1000:.1f}ms"
+
+
+class TradingLoop:
+    """asyncio loop where market and account events drive the pair state machines
+
+    Order book updates, candle closes and private order/position messages are queued as
+    events. Each burst of events triggers one step() per affected pair, run in a worker
+    thread because Execution is blocking. Pairs step concurrently, and a pair that is
+    still busy (e.g. waiting on order fills) is skipped until it's done, so one slow pair
+    doesn't hold up the rest. A heartbeat keeps things moving if every stream goes quiet.
+    """
+
+    def __init__(
+        self,
+        config: config.Config,
+        traders: List[PairTrader],
+        orderbook_feed: OrderBookFeed,
+        account: AccountSnapshot,
+        min_step_interval: float = 0.5,
+        heartbeat: float = 3.0,
+        report_every: int = 50,
+    ):
+        self._config = config
+        self._traders = traders
+        self._feed = orderbook_feed
+        self._account = account
+        self._min_step_interval = min_step_interval
+        self._heartbeat = heartbeat
+        self._report_every = report_every
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.latency = LatencyStats() # newest event in a burst -> decision made
+        self.queue_delay = LatencyStats() # oldest event in a burst -> decision made (includes throttling)
+        self.steps = 0
+        self._busy: Dict[PairTrader, asyncio.Task] = {} # also keeps a reference to the running tasks
+
+    def _emit(self, kind: str, symbol: str = ""):
+        # safe to call from the WebSocket threads
+        event = MarketEvent(kind, symbol, time.perf_counter())
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, event)
+
+    def _on_account_update(self, topic: str):
+        for trader in self._traders:
+            trader.execution.notify_account_update()
+        self._emit("account", topic)
+
+    async def _kline_closes(self):
+        interval = interval_to_seconds(self._config.interval)
+        while True:
+            now = time.time()
+            next_close = (now // interval + 1) * interval + KLINE_CLOSE_DELAY
+            await asyncio.sleep(next_close - now)
+            self._emit("kline")
+
+    async def _heartbeats(self):
+        while True:
+            await asyncio.sleep(self._heartbeat)
+            self._emit("heartbeat")
+
+    def _affected(self, events: List[MarketEvent]) -> List[PairTrader]:
+        symbols = {event.symbol for event in events if event.kind == "orderbook"}
+        if any(event.kind != "orderbook" for event in events):
+            return self._traders # candle closes and account changes concern every pair
+        return [trader for trader in self._traders if symbols & set(trader.symbols)]
+
+    async def _step(self, trader: PairTrader, oldest: float, newest: float):
+        try:
+            await asyncio.to_thread(trader.step, newest)
+        except Exception:
+            logger.exception(f"[{trader.symbol_1}/{trader.symbol_2}] step failed")
+            metrics.counter("step_errors_total", "PairTrader.step exceptions").inc()
+        finally:
+            self._busy.pop(trader, None)
+
+        decided = time.perf_counter()
+        self.latency.add(decided - newest)
+        self.queue_delay.add(decided - oldest)
+        metrics.observe("tick_to_decision_seconds", decided - newest)
+        metrics.observe("event_queue_delay_seconds", decided - oldest)
+        self.steps += 1
+        if self.steps % self._report_every == 0:
+            logger.info(f"Tick-to-decision latency: {self.latency.summary()} "
+                        f"(including queueing: {self.queue_delay.summary()})")
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+
+        listener = lambda symbol, _: self._emit("orderbook", symbol)
+        self._feed.add_listener(listener)
+        for trader in self._traders:
+            for symbol in trader.symbols:
+                self._feed.subscribe(symbol)
+        if self._account.stream_updates(self._config.api_key, self._config.api_secret, self._on_account_update):
+            logger.info("Listening to private position/order streams")
+
+        tasks = [asyncio.create_task(self._kline_closes()), asyncio.create_task(self._heartbeats())]
+        try:
+            while True:
+                events = [await self._queue.get()]
+                while not self._queue.empty():
+                    events.append(self._queue.get_nowait())
+
+                started = time.perf_counter()
+                metrics.counter("market_events_total", "events taken off the trading loop queue").inc(len(events))
+                oldest = min(event.received for event in events)
+                newest = max(event.received for event in events)
+                for trader in self._affected(events):
+                    if trader not in self._busy:
+                        self._busy[trader] = asyncio.create_task(self._step(trader, oldest, newest))
+
+                # don't hammer the REST API on busy order books
+                await asyncio.sleep(max(0.0, self._min_step_interval - (time.perf_counter() - started)))
+        finally:
+            # connections outlive the loop, and would otherwise post to it after it's closed
+            self._feed.remove_listener(listener)
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the repo isn't an installed package, so make `api`, `strategy` etc. importable from the tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,71 @@
+import pytest
+
+from api.account import AccountSnapshot
+
+POSITION = {"symbol": "AUSDT", "side": "Buy", "size": 1.0, "entry_price": 10.0, "position_idx": 0}
+ORDER = {"symbol": "BUSDT", "price": 20.0, "qty": 2.0}
+
+
+class _RestClient:
+    def __init__(self):
+        self.fail_positions = False
+        self.fail_orders = False
+        self.calls = 0
+
+    def get_all_positions(self):
+        self.calls += 1
+        return None if self.fail_positions else [POSITION, {"symbol": "OTHERUSDT", "size": 5.0}]
+
+    def get_active_order(self, symbol):
+        return None if self.fail_orders else ([ORDER] if symbol == "BUSDT" else [])
+
+
+def test_snapshot_is_cached_for_the_ttl():
+    rc = _RestClient()
+    account = AccountSnapshot(rc, ["AUSDT", "BUSDT"], ttl=60)
+    assert account.positions("AUSDT") == [POSITION]
+    assert account.active_orders("BUSDT") == [ORDER]
+    assert account.positions("BUSDT") == []
+    assert rc.calls == 1
+
+    account.invalidate()
+    account.positions("AUSDT")
+    assert rc.calls == 2
+
+
+@pytest.mark.parametrize("failing", ["fail_positions", "fail_orders"])
+def test_failed_refresh_keeps_the_previous_snapshot(failing):
+    rc = _RestClient()
+    account = AccountSnapshot(rc, ["AUSDT", "BUSDT"], ttl=60)
+    account.refresh()
+
+    setattr(rc, failing, True)
+    account.refresh(force=True)
+    assert account.positions("AUSDT") == [POSITION]
+    assert account.active_orders("BUSDT") == [ORDER]
+
+    setattr(rc, failing, False)
+    account.refresh()
+    assert account.age < 60
+
+
+def test_failed_refresh_is_not_cached_as_fresh():
+    rc = _RestClient()
+    account = AccountSnapshot(rc, ["AUSDT"], ttl=60)
+    account.refresh()
+    age_before = account.age
+
+    rc.fail_positions = True
+    account._updated -= 120 # the snapshot has expired
+    account.positions("AUSDT")
+    assert account.age > 60 + age_before - 1
+    account.positions("AUSDT")
+    assert rc.calls == 3 # every read retries until a refresh succeeds
+
+
+def test_first_refresh_failing_raises():
+    rc = _RestClient()
+    rc.fail_positions = True
+    account = AccountSnapshot(rc, ["AUSDT"], ttl=60)
+    with pytest.raises(RuntimeError):
+        account.positions("AUSDT")
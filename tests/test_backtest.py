@@ -0,0 +1,48 @@
+import numpy as np
+
+from strategy.backtest import run_backtest
+
+THRESHOLD = 1.1
+STOP = 0.15
+
+
+def _run(prices_1, prices_2, zscore):
+    return run_backtest(np.array(prices_1, dtype=float), np.array(prices_2, dtype=float), np.array(zscore, dtype=float),
+                        capital=1000, signal_trigger_threshold=THRESHOLD, stop_loss_fail_safe=STOP,
+                        fee_rate=0, slippage=0)
+
+
+def test_stop_on_the_last_candle_is_a_stop_loss():
+    # positive z-score: long symbol 2 from candle 1, which drops through its stop on the last candle
+    zscore = [0.5, 1.5, 1.2, 0.8, 0.6]
+    prices_1 = [100, 100, 100, 100, 100]
+    prices_2 = [50, 50, 49, 48, 40]
+    trades = _run(prices_1, prices_2, zscore).trades
+
+    assert len(trades) == 1
+    assert trades["exit_idx"].iloc[0] == 4
+    assert trades["exit_reason"].iloc[0] == "stop_loss"
+
+
+def test_open_trade_without_a_stop_stays_open():
+    zscore = [0.5, 1.5, 1.2, 0.8, 0.6]
+    trades = _run([100] * 5, [50, 50, 49, 48, 47], zscore).trades
+
+    assert trades["exit_reason"].tolist() == ["open"]
+    assert trades["exit_idx"].iloc[0] == 4
+
+
+def test_stop_on_the_flip_candle_is_a_signal_exit():
+    zscore = [0.5, 1.5, 1.2, -0.3, -0.5]
+    trades = _run([100] * 5, [50, 50, 49, 40, 40], zscore).trades
+
+    assert trades["exit_reason"].tolist() == ["signal"]
+    assert trades["exit_idx"].iloc[0] == 3
+
+
+def test_stop_before_the_end_closes_early():
+    zscore = [0.5, 1.5, 1.2, 0.8, 0.6, 0.4]
+    trades = _run([100] * 6, [50, 50, 40, 48, 47, 47], zscore).trades
+
+    assert trades["exit_reason"].tolist() == ["stop_loss"]
+    assert trades["exit_idx"].iloc[0] == 2
@@ -0,0 +1,112 @@
+import time
+import numpy as np
+import pandas as pd
+import pytest
+
+import strategy.cointegration as cointegration
+from strategy.cointegration import (
+    calculate_cointegration_statsmodels,
+    extract_close_prices,
+    get_cointegration_pairs,
+)
+
+N_SYMBOLS = 10
+N_CANDLES = 120
+
+
+def synthetic_universe(n_symbols: int = N_SYMBOLS, n_candles: int = N_CANDLES, seed: int = 0) -> dict:
+    # REST-shaped price histories: a few common random walks, each symbol one of them
+    # plus its own mean-reverting noise, so some pairs come out cointegrated
+    rng = np.random.default_rng(seed)
+    walks = 100 + np.cumsum(rng.normal(0, 1, (3, n_candles)), axis=1)
+    price_data = {}
+    for k in range(n_symbols):
+        noise = np.zeros(n_candles)
+        for t in range(1, n_candles):
+            noise[t] = 0.7 * noise[t - 1] + rng.normal(0, 0.5)
+        closes = (1 + 0.1 * k) * walks[k % 3] + noise
+        price_data[f"SYM{k}USDT"] = {"result": [{"start_at": t * 3600, "close": float(close)} for t, close in enumerate(closes)]}
+    return price_data
+
+
+def _old_get_cointegration_pairs(price_data: dict) -> pd.DataFrame:
+    # The scan as it was before the rewrite: closes re-extracted for every pair, and the
+    # inner loop broken off on the first already-seen key
+    def form_key(symbol_1, symbol_2):
+        return f"{symbol_1}-{symbol_2}"
+
+    seen = {}
+    pairs = []
+    for symbol, data in price_data.items():
+        for symbol2, data2 in price_data.items():
+            if symbol == symbol2:
+                continue
+            if form_key(symbol, symbol2) in seen or form_key(symbol2, symbol) in seen:
+                break
+            coint = calculate_cointegration_statsmodels(extract_close_prices(data["result"]),
+                                                        extract_close_prices(data2["result"]))
+            if coint and coint.cointegrated:
+                seen[form_key(symbol, symbol2)] = True
+                pairs.append({"sym_1": symbol, "sym_2": symbol2})
+    return pd.DataFrame(pairs)
+
+
+def test_statsmodels_scan_tests_each_unordered_pair_once(monkeypatch):
+    price_data = synthetic_universe()
+    by_first_close = {data["result"][0]["close"]: symbol for symbol, data in price_data.items()}
+    tested = []
+
+    def counting(series_1, series_2):
+        tested.append((by_first_close[series_1[0]], by_first_close[series_2[0]]))
+        return calculate_cointegration_statsmodels(series_1, series_2)
+
+    monkeypatch.setattr(cointegration, "calculate_cointegration_statsmodels", counting)
+    get_cointegration_pairs(price_data, engine="statsmodels")
+
+    assert len(tested) == N_SYMBOLS * (N_SYMBOLS - 1) // 2
+    assert len({frozenset(pair) for pair in tested}) == len(tested)
+
+
+def test_vectorized_scan_tests_each_unordered_pair_once(monkeypatch):
+    tested = []
+    iter_pair_results = cointegration.iter_pair_results
+
+    def counting(*args, **kwargs):
+        for i, j, results in iter_pair_results(*args, **kwargs):
+            tested.extend(zip(i.tolist(), j.tolist()))
+            yield i, j, results
+
+    monkeypatch.setattr(cointegration, "iter_pair_results", counting)
+    get_cointegration_pairs(synthetic_universe())
+
+    assert len(tested) == N_SYMBOLS * (N_SYMBOLS - 1) // 2
+    assert all(i < j for i, j in tested)
+    assert len(set(tested)) == len(tested)
+
+
+def test_engines_find_the_same_pairs():
+    price_data = synthetic_universe()
+    vectorized = get_cointegration_pairs(price_data).sort_values(["sym_1", "sym_2"]).reset_index(drop=True)
+    statsmodels = get_cointegration_pairs(price_data, engine="statsmodels").sort_values(["sym_1", "sym_2"]).reset_index(drop=True)
+
+    assert len(vectorized) > 0
+    pd.testing.assert_frame_equal(vectorized[["sym_1", "sym_2", "zero_crossings"]], statsmodels[["sym_1", "sym_2", "zero_crossings"]])
+    np.testing.assert_allclose(vectorized[["p_value", "t_value", "c_value", "hedge_ratio"]],
+                               statsmodels[["p_value", "t_value", "c_value", "hedge_ratio"]], atol=0.011)
+
+
+def test_scan_timing_against_the_old_loop(capsys):
+    price_data = synthetic_universe()
+
+    def timed(scan):
+        started = time.perf_counter()
+        scan(price_data)
+        return time.perf_counter() - started
+
+    old = timed(_old_get_cointegration_pairs)
+    reference = timed(lambda data: get_cointegration_pairs(data, engine="statsmodels"))
+    vectorized = timed(get_cointegration_pairs)
+    with capsys.disabled():
+        print(f"\nscan of {N_SYMBOLS} symbols: old loop {old:.2f}s, statsmodels {reference:.2f}s, vectorized {vectorized:.3f}s")
+
+    assert vectorized < old
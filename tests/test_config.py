@@ -0,0 +1,14 @@
+import pytest
+
+from config import Config
+
+
+def test_require_passes_when_set():
+    Config(api_url="https://api.example", ws_public_url="wss://stream.example").require("api_url", "ws_public_url")
+
+
+def test_require_names_the_missing_env_vars():
+    config = Config(api_url="https://api.example", ws_public_url="")
+    with pytest.raises(ValueError, match="TESTNET_WS_PUBLIC_URL") as err:
+        config.require("api_url", "ws_public_url")
+    assert "TESTNET_REST_BASE_URL" not in str(err.value)
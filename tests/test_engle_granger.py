@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from benchmarks.engle_granger import random_universe
+from strategy.cointegration import calculate_cointegration, calculate_cointegration_statsmodels
+from strategy.engle_granger import mackinnon_crit, mackinnon_p, upper_triangle_pairs
+
+
+@pytest.mark.parametrize("n_candles", [100, 500])
+def test_native_test_matches_statsmodels(n_candles):
+    closes = random_universe(12, n_candles, seed=n_candles)
+    idx_1, idx_2 = upper_triangle_pairs(len(closes))
+    flags = set()
+    for i, j in zip(idx_1, idx_2):
+        native = calculate_cointegration(closes[i], closes[j])
+        reference = calculate_cointegration_statsmodels(closes[i], closes[j])
+
+        assert native._t_value == pytest.approx(reference._t_value, rel=1e-9)
+        assert native._p_value == pytest.approx(reference._p_value, rel=1e-9, abs=1e-12)
+        assert native._c_value == pytest.approx(reference._c_value, rel=1e-12)
+        assert native._hedge_ratio == pytest.approx(reference._hedge_ratio, rel=1e-12)
+        assert native.cointegrated == reference.cointegrated
+        assert native.zero_crossings == reference.zero_crossings
+        flags.add(native.cointegrated)
+    assert flags == {True, False} # both outcomes were exercised
+
+
+def test_mackinnon_tables_match_statsmodels():
+    from statsmodels.tsa.adfvalues import mackinnoncrit, mackinnonp
+
+    t_values = np.linspace(-20, 5, 501)
+    expected = np.array([mackinnonp(t, regression="c", N=2) for t in t_values])
+    np.testing.assert_allclose(mackinnon_p(t_values), expected, rtol=1e-12, atol=1e-15)
+
+    for nobs in (50, 199, 1000):
+        np.testing.assert_allclose(mackinnon_crit(nobs), mackinnoncrit(N=2, regression="c", nobs=nobs), rtol=1e-12)
@@ -0,0 +1,100 @@
+import time
+
+import numpy as np
+import pytest
+
+from api.metrics import metrics
+from api.orderbook import OrderBook
+from config import Config
+from strategy.execution import Execution
+from strategy.trading_loop import PairTrader
+
+SYMBOLS = ("AUSDT", "BUSDT")
+
+
+class _Feed:
+    def get_orderbook(self, symbol):
+        return OrderBook.from_levels(symbol, [
+            {"id": "1", "price": "10.0", "side": "Buy", "size": 5},
+            {"id": "2", "price": "10.1", "side": "Sell", "size": 5},
+        ])
+
+
+class _Account:
+    def add_symbols(self, symbols):
+        pass
+
+    def invalidate(self):
+        pass
+
+
+class _RestClient:
+    def __init__(self):
+        self.orders = 0
+
+    def place_limit_order(self, **kwargs):
+        self.orders += 1
+        return {"ret_code": 0, "result": {"order_id": str(self.orders)}}
+
+
+@pytest.fixture
+def execution():
+    execution = Execution(Config(), _RestClient(), *SYMBOLS, orderbook_feed=_Feed(), kline_cache=object(), account=_Account())
+    yield execution
+    execution.close()
+
+
+def _tick_to_order():
+    return metrics.histogram("tick_to_order_seconds").snapshot()
+
+
+def test_each_placement_reports_latency_from_its_own_tick(execution):
+    legs = [(SYMBOLS[0], "Long", 10.0), (SYMBOLS[1], "Short", 10.0)]
+    execution.tick = time.perf_counter() - 60 # the event that triggered the trade, long gone by the re-placement
+
+    before = _tick_to_order()
+    assert all(execution.place_legs(legs, tick=time.perf_counter()))
+    after = _tick_to_order()
+
+    assert after["count"] - before["count"] == 2
+    assert after["sum"] - before["sum"] < 1 # not a minute old
+
+
+def test_close_shuts_the_leg_pool_down(execution):
+    PairTrader(execution, *SYMBOLS).close()
+    with pytest.raises(RuntimeError):
+        execution.place_legs([(SYMBOLS[0], "Long", 10.0)])
+
+
+class _Klines:
+    def __init__(self, latest: dict, catch_up: bool):
+        self.latest = latest
+        self.catch_up = catch_up
+        self.refreshed = []
+
+    def get_closes(self, symbol):
+        return np.arange(10.0)
+
+    def latest_start(self, symbol):
+        return self.latest[symbol]
+
+    def refresh(self, symbol, force=False):
+        self.refreshed.append(symbol)
+        if self.catch_up:
+            self.latest[symbol] = max(self.latest.values())
+        return True
+
+
+@pytest.mark.parametrize("catch_up", [True, False])
+def test_latest_candle_needs_both_symbols(catch_up):
+    klines = _Klines({SYMBOLS[0]: 120, SYMBOLS[1]: 60}, catch_up)
+    execution = Execution(Config(), _RestClient(), *SYMBOLS, orderbook_feed=_Feed(), kline_cache=klines, account=_Account())
+    execution._latest_candle = 60
+
+    series_1, series_2 = execution.get_latest_klines(*SYMBOLS)
+    execution.close()
+
+    assert len(series_1) == len(series_2) == 10
+    assert klines.refreshed == [SYMBOLS[1]]
+    # without the lagging symbol's new candle, the previous one is still the live candle
+    assert execution._latest_candle == (120 if catch_up else 60)
@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The live loop's modules should import in well under this (~0.35s on a laptop)
+IMPORT_BUDGET_SECONDS = 1.5
+HEAVY_MODULES = ("pandas", "statsmodels", "matplotlib")
+
+
+def _importtime(statement: str) -> dict:
+    # -X importtime report as module -> (cumulative microseconds, nesting level)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(cumulative), (len(name) - len(name.lstrip())) // 2)
+    return modules
+
+
+def test_live_loop_imports_stay_light():
+    modules = _importtime("import strategy.execution, strategy.trading_loop")
+    assert "strategy.execution" in modules
+
+    heavy = [name for name in modules if name.split(".")[0] in HEAVY_MODULES]
+    assert not heavy, f"the live loop imports {sorted(heavy)[:5]}"
+
+    total = sum(cumulative for cumulative, level in modules.values() if level == 0) / 1e6
+    assert total < IMPORT_BUDGET_SECONDS, f"imports took {total:.2f}s"
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+import api.kline_cache as kline_cache
+from api.kline_cache import KlineBuffer, KlineCache
+from api.resample import CLOSE, START_AT
+
+MINUTE = 60
+START = 1_700_000_000 // MINUTE * MINUTE
+
+
+def _kline(k: int, close: float = None) -> dict:
+    close = float(k) if close is None else close
+    return {"start_at": START + k * MINUTE, "open": close, "high": close, "low": close, "close": close}
+
+
+def test_merge_appends_in_order_and_overwrites_repeats():
+    buffer = KlineBuffer(5, MINUTE)
+    assert buffer.merge([_kline(2), _kline(0), _kline(1)]) == 3 # out of order
+
+    # the previously live candle comes back with its final close, plus two new ones
+    assert buffer.merge([_kline(3), _kline(2, close=2.5), _kline(4)]) == 2
+    assert buffer.ordered()[:, CLOSE].tolist() == [0, 1, 2.5, 3, 4]
+
+    # the ring wraps: oldest candles drop out, and a candle older than the window is ignored
+    assert buffer.merge([_kline(6), _kline(5), _kline(0, close=99)]) == 2
+    assert buffer.ordered()[:, START_AT].tolist() == [START + k * MINUTE for k in range(2, 7)]
+    assert buffer.latest_start == START + 6 * MINUTE
+
+
+def test_merge_fills_gaps_with_the_previous_close():
+    buffer = KlineBuffer(6, MINUTE)
+    buffer.merge([_kline(0), _kline(1)])
+    buffer.merge([_kline(4)])
+    assert buffer.ordered()[:, START_AT].tolist() == [START + k * MINUTE for k in range(5)]
+    assert buffer.ordered()[:, CLOSE].tolist() == [0, 1, 1, 1, 4]
+
+    # a gap longer than the whole buffer only fills what fits
+    buffer.merge([_kline(20)])
+    assert len(buffer) == 6
+    assert buffer.ordered()[:, START_AT].tolist() == [START + k * MINUTE for k in range(15, 21)]
+
+
+class _RestClient:
+    def __init__(self):
+        self.available = 0 # candles 0 .. available-1 exist, the last one still open
+        self.calls = []
+
+    def get_price_history(self, symbol, interval, limit, from_time):
+        self.calls.append((limit, from_time))
+        return {"ret_code": 0, "result": [_kline(k) for k in range(self.available) if START + k * MINUTE >= from_time][:limit]}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(kline_cache.time, "time", lambda: now[0])
+    return now
+
+
+def _at_candle(clock, rc, k):
+    # k is the open candle
+    clock[0] = START + k * MINUTE + 5
+    rc.available = k + 1
+
+
+def test_refresh_fetches_only_the_tail(clock):
+    rc = _RestClient()
+    cache = KlineCache(rc, 1, depth=10)
+
+    _at_candle(clock, rc, 20)
+    assert cache.get_closes("BTCUSDT").tolist() == list(range(11, 21))
+    assert rc.calls[-1] == (10, START + 10 * MINUTE + 5)
+
+    # same candle, within refresh_after: no request
+    assert len(cache.get_closes("BTCUSDT")) == 10
+    assert len(rc.calls) == 1
+
+    # two candles later: the previously live candle and the two new ones
+    _at_candle(clock, rc, 22)
+    assert cache.get_closes("BTCUSDT").tolist() == list(range(13, 23))
+    assert rc.calls[-1] == (3, START + 20 * MINUTE)
+
+
+def test_refresh_refetches_everything_after_a_gap_longer_than_the_window(clock):
+    rc = _RestClient()
+    cache = KlineCache(rc, 1, depth=10)
+    _at_candle(clock, rc, 20)
+    cache.get_closes("BTCUSDT")
+
+    _at_candle(clock, rc, 45)
+    assert cache.get_closes("BTCUSDT").tolist() == list(range(36, 46))
+    assert rc.calls[-1][0] == 10
+
+
+def test_failed_refresh_keeps_the_cached_window(clock):
+    rc = _RestClient()
+    cache = KlineCache(rc, 1, depth=10)
+    _at_candle(clock, rc, 20)
+    cache.get_closes("BTCUSDT")
+
+    clock[0] += MINUTE
+    rc.get_price_history = lambda *args, **kwargs: None
+    assert not cache.refresh("BTCUSDT")
+    assert cache.get_closes("BTCUSDT").tolist() == list(range(11, 21))
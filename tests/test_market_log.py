@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+
+from api.market_log import (ASK, BID, DELETE, RECORD_DTYPE, SNAPSHOT, TRADE, UPDATE,
+                            MarketLogReader, MarketLogWriter)
+
+T0 = 1_700_000_000.0
+SYMBOLS = ["AUSDT", "BUSDT"]
+
+
+def _records(first: int, n: int) -> np.ndarray:
+    # one record every 0.1s, alternating symbols, price = record number
+    k = np.arange(first, first + n)
+    records = np.zeros(n, dtype=RECORD_DTYPE)
+    records["timestamp"] = ((T0 + 0.1 * k) * 1e6).astype(np.int64)
+    records["symbol"] = k % 2
+    records["kind"] = UPDATE
+    records["side"] = BID
+    records["price"] = k
+    records["size"] = 1.0
+    return records
+
+
+def test_round_trip_across_segments_and_reopen(tmp_path):
+    path = str(tmp_path / "log")
+    writer = MarketLogWriter(path, SYMBOLS, segment_records=10)
+    writer.append(_records(0, 25))
+    writer.close()
+    # the last, partly filled segment is trimmed to its records on close
+    assert os.path.getsize(os.path.join(path, "segment_000002.bin")) == 5 * RECORD_DTYPE.itemsize
+
+    # reopening carries on in that segment, then rolls over into new ones
+    writer = MarketLogWriter(path, SYMBOLS + ["CUSDT"], segment_records=10)
+    assert writer.symbol_id("AUSDT") == 0 and writer.symbol_id("CUSDT") == 2
+    writer.append(_records(25, 12))
+    writer.close()
+
+    reader = MarketLogReader(path)
+    assert reader.symbols == ["AUSDT", "BUSDT", "CUSDT"]
+    assert len(reader) == 37
+    assert [len(chunk) for chunk in reader.iter_range()] == [10, 10, 10, 7]
+    everything = reader.read()
+    assert everything["price"].tolist() == list(range(37))
+    assert np.array_equal(everything, _records(0, 37))
+
+
+def test_read_a_time_range_and_symbol_across_segments(tmp_path):
+    path = str(tmp_path / "log")
+    writer = MarketLogWriter(path, SYMBOLS, segment_records=10)
+    writer.append(_records(0, 40))
+    writer.close()
+    reader = MarketLogReader(path)
+    everything = _records(0, 40)
+
+    # [0.65s, 2.85s) after T0: records 7..28, spanning three segments
+    start, end = T0 + 0.65, T0 + 2.85
+    in_range = everything[(everything["timestamp"] >= int(start * 1e6)) & (everything["timestamp"] < int(end * 1e6))]
+    assert in_range["price"].tolist() == list(range(7, 29))
+    assert [len(chunk) for chunk in reader.iter_range(start, end)] == [3, 10, 9]
+    assert np.array_equal(reader.read(start, end), in_range)
+    assert reader.read(start, end, "BUSDT")["price"].tolist() == list(range(7, 29, 2))
+
+    # inside one segment it's a view, not a copy
+    view = reader.read(T0 + 1.05, T0 + 1.55)
+    assert view["price"].tolist() == list(range(11, 16))
+    assert not view.flags["OWNDATA"]
+
+    assert len(reader.read(T0 + 10, T0 + 20)) == 0
+    assert len(reader.read(end=T0)) == 0
+
+
+def test_reader_refresh_sees_flushed_records(tmp_path):
+    path = str(tmp_path / "log")
+    writer = MarketLogWriter(path, SYMBOLS, segment_records=10, flush_every=3600)
+    writer.append(_records(0, 4))
+    writer.flush()
+    reader = MarketLogReader(path)
+    assert len(reader) == 4
+
+    writer.append(_records(4, 8))
+    assert len(reader) == 4 # not flushed yet
+    writer.flush()
+    reader.refresh()
+    assert reader.read()["price"].tolist() == list(range(12))
+    writer.close()
+
+
+def test_orderbook_and_trade_messages(tmp_path):
+    path = str(tmp_path / "log")
+    writer = MarketLogWriter(path, [], segment_records=10)
+    writer.write_orderbook({"topic": "orderBookL2_25.AUSDT", "type": "snapshot", "timestamp_e6": 5,
+                            "data": {"order_book": [{"id": "1", "price": "10.0", "side": "Buy", "size": 3},
+                                                    {"id": "2", "price": "10.5", "side": "Sell", "size": 4}]}}, T0)
+    writer.write_orderbook({"topic": "orderBookL2_25.AUSDT", "type": "delta", "timestamp_e6": 6,
+                            "data": {"delete": [{"id": "1", "price": "10.0", "side": "Buy"}],
+                                     "update": [{"id": "2", "price": "10.5", "side": "Sell", "size": 7}]}}, T0 + 1)
+    writer.write_trades({"topic": "trade.BUSDT", "data": [{"price": "20.0", "size": 0.5, "side": "Sell",
+                                                            "trade_time_ms": 123}]}, T0 + 0.5) # received "earlier"
+    writer.close()
+
+    records = MarketLogReader(path).read()
+    assert records["kind"].tolist() == [SNAPSHOT, SNAPSHOT, DELETE, UPDATE, TRADE]
+    assert records["side"].tolist() == [BID, ASK, BID, ASK, ASK]
+    assert records["size"].tolist() == [3, 4, 0, 7, 0.5]
+    assert records["symbol"].tolist() == [0, 0, 0, 0, 1]
+    assert records["exchange_ts"][-1] == 123_000
+    # receive times never go backwards within a log
+    assert np.all(np.diff(records["timestamp"]) >= 0)
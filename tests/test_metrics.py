@@ -0,0 +1,36 @@
+import threading
+
+from api.metrics import MetricsRegistry
+
+
+def test_rendering_while_metrics_are_registered():
+    registry = MetricsRegistry()
+    errors = []
+
+    def register():
+        for k in range(3000):
+            registry.observe("request_seconds", 0.01, endpoint=f"e{k}")
+            registry.counter("errors_total", endpoint=f"e{k}").inc()
+
+    thread = threading.Thread(target=register)
+    thread.start()
+    while thread.is_alive():
+        try:
+            registry.to_dict()
+        except RuntimeError as e:
+            errors.append(e)
+    thread.join()
+    assert not errors
+    assert len(registry.to_dict()) == 1 + 2 * 3000
+
+
+def test_histogram_and_counter_rendering():
+    registry = MetricsRegistry()
+    registry.histogram("step_seconds", "Time per step").observe(0.002)
+    registry.counter("steps_total", "Steps").inc(3)
+
+    text = registry.to_prometheus()
+    assert "# TYPE step_seconds histogram" in text
+    assert "step_seconds_count 1" in text
+    assert "steps_total 3" in text
+    assert registry.to_dict()["steps_total"] == 3
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from api.orderbook import OrderBook
+from benchmarks.orderbook import book_messages, dict_trade_details
+from config import Config
+from mock_exchange.matching import apply_book_message
+from strategy.execution import Execution
+
+SYMBOL = "BTCUSDT"
+
+
+class _Account:
+    def add_symbols(self, symbols):
+        pass
+
+
+@pytest.fixture(scope="module")
+def execution():
+    execution = Execution(Config(), rest_client=None, symbol_1=SYMBOL, symbol_2="ETHUSDT",
+                          orderbook_feed=object(), kline_cache=object(), account=_Account())
+    yield execution
+    execution.close()
+
+
+def _dict_sides(levels: dict):
+    bids = sorted(((float(level["price"]), float(level["size"])) for level in levels.values() if level["side"] == "Buy"), reverse=True)
+    asks = sorted((float(level["price"]), float(level["size"])) for level in levels.values() if level["side"] != "Buy")
+    return np.array(bids).reshape(-1, 2), np.array(asks).reshape(-1, 2)
+
+
+def test_orderbook_matches_the_dict_book(execution):
+    config = execution._config
+    levels = {}
+    book = OrderBook(SYMBOL)
+    messages = book_messages(SYMBOL, updates=500)
+    assert messages[0]["type"] == "snapshot" and len(messages) > 100
+
+    for msg in messages:
+        apply_book_message(levels, msg)
+        book.apply(msg)
+
+        bids, asks = _dict_sides(levels)
+        assert np.array_equal(book.bids.prices(), bids[:, 0]) and np.array_equal(book.bids.sizes(), bids[:, 1])
+        assert np.array_equal(book.asks.prices(), asks[:, 0]) and np.array_equal(book.asks.sizes(), asks[:, 1])
+
+        for direction, capital in (("Long", 1000.0), ("Short", 250.0)):
+            details = execution.get_trade_details(book.copy(), direction, capital)
+            expected = dict_trade_details(list(levels.values()), direction, capital, config.stop_loss_fail_safe,
+                                          config.price_rounding_ticker_1, config.quantity_rounding_ticker_1)
+            assert (details.order_price, details.stop_loss, details.quantity) == expected
+
+
+def _vwap(levels: np.ndarray, size: float) -> float:
+    # brute force: walk (price, size) levels best first until `size` is filled
+    remaining, cost = size, 0.0
+    for price, level_size in levels:
+        take = min(remaining, level_size)
+        cost += take * price
+        remaining -= take
+        if remaining <= 0:
+            return cost / size
+    return float("nan")
+
+
+def _check_depth(book: OrderBook, levels: dict):
+    bids, asks = _dict_sides(levels)
+    for n in (1, 3, 5, 25, 100):
+        assert book.liquidity("Buy", n) == pytest.approx(bids[:n, 1].sum())
+        assert book.liquidity("Sell", n) == pytest.approx(asks[:n, 1].sum())
+    for size in (1.0, 150.0, 0.5 * asks[:, 1].sum(), asks[:, 1].sum() + 1):
+        np.testing.assert_allclose(book.vwap("Buy", size), _vwap(asks, size))
+    for size in (1.0, 150.0, 0.5 * bids[:, 1].sum(), bids[:, 1].sum() + 1):
+        np.testing.assert_allclose(book.vwap("Sell", size), _vwap(bids, size))
+
+    bid_size, ask_size = bids[:5, 1].sum(), asks[:5, 1].sum()
+    expected_mid = (_vwap(bids, bid_size) * ask_size + _vwap(asks, ask_size) * bid_size) / (bid_size + ask_size)
+    assert book.weighted_mid(5) == pytest.approx(expected_mid)
+
+
+def test_depth_queries_match_a_brute_force_walk():
+    levels = {}
+    book = OrderBook(SYMBOL)
+    for msg in book_messages(SYMBOL, updates=200):
+        apply_book_message(levels, msg)
+        book.apply(msg)
+        _check_depth(book, levels)
+
+
+def test_depth_queries_after_a_new_snapshot():
+    # e.g. after a reconnect: the cumulative depth of the old book mustn't be served
+    messages = book_messages(SYMBOL, updates=200)
+    book = OrderBook(SYMBOL)
+    for msg in messages[:50]:
+        book.apply(msg)
+    assert book.vwap("Buy", 100.0) > 0 and book.liquidity("Sell", 5) > 0 # builds the cumulative sums
+
+    snapshot = book_messages(SYMBOL, updates=200, seed=1)[0]
+    assert snapshot["type"] == "snapshot"
+    levels = {}
+    apply_book_message(levels, snapshot)
+    book.apply(snapshot)
+    _check_depth(book, levels)
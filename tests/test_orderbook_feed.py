@@ -0,0 +1,88 @@
+import time
+import numpy as np
+import pytest
+
+from api.orderbook import OrderBook, OrderBookFeed
+from mock_exchange.replay import synthetic_session
+from mock_exchange.server import MockExchange
+
+SYMBOL = "BTCUSDT"
+
+
+def _wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def _same_book(book: OrderBook, levels: list) -> bool:
+    expected = OrderBook.from_levels(SYMBOL, levels)
+    return all(
+        np.array_equal(side.prices(), expected_side.prices()) and np.array_equal(side.sizes(), expected_side.sizes())
+        for side, expected_side in ((book.bids, expected.bids), (book.asks, expected.asks))
+    )
+
+
+@pytest.fixture
+def exchange(request):
+    repeat = getattr(request, "param", False)
+    session = synthetic_session(seconds=1.5, updates_per_second=40)
+    exchange = MockExchange(session, speed=1.0, repeat=repeat).start()
+    yield exchange
+    exchange.stop()
+
+
+@pytest.fixture
+def feed(exchange):
+    feed = OrderBookFeed(exchange.ws_url, stale_after=0.5, max_backoff=1.0)
+    yield feed
+    feed.close()
+
+
+def test_snapshot_and_deltas_track_the_exchange_book(exchange, feed):
+    updates = []
+    feed.add_listener(lambda symbol, sent: updates.append(symbol))
+
+    first = feed.get_orderbook(SYMBOL, timeout=5)
+    assert first is not None and first.best_bid() < first.best_ask()
+
+    assert exchange.replay_done.wait(10)
+    assert _wait_for(lambda: _same_book(feed.get_orderbook(SYMBOL), exchange.engine.book(SYMBOL)))
+    assert len(updates) > 10 # deltas, not just the snapshot
+    assert not _same_book(first, exchange.engine.book(SYMBOL))
+
+
+def test_stale_book_is_flagged_and_resubscribed(exchange, feed):
+    assert feed.is_stale(SYMBOL) # nothing subscribed yet
+    assert feed.get_orderbook(SYMBOL, timeout=5) is not None
+    assert not feed.is_stale(SYMBOL)
+
+    # the replay is over, so no more updates arrive
+    assert exchange.replay_done.wait(10)
+    assert _wait_for(lambda: feed.is_stale(SYMBOL))
+
+    # a lookup on a stale book reconnects, and the fresh snapshot un-stales it
+    connection = feed.subscribe(SYMBOL)
+    assert feed.get_orderbook(SYMBOL, timeout=5) is not None
+    assert _wait_for(lambda: connection.reconnects == 1 and connection.wait(0))
+    assert not feed.is_stale(SYMBOL)
+    assert _same_book(feed.get_orderbook(SYMBOL), exchange.engine.book(SYMBOL))
+
+
+@pytest.mark.parametrize("exchange", [True], indirect=True)
+def test_reconnects_after_the_server_drops_the_socket(exchange, feed):
+    assert feed.get_orderbook(SYMBOL, timeout=5) is not None
+    connection = feed.subscribe(SYMBOL)
+    updates = []
+    feed.add_listener(lambda symbol, sent: updates.append(time.monotonic()))
+
+    dropped = time.monotonic()
+    exchange.drop_connections()
+
+    assert _wait_for(lambda: connection.reconnects == 1 and connection.wait(0))
+    assert _wait_for(lambda: updates and updates[-1] > dropped + 0.1) # streaming again
+    book = feed.get_orderbook(SYMBOL)
+    assert book.best_bid() < book.best_ask()
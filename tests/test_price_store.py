@@ -0,0 +1,63 @@
+import numpy as np
+
+from strategy.price_store import PriceStore
+
+INTERVAL = 3600
+
+
+def _history(first_start: int, closes) -> dict:
+    return {"result": [
+        {"start_at": first_start + k * INTERVAL, "open": close, "high": close, "low": close, "close": close}
+        for k, close in enumerate(closes)
+    ]}
+
+
+def test_load_closes_leaves_out_a_symbol_that_was_not_topped_up(tmp_path):
+    rng = np.random.default_rng(0)
+    start = 1_700_000_000 // INTERVAL * INTERVAL
+    store = PriceStore(str(tmp_path / "prices"))
+    store.save({symbol: _history(start, 100 + rng.random(50)) for symbol in ("AUSDT", "BUSDT", "CUSDT")})
+
+    # the next rescan tops up A and B by 5 candles, C's download fails
+    new_start = start + 50 * INTERVAL
+    store.append({symbol: _history(new_start, 100 + rng.random(5)) for symbol in ("AUSDT", "BUSDT")}, 50)
+
+    symbols, closes = store.load_closes()
+    assert symbols == ["AUSDT", "BUSDT"]
+    assert closes.shape == (2, 50)
+
+    # C is still a full length, NaN free history - just five candles behind
+    _, starts = store.load_field("start_at", ["CUSDT"])
+    assert not np.isnan(starts).any()
+    assert starts[0, -1] == new_start - INTERVAL
+
+
+def test_load_closes_keeps_every_symbol_on_the_same_window(tmp_path):
+    start = 1_700_000_000 // INTERVAL * INTERVAL
+    store = PriceStore(str(tmp_path / "prices"))
+    store.save({symbol: _history(start, np.arange(1.0, 41.0)) for symbol in ("AUSDT", "BUSDT")})
+
+    symbols, closes = store.load_closes()
+    assert symbols == ["AUSDT", "BUSDT"]
+    assert closes.shape == (2, 40)
+
+    # resampled to 4h: the first, partly covered bucket is dropped
+    symbols, closes = store.load_closes(interval_seconds=4 * INTERVAL)
+    assert symbols == ["AUSDT", "BUSDT"]
+    assert closes[0, -1] == 40.0
+
+
+def test_load_closes_follows_the_requested_order_after_append(tmp_path):
+    start = 1_700_000_000 // INTERVAL * INTERVAL
+    store = PriceStore(str(tmp_path / "prices"))
+    store.save({"AUSDT": _history(start, np.full(20, 1.0)), "CUSDT": _history(start, np.full(20, 3.0))})
+    # B is new, so it's stored after C
+    store.append({"BUSDT": _history(start, np.full(20, 2.0))}, 20)
+    assert store.symbols() == ["AUSDT", "CUSDT", "BUSDT"]
+
+    symbols, closes = store.load_closes(["AUSDT", "BUSDT", "CUSDT"])
+    assert symbols == ["AUSDT", "BUSDT", "CUSDT"]
+    assert closes[:, 0].tolist() == [1.0, 2.0, 3.0]
+
+    symbols, starts = store.load_field("start_at", ["CUSDT", "AUSDT", "BUSDT"])
+    assert symbols == ["CUSDT", "AUSDT", "BUSDT"] and starts.shape == (3, 20)
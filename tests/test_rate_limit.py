@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from mock_exchange.replay import Session
+from mock_exchange.server import MockExchange
+from strategy.stat_arbitrage import StatArbitrage
+
+SERVER_LIMIT = 40 # requests per second the stub exchange accepts
+N_SYMBOLS = 100
+LIMIT = 50
+
+
+def _session() -> Session:
+    rng = np.random.default_rng(0)
+    symbols = [f"SYM{k}USDT" for k in range(N_SYMBOLS)]
+    klines = {}
+    for symbol in symbols:
+        closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, 200)))
+        klines[symbol] = [{"open": c, "high": c, "low": c, "close": c} for c in closes]
+    return Session(interval=60, symbols=symbols, klines=klines)
+
+
+def _max_per_second(times: list) -> int:
+    times = np.sort(times)
+    # requests in [t, t + 1s) for every accepted request time t
+    return int((np.searchsorted(times, times + 1.0, side="left") - np.arange(len(times))).max())
+
+
+def _download(exchange: MockExchange, rate_limit: float, burst: int) -> dict:
+    sa = StatArbitrage(exchange.ws_url, exchange.url, 1, rate_limit=rate_limit, burst=burst, workers=8)
+    symbols = [{"name": symbol} for symbol in exchange.session.symbols]
+    # from the first stored candle, so every symbol gets a full LIMIT candles back
+    return sa.get_price_histories(symbols, LIMIT, from_times={symbol["name"]: 0 for symbol in symbols})
+
+
+@pytest.fixture
+def exchange(request):
+    exchange = MockExchange(_session(), latency=0.005, rate_limit=SERVER_LIMIT, rate_limit_status=request.param).start()
+    yield exchange
+    exchange.stop()
+
+
+@pytest.mark.parametrize("exchange", [10006], indirect=True)
+def test_downloads_stay_under_the_limit(exchange):
+    # a full bucket lets burst + rate requests through in its first second, so keep that under the limit
+    histories = _download(exchange, rate_limit=SERVER_LIMIT * 0.6, burst=SERVER_LIMIT // 4)
+
+    assert len(histories) == N_SYMBOLS
+    assert all(len(prices["result"]) == LIMIT for prices in histories.values())
+    assert exchange.stats["rate_limited"] == 0
+    assert _max_per_second(exchange.accepted) <= SERVER_LIMIT
+
+
+@pytest.mark.parametrize("exchange", [10006, 429], indirect=True)
+def test_downloads_recover_from_rate_limiting(exchange):
+    # a client bucket twice the exchange's limit gets rejected, and the transport retries
+    histories = _download(exchange, rate_limit=SERVER_LIMIT * 2, burst=SERVER_LIMIT * 2)
+
+    assert exchange.stats["rate_limited"] > 0
+    assert len(histories) == N_SYMBOLS
+    assert all(len(prices["result"]) == LIMIT for prices in histories.values())
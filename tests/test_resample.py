@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from api.resample import CLOSE, HIGH, LOW, OPEN, START_AT, fetch_plan, resample_candles, resample_closes
+
+HOUR = 3600
+START = 1_700_000_000 // (4 * HOUR) * (4 * HOUR) # on a 4h boundary
+
+
+def _candles(first_start: int, n: int, step: int = HOUR) -> np.ndarray:
+    k = np.arange(n, dtype=float)
+    return np.column_stack([first_start + k * step, 100 + k, 100.5 + k, 99.5 + k, 100.25 + k])
+
+
+def test_resample_candles_aggregates_each_bucket():
+    resampled = resample_candles(_candles(START, 10), 4 * HOUR)
+
+    assert resampled[:, START_AT].tolist() == [START, START + 4 * HOUR, START + 8 * HOUR]
+    assert resampled[:, OPEN].tolist() == [100, 104, 108]
+    assert resampled[:, HIGH].tolist() == [103.5, 107.5, 109.5]
+    assert resampled[:, LOW].tolist() == [99.5, 103.5, 107.5]
+    # the last bucket is only half covered but kept, like the exchange's open candle
+    assert resampled[:, CLOSE].tolist() == [103.25, 107.25, 109.25]
+
+
+def test_resample_candles_drops_a_partly_covered_first_bucket():
+    resampled = resample_candles(_candles(START + HOUR, 11), 4 * HOUR)
+    assert resampled[:, START_AT].tolist() == [START + 4 * HOUR, START + 8 * HOUR]
+    assert resampled[0, OPEN] == 103
+
+
+def test_resample_candles_empty():
+    assert resample_candles(np.empty((0, 5)), 4 * HOUR).shape == (0, 5)
+
+
+def test_resample_closes_matches_resample_candles():
+    candles = [_candles(START + HOUR, 23), _candles(START + HOUR, 23) * [1, 2, 2, 2, 2]]
+    start_at = np.vstack([c[:, START_AT] for c in candles])
+    closes = np.vstack([c[:, CLOSE] for c in candles])
+
+    keep, resampled = resample_closes(start_at, closes, 4 * HOUR)
+    assert keep.all()
+    for row, c in enumerate(candles):
+        assert np.array_equal(resampled[row], resample_candles(c, 4 * HOUR)[:, CLOSE])
+
+
+def test_fetch_plan():
+    assert fetch_plan(240, None, 100) == (240, 100, None)
+    assert fetch_plan("4h", 240, 100) == ("4h", 100, None)
+    assert fetch_plan("4h", 60, 100) == (60, 404, 4 * HOUR)
+    with pytest.raises(ValueError):
+        fetch_plan(60, 7, 100)
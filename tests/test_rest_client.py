@@ -0,0 +1,65 @@
+import pytest
+
+from api.rest_client import MAX_KLINES, RestClient, interval_to_seconds, to_bybit_interval
+
+START = 1_700_000_000 // 3600 * 3600
+
+
+def _client(available: int, interval_seconds: int = 60, last_page=None):
+    # `available` one minute candles from START; `last_page` overrides what an empty page looks like
+    rc = RestClient("http://127.0.0.1:1")
+    calls = []
+
+    def request(method, idempotent=True, **kwargs):
+        calls.append(kwargs)
+        first = max(0, -(-(kwargs["from_time"] - START) // interval_seconds))
+        result = [{"start_at": START + k * interval_seconds, "close": float(k)}
+                  for k in range(first, min(first + kwargs["limit"], available))]
+        return {"ret_code": 0, "ret_msg": "OK", "result": result or last_page}
+
+    rc._request = request
+    return rc, calls
+
+
+@pytest.mark.parametrize("interval, seconds", [
+    (1, 60), (240, 4 * 3600), ("D", 86400), ("W", 7 * 86400), ("5m", 300), ("4h", 4 * 3600), ("1D", 86400), ("h", 3600),
+])
+def test_interval_to_seconds(interval, seconds):
+    assert interval_to_seconds(interval) == seconds
+
+
+def test_to_bybit_interval():
+    assert to_bybit_interval("4h") == 240
+    assert to_bybit_interval("1D") == "D"
+    with pytest.raises(ValueError):
+        to_bybit_interval("2m")
+
+
+def test_single_page():
+    rc, calls = _client(available=500)
+    resp = rc.get_price_history("BTCUSDT", 1, 50, from_time=START)
+    assert [kline["close"] for kline in resp["result"]] == list(range(50))
+    assert len(calls) == 1
+
+
+def test_pages_are_joined():
+    rc, calls = _client(available=500)
+    resp = rc.get_price_history("BTCUSDT", 1, 450, from_time=START)
+    assert [kline["close"] for kline in resp["result"]] == list(range(450))
+    assert [call["limit"] for call in calls] == [MAX_KLINES, MAX_KLINES, 50]
+
+
+@pytest.mark.parametrize("available, last_page", [(MAX_KLINES, None), (MAX_KLINES, []), (MAX_KLINES + 30, None)])
+def test_short_or_empty_last_page_keeps_the_earlier_pages(available, last_page):
+    # the first page is exactly MAX_KLINES, so a second page is fetched and comes back short or empty
+    rc, calls = _client(available=available, last_page=last_page)
+    resp = rc.get_price_history("BTCUSDT", 1, 300, from_time=START)
+    assert [kline["close"] for kline in resp["result"]] == list(range(available))
+    assert len(calls) == 2
+
+
+def test_failed_page_fails_the_history():
+    rc, _ = _client(available=500)
+    ok = rc._request
+    rc._request = lambda method, **kwargs: {"ret_code": 10006, "result": {}} if kwargs["from_time"] > START else ok(method, **kwargs)
+    assert rc.get_price_history("BTCUSDT", 1, 300, from_time=START) is None
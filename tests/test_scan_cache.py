@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import strategy.scan_cache as scan_cache
+from strategy.cointegration import find_cointegrated_pairs
+from strategy.scan_cache import ScanCache, find_cointegrated_pairs_cached, symbol_hashes
+
+
+def _universe(n: int = 8, n_candles: int = 150, seed: int = 0) -> np.ndarray:
+    # two shared random walks, so some pairs are cointegrated and some aren't
+    rng = np.random.default_rng(seed)
+    walks = 100 + np.cumsum(rng.normal(0, 1, (2, n_candles)), axis=1)
+    return walks[np.arange(n) % 2] * (1 + 0.05 * np.arange(n))[:, None] + rng.normal(0, 0.5, (n, n_candles))
+
+
+@pytest.fixture
+def tested(monkeypatch):
+    # (i, j) of every pair actually sent to the Engle-Granger engine
+    pairs = []
+    original = scan_cache.iter_pair_results
+
+    def counting(closes, workers=1, pairs_to_test=None):
+        for i, j, results in original(closes, workers, pairs_to_test):
+            pairs.extend(zip(i.tolist(), j.tolist()))
+            yield i, j, results
+
+    monkeypatch.setattr(scan_cache, "iter_pair_results", counting)
+    return pairs
+
+
+def _scan(symbols, closes, cache, **kwargs) -> pd.DataFrame:
+    return find_cointegrated_pairs_cached(symbols, closes, cache, **kwargs).reset_index(drop=True)
+
+
+def _fresh(symbols, closes) -> pd.DataFrame:
+    return find_cointegrated_pairs(symbols, closes).reset_index(drop=True)
+
+
+def test_unchanged_windows_are_served_from_the_cache(tmp_path, tested):
+    closes = _universe()
+    symbols = [f"S{k}" for k in range(len(closes))]
+    cache = ScanCache(str(tmp_path / "cache.csv"))
+
+    first = _scan(symbols, closes, cache)
+    assert len(tested) == 28
+    pd.testing.assert_frame_equal(first, _fresh(symbols, closes))
+
+    tested.clear()
+    second = _scan(symbols, closes, cache)
+    assert tested == []
+    pd.testing.assert_frame_equal(second, first)
+
+
+def test_a_changed_window_retests_only_its_pairs(tmp_path, tested):
+    closes = _universe()
+    symbols = [f"S{k}" for k in range(len(closes))]
+    cache = ScanCache(str(tmp_path / "cache.csv"))
+    _scan(symbols, closes, cache)
+
+    tested.clear()
+    closes[3] = _universe(seed=1)[3]
+    rescanned = _scan(symbols, closes, cache)
+    assert sorted(tested) == sorted((min(3, k), max(3, k)) for k in range(len(closes)) if k != 3)
+    pd.testing.assert_frame_equal(rescanned, _fresh(symbols, closes))
+
+    stored = cache.load()
+    assert set(stored["hash_1"]) | set(stored["hash_2"]) == set(symbol_hashes(closes))
+
+
+def test_new_symbols_are_merged_into_the_cache(tmp_path, tested):
+    closes = _universe(n=9)
+    symbols = [f"S{k}" for k in range(len(closes))]
+    cache = ScanCache(str(tmp_path / "cache.csv"))
+    _scan(symbols[:8], closes[:8], cache)
+
+    tested.clear()
+    merged = _scan(symbols, closes, cache)
+    assert sorted(tested) == [(k, 8) for k in range(8)]
+    assert len(cache.load()) == 36
+    pd.testing.assert_frame_equal(merged, _fresh(symbols, closes))
+
+
+def test_far_from_significant_pairs_are_skipped_up_to_max_skips(tmp_path, tested):
+    closes = _universe()
+    symbols = [f"S{k}" for k in range(len(closes))]
+    cache = ScanCache(str(tmp_path / "cache.csv"))
+    _scan(symbols, closes, cache)
+    before = cache.load()
+    far = before["p_value"] > 0.5
+    assert 0 < far.sum() < len(before)
+
+    # every window moves on by a candle
+    moved = np.concatenate([closes[:, 1:], closes[:, -1:]], axis=1)
+    for run in (1, 2):
+        tested.clear()
+        _scan(symbols, moved, cache, skip_p_above=0.5, max_skips=2)
+        stored = cache.load()
+        assert len(tested) == ((~far).sum() if run == 1 else 0)
+        # skipped pairs keep their old p-value and old hashes, so they stay "changed"
+        assert (stored.loc[far, "skipped"] == run).all()
+        assert (stored.loc[far, ["p_value", "hash_1", "hash_2"]] == before.loc[far, ["p_value", "hash_1", "hash_2"]]).all().all()
+        assert (stored.loc[~far, "skipped"] == 0).all()
+
+    tested.clear()
+    rescanned = _scan(symbols, moved, cache, skip_p_above=0.5, max_skips=2)
+    assert len(tested) == far.sum()
+    assert (cache.load()["skipped"] == 0).all()
+    pd.testing.assert_frame_equal(rescanned, _fresh(symbols, moved))
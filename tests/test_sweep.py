@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+import strategy.test as test_module
+from config import Config
+from strategy.price_store import PriceStore
+
+INTERVAL = 3600
+
+
+def test_sweep_takes_the_top_rows_of_the_pairs_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rng = np.random.default_rng(0)
+    start = 1_700_000_000 // INTERVAL * INTERVAL
+    PriceStore("1_price_histories").save({
+        symbol: {"result": [{"start_at": start + k * INTERVAL, "open": c, "high": c, "low": c, "close": c}
+                            for k, c in enumerate(100 + rng.random(60))]}
+        for symbol in ("AUSDT", "BUSDT", "CUSDT", "DUSDT")
+    })
+    # the best three pairs share symbols, which load_top_pairs would thin out for trading
+    pd.DataFrame({"sym_1": ["AUSDT", "AUSDT", "BUSDT", "CUSDT"], "sym_2": ["BUSDT", "CUSDT", "CUSDT", "DUSDT"]}) \
+        .to_csv("2_cointegrated_pairs.csv", index=False)
+
+    swept = {}
+
+    def fake_sweep(config, pairs, symbols, closes, workers=1):
+        swept.update(pairs=pairs, symbols=symbols, shape=closes.shape)
+        return pd.DataFrame({"pair": [str(pair) for pair in pairs]})
+
+    monkeypatch.setattr(test_module, "run_sweep", fake_sweep)
+    test_module.Test(Config(), "AUSDT", "BUSDT").sweep(n_pairs=3)
+
+    assert swept["pairs"] == [("AUSDT", "BUSDT"), ("AUSDT", "CUSDT"), ("BUSDT", "CUSDT")]
+    assert swept["symbols"] == ["AUSDT", "BUSDT", "CUSDT"]
+    assert swept["shape"] == (3, 60)
@@ -0,0 +1,28 @@
+import pybit.exceptions
+import pytest
+
+from api import transport as transport_module
+from api.rate_limit import TokenBucket
+from api.transport import Transport
+
+
+class _FailingHTTP:
+    def __init__(self, ret_code: int):
+        self.ret_code = ret_code
+        self.calls = 0
+
+    def cancel_active_order(self, **kwargs):
+        self.calls += 1
+        raise pybit.exceptions.InvalidRequestError("cancel", "failed", self.ret_code, "00:00:00")
+
+
+@pytest.mark.parametrize("ret_code, attempts", [(30034, 1), (10006, 4)])
+def test_only_transient_ret_codes_are_retried(monkeypatch, ret_code, attempts):
+    monkeypatch.setattr(transport_module, "BACKOFF_BASE", 0.0)
+    transport = Transport("http://127.0.0.1:1", rate_limiter=TokenBucket(1000, 1000), max_attempts=4)
+    transport.http = _FailingHTTP(ret_code)
+
+    resp = transport.request("cancel_active_order", idempotent=False, symbol="BTCUSDT", order_id="x")
+
+    assert resp["ret_code"] == ret_code
+    assert transport.http.calls == attempts
@@ -0,0 +1,73 @@
+import math
+import numpy as np
+import pytest
+
+from strategy.cointegration import RollingZScore, SpreadZScore, calculate_spread_zscores, calculate_zscore
+
+
+def _pair(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    walk = 100 + np.cumsum(rng.normal(0, 1, n))
+    spread = np.zeros(n)
+    for k in range(1, n):
+        spread[k] = 0.9 * spread[k - 1] + rng.normal(0, 0.5)
+    return 1.5 * walk + spread, walk
+
+
+@pytest.mark.parametrize("forgetting", [1.0, 0.97])
+def test_live_zscore_matches_offline_on_the_same_closes(forgetting):
+    depth, zscore_window = 200, 21
+    closes_1, closes_2 = _pair(300)
+    live = SpreadZScore(zscore_window, forgetting)
+    rng = np.random.default_rng(1)
+
+    # the kline cache slides one candle at a time; a few ticks move the live candle in between
+    for end in range(depth, len(closes_1)):
+        series_1 = list(closes_1[end - depth:end])
+        series_2 = list(closes_2[end - depth:end])
+        for tick in range(3):
+            candle_closed = tick == 0
+            if tick:
+                series_1[-1] += rng.normal(0, 0.2)
+                series_2[-1] += rng.normal(0, 0.2)
+            zscore = live.update(series_1, series_2, candle_closed)
+            expected = calculate_spread_zscores(series_1, series_2, zscore_window, forgetting)[-1]
+            assert math.isclose(zscore, expected, rel_tol=1e-7, abs_tol=1e-9)
+
+
+def test_live_zscore_only_sees_the_cached_window():
+    # after hours of candles the estimate still only depends on the current window
+    depth, zscore_window = 100, 21
+    closes_1, closes_2 = _pair(1000, seed=2)
+    long_running = SpreadZScore(zscore_window)
+    for end in range(depth, len(closes_1) + 1):
+        zscore = long_running.update(closes_1[end - depth:end], closes_2[end - depth:end])
+
+    fresh = SpreadZScore(zscore_window)
+    assert zscore == pytest.approx(fresh.update(closes_1[-depth:], closes_2[-depth:]))
+
+
+@pytest.mark.parametrize("window", [2, 5, 21, 50])
+def test_rolling_zscore_matches_calculate_zscore(window):
+    rng = np.random.default_rng(window)
+    spread = np.cumsum(rng.normal(0, 1, 300)) * 10 + 1000
+
+    rolling = RollingZScore(window)
+    streamed = [rolling.update(value) for value in spread]
+    expected = calculate_zscore(spread, window)
+
+    # NaN while the window isn't full yet, the same numbers after
+    assert np.isnan(streamed[:window - 1]).all()
+    assert np.allclose(streamed, expected, equal_nan=True)
+
+
+def test_rolling_zscore_peek_matches_calculate_zscore():
+    window = 21
+    spread = np.random.default_rng(3).normal(0, 1, 100)
+    rolling = RollingZScore(window)
+    for k, value in enumerate(spread[:-1]):
+        rolling.update(value)
+        # peeking the next value doesn't store it
+        expected = calculate_zscore(spread[:k + 2], window)[-1]
+        assert np.allclose(rolling.peek(spread[k + 1]), expected, equal_nan=True)
+    assert rolling.count == window